@@ -10,6 +10,8 @@ import cv2
 import os
 from collections import deque
 
+from slide_engine import MultiMetricDetector, detect_slides
+
 
 class FFPlayer:
     def __init__(self, root):
@@ -537,213 +539,21 @@ class FFPlayer:
 
 
     def perform_slide_detection(self):
-        """执行优化的幻灯片检测逻辑"""
+        """执行优化的幻灯片检测逻辑（slide_engine.MultiMetricDetector）"""
         try:
             self.slides_detected.clear()
-            cap = cv2.VideoCapture(self.video_path)
-
-            if not cap.isOpened():
-                raise Exception("Cannot open video file for analysis")
-
-            # 获取视频基本信息
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            video_duration = total_frames / fps if fps > 0 else self.duration
-
-            # === 优化的参数配置 ===
-            # 基础参数
-            base_skip_frames = max(1, int(fps * 0.3))  # 减少跳帧，提高检测精度
-            min_slide_duration = 2.0  # 最小幻灯片持续时间
-            min_static_duration = 1.5  # 最小静止时间（防止频繁误检）
-
-            # 多指标阈值配置
-            thresholds = {
-                'hist_correlation': 0.25,  # 直方图相关性阈值
-                'edge_change_ratio': 0.35,  # 边缘变化比例阈值
-                'chi_square': 25000,  # 卡方距离阈值
-                'ssim_threshold': 0.82,  # SSIM相似度阈值
-                'brightness_change': 0.15,  # 亮度变化阈值
-                'content_change': 0.20  # 内容变化综合阈值
-            }
-
-            # 自适应阈值参数
-            adaptive_params = {
-                'sensitivity_window': 50,  # 敏感度调整窗口
-                'low_activity_boost': 1.2,  # 低活动度增强因子
-                'high_activity_damping': 0.8,  # 高活动度抑制因子
-            }
-
-            # 初始化变量
-            prev_hist = None
-            prev_edges = None
-            prev_gray = None
-            prev_mean_brightness = None
-
-            slide_times = [0.0]  # 默认第一张幻灯片在开始位置
-            frame_count = 0
-            processed_frames = 0
-
-            # 静帧过滤相关变量
-            last_significant_change_time = 0.0
-            recent_changes = []  # 存储最近的变化强度
-            activity_history = []  # 活动度历史
-
-            # 设置进度条
-            expected_processed_frames = total_frames // base_skip_frames
-            self.root.after(0, lambda: self.detection_progress.config(
-                maximum=expected_processed_frames, value=0))
-
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame_count += 1
-                current_time = frame_count / fps
-
-                # 动态调整跳帧策略
-                if len(recent_changes) > 10:
-                    avg_change = np.mean(recent_changes[-10:])
-                    if avg_change > 0.5:  # 高变化区域，减少跳帧
-                        skip_frames = max(1, int(base_skip_frames * 0.5))
-                    elif avg_change < 0.1:  # 低变化区域，增加跳帧
-                        skip_frames = min(base_skip_frames * 2, int(fps))
-                    else:
-                        skip_frames = base_skip_frames
-                else:
-                    skip_frames = base_skip_frames
 
-                if frame_count % skip_frames != 0:
-                    continue
+            def report_progress(processed, expected, current_time, video_duration, slide_count):
+                if processed == 0:
+                    self.root.after(0, lambda: self.detection_progress.config(maximum=expected, value=0))
+                    return
+                self.root.after(0, lambda p=processed: self.detection_progress.config(value=p))
+                self.root.after(0, lambda: self.detection_status_label.config(
+                    text=f"检测进度: {current_time:.1f}s / {video_duration:.1f}s (已找到 {slide_count} 张幻灯片)"))
 
-                processed_frames += 1
-
-                # 更新进度显示
-                if processed_frames % 15 == 0:
-                    progress = processed_frames
-                    self.root.after(0, lambda p=progress: self.detection_progress.config(value=p))
-                    self.root.after(0, lambda t=current_time: self.detection_status_label.config(
-                        text=f"检测进度: {current_time:.1f}s / {video_duration:.1f}s (已找到 {len(slide_times)} 张幻灯片)"))
-
-                # === 特征提取 ===
-                # 预处理帧
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                gray_resized = cv2.resize(gray, (320, 240))
-
-                # 1. 直方图特征
-                hist = cv2.calcHist([gray_resized], [0], None, [256], [0, 256])
-                hist = cv2.normalize(hist, hist).flatten()
-
-                # 2. 边缘特征
-                edges = cv2.Canny(gray_resized, 50, 150)
-                edge_count = np.sum(edges > 0)
-
-                # 3. 亮度特征
-                mean_brightness = np.mean(gray_resized)
-
-                # 4. 纹理特征（简化版LBP）
-                texture_score = self._calculate_texture_score(gray_resized)
-
-                if (prev_hist is not None and prev_edges is not None and
-                        prev_gray is not None and prev_mean_brightness is not None):
-
-                    # === 多指标计算 ===
-                    # 1. 直方图相关性
-                    hist_correlation = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
-
-                    # 2. 边缘变化率
-                    edge_change_ratio = abs(edge_count - prev_edges) / max(prev_edges, 1)
-
-                    # 3. 卡方距离
-                    chi_square = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CHISQR)
-
-                    # 4. SSIM结构相似度（简化实现）
-                    ssim_score = self._calculate_ssim(prev_gray, gray_resized)
-
-                    # 5. 亮度变化
-                    brightness_change = abs(mean_brightness - prev_mean_brightness) / max(prev_mean_brightness, 1)
-
-                    # 6. 整体内容变化度
-                    content_change_score = self._calculate_content_change(
-                        prev_gray, gray_resized, texture_score)
-
-                    # 记录变化强度用于自适应调整
-                    change_intensity = (
-                            (1 - hist_correlation) * 0.3 +
-                            edge_change_ratio * 0.2 +
-                            (1 - ssim_score) * 0.3 +
-                            brightness_change * 0.1 +
-                            content_change_score * 0.1
-                    )
-                    recent_changes.append(change_intensity)
-                    if len(recent_changes) > 50:
-                        recent_changes.pop(0)
-
-                    # === 自适应阈值调整 ===
-                    adjusted_thresholds = self._adjust_thresholds_adaptive(
-                        thresholds, recent_changes, adaptive_params)
-
-                    # === 多指标综合判断 ===
-                    scene_change_indicators = {
-                        'hist_low': hist_correlation < adjusted_thresholds['hist_correlation'],
-                        'edge_high': edge_change_ratio > adjusted_thresholds['edge_change_ratio'],
-                        'chi_high': chi_square > adjusted_thresholds['chi_square'],
-                        'ssim_low': ssim_score < adjusted_thresholds['ssim_threshold'],
-                        'brightness_change': brightness_change > adjusted_thresholds['brightness_change'],
-                        'content_change': content_change_score > adjusted_thresholds['content_change']
-                    }
-
-                    # 综合判断逻辑：需要满足多个条件
-                    scene_change = False
-                    positive_indicators = sum(scene_change_indicators.values())
-
-                    # 强变化：3个或以上指标触发
-                    if positive_indicators >= 3:
-                        scene_change = True
-                    # 中等变化：2个指标触发但包含关键指标
-                    elif positive_indicators >= 2:
-                        if (scene_change_indicators['hist_low'] and scene_change_indicators['ssim_low']) or \
-                                (scene_change_indicators['content_change'] and scene_change_indicators['edge_high']):
-                            scene_change = True
-
-                    # === 静帧过滤机制 ===
-                    if scene_change:
-                        # 检查是否有足够的静止时间
-                        time_since_last_change = current_time - last_significant_change_time
-
-                        # 如果距离上次显著变化时间足够长，且满足最小幻灯片持续时间
-                        if (time_since_last_change >= min_static_duration and
-                                (len(slide_times) == 0 or (current_time - slide_times[-1]) >= min_slide_duration)):
-
-                            # 进一步验证：检查变化是否持续
-                            if self._verify_slide_change(recent_changes, change_intensity):
-                                slide_times.append(current_time)
-                                last_significant_change_time = current_time
-
-                                # 调试信息输出（可选）
-                                print(f"检测到幻灯片切换 {len(slide_times)} 在 {current_time:.2f}s:")
-                                print(f"  - 直方图相关性: {hist_correlation:.3f}")
-                                print(f"  - SSIM: {ssim_score:.3f}")
-                                print(f"  - 边缘变化: {edge_change_ratio:.3f}")
-                                print(f"  - 综合变化强度: {change_intensity:.3f}")
-
-                    # 更新活动度历史
-                    activity_history.append(change_intensity)
-                    if len(activity_history) > 100:
-                        activity_history.pop(0)
-
-                # 更新历史数据
-                prev_hist = hist.copy()
-                prev_edges = edge_count
-                prev_gray = gray_resized.copy()
-                prev_mean_brightness = mean_brightness
-
-            cap.release()
-
-            # === 后处理优化 ===
-            # 移除过于接近的幻灯片切换点
-            if len(slide_times) > 1:
-                slide_times = self._post_process_slide_times(slide_times, min_slide_duration)
+            result = detect_slides(self.video_path, MultiMetricDetector(verbose=True),
+                                   progress_callback=report_progress, fallback_duration=self.duration)
+            slide_times = result.slide_times
 
             # 更新结果
             def update_slides_data():
@@ -765,113 +575,6 @@ class FFPlayer:
             self.root.after(0, lambda: self.btn_detect.config(state="normal", text="重新检测"))
             self.root.after(0, lambda: self.detection_progress.config(value=0))
 
-    def _calculate_ssim(self, img1, img2):
-        """计算简化版SSIM（不依赖scikit-image）"""
-        try:
-            # 确保图像类型一致
-            img1 = img1.astype(np.float64)
-            img2 = img2.astype(np.float64)
-
-            # 计算均值
-            mu1 = np.mean(img1)
-            mu2 = np.mean(img2)
-
-            # 计算方差和协方差
-            sigma1_sq = np.var(img1)
-            sigma2_sq = np.var(img2)
-            sigma12 = np.mean((img1 - mu1) * (img2 - mu2))
-
-            # SSIM常数
-            c1 = (0.01 * 255) ** 2
-            c2 = (0.03 * 255) ** 2
-
-            # 计算SSIM
-            numerator = (2 * mu1 * mu2 + c1) * (2 * sigma12 + c2)
-            denominator = (mu1 ** 2 + mu2 ** 2 + c1) * (sigma1_sq + sigma2_sq + c2)
-
-            ssim = numerator / denominator
-            return max(0, min(1, ssim))  # 限制在[0,1]范围内
-        except:
-            return 0.5  # 出错时返回中性值
-
-    def _calculate_texture_score(self, gray_img):
-        """计算纹理复杂度评分"""
-        try:
-            # 使用Sobel算子计算梯度
-            grad_x = cv2.Sobel(gray_img, cv2.CV_64F, 1, 0, ksize=3)
-            grad_y = cv2.Sobel(gray_img, cv2.CV_64F, 0, 1, ksize=3)
-            gradient_magnitude = np.sqrt(grad_x ** 2 + grad_y ** 2)
-
-            # 计算纹理复杂度
-            texture_score = np.std(gradient_magnitude) / (np.mean(gradient_magnitude) + 1e-7)
-            return min(texture_score / 10.0, 1.0)  # 归一化到[0,1]
-        except:
-            return 0.0
-
-    def _calculate_content_change(self, prev_gray, curr_gray, texture_score):
-        """计算整体内容变化度"""
-        try:
-            # 计算帧间差异
-            diff = cv2.absdiff(prev_gray, curr_gray)
-            mean_diff = np.mean(diff)
-
-            # 结合纹理信息
-            content_change = (mean_diff / 255.0) * (1 + texture_score * 0.5)
-            return min(content_change, 1.0)
-        except:
-            return 0.0
-
-    def _adjust_thresholds_adaptive(self, base_thresholds, recent_changes, adaptive_params):
-        """自适应阈值调整"""
-        adjusted = base_thresholds.copy()
-
-        if len(recent_changes) < 10:
-            return adjusted
-
-        # 计算最近的平均活动度
-        recent_activity = np.mean(recent_changes[-adaptive_params['sensitivity_window']:])
-
-        # 根据活动度调整阈值
-        if recent_activity < 0.1:  # 低活动度，提高敏感度
-            factor = adaptive_params['low_activity_boost']
-            adjusted['hist_correlation'] *= factor
-            adjusted['ssim_threshold'] *= factor
-            adjusted['content_change'] /= factor
-        elif recent_activity > 0.4:  # 高活动度，降低敏感度
-            factor = adaptive_params['high_activity_damping']
-            adjusted['hist_correlation'] *= factor
-            adjusted['ssim_threshold'] *= factor
-            adjusted['content_change'] /= factor
-
-        return adjusted
-
-    def _verify_slide_change(self, recent_changes, current_intensity):
-        """验证是否为真正的幻灯片切换"""
-        if len(recent_changes) < 5:
-            return True
-
-        # 检查变化是否显著且持续
-        recent_avg = np.mean(recent_changes[-5:])
-
-        # 当前变化强度应该明显高于最近平均值
-        intensity_ratio = current_intensity / (recent_avg + 1e-7)
-
-        # 如果当前变化是最近几帧中的明显峰值，认为是有效切换
-        return intensity_ratio > 1.5 and current_intensity > 0.15
-
-    def _post_process_slide_times(self, slide_times, min_duration):
-        """后处理：移除过于接近的切换点"""
-        if len(slide_times) <= 1:
-            return slide_times
-
-        filtered_times = [slide_times[0]]  # 保留第一个
-
-        for i in range(1, len(slide_times)):
-            if slide_times[i] - filtered_times[-1] >= min_duration:
-                filtered_times.append(slide_times[i])
-
-        return filtered_times
-
     def clear_slide_buttons(self):
         """Clear all slide buttons"""
         for btn in self.slide_buttons:
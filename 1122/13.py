@@ -10,6 +10,8 @@ import cv2
 import os
 from collections import deque
 
+from slide_engine import HandwritingDetector, detect_slides
+
 
 class FFPlayer:
     def __init__(self, root):
@@ -536,204 +538,21 @@ class FFPlayer:
         self.detection_thread.start()
 
     def perform_slide_detection(self):
-        """智能幻灯片检测：区分幻灯片切换与教师手写注释"""
-
+        """智能幻灯片检测：区分幻灯片切换与教师手写注释（slide_engine.HandwritingDetector）"""
         try:
             self.slides_detected.clear()
-            cap = cv2.VideoCapture(self.video_path)
-            if not cap.isOpened():
-                raise Exception("Cannot open video file for analysis")
-
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            video_duration = total_frames / fps if fps >0 else self.duration
-            skip_frames = max(1, int(fps * 1))
-            min_slide_duration = 2  # 幻灯片间最小间隔
-
-            # 保存历史帧数据
-            prev_frame_gray = None
-            prev_hist = None
-            frame_history = []  # 保存最近几帧的变化特征
-
-            # 手写内容检测相关
-            writing_detection_active = False
-            writing_start_time = 0
-            consecutive_writing_frames = 0
-
-            slide_times = [0.0]  # 第一帧作为第一张幻灯片
-            frame_count = 0
-            processed_frames = 0
-
-            # 区域重要性配置
-            region_importance = {
-                'global': 1.0,  # 全局对比
-                'edges': 1.3,  # 边缘检测
-                'histdiff': 1.2,  # 直方图差异
-                'movement': 0.6  # 移动检测（低权重减少手写误判）
-            }
-
-            self.root.after(0, lambda: self.detection_progress.config(maximum=total_frames // skip_frames, value=0))
-
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame_count += 1
-                if frame_count % skip_frames != 0:
-                    continue
-
-                processed_frames += 1
-                current_time = frame_count / fps
-
-                # 更新UI进度
-                if processed_frames % 10 == 0:
-                    progress = processed_frames
-                    self.root.after(0, lambda p=progress: self.detection_progress.config(value=p))
-                    self.root.after(0, lambda t=current_time: self.detection_status_label.config(
-                        text=f"Detection Progress: {current_time:.1f}s / {video_duration:.1f}s"))
-
-                # 基础图像处理
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                gray = cv2.resize(gray, (320, 240))
-
-                # 边缘检测（对形状变化敏感，对文字添加不太敏感）
-                edges = cv2.Canny(gray, 50, 150)
-                edge_pixels = np.sum(edges >0)
-
-                # 计算全局特征
-                hist = cv2.calcHist([gray], [0], None, [64], [0, 256])
-                hist = cv2.normalize(hist, hist).flatten()
-
-                if prev_frame_gray is not None and prev_hist is not None:
-                    # 计算指标
-                    frame_diff = cv2.absdiff(prev_frame_gray, gray)
-                    mean_diff = np.mean(frame_diff)
-
-                    # 计算变化区域的占比
-                    change_mask = frame_diff >30  # 阈值决定什么算"变化"
-                    changed_area_ratio = np.sum(change_mask) / (gray.shape[0] * gray.shape[1])
-
-                    # 计算变化区域的集中度
-                    if np.sum(change_mask) > 0:
-                        # 获取变化区域的标记
-                        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
-                            change_mask.astype(np.uint8))
-
-                        # 计算最大连通区域占比
-                        if num_labels > 1:  # 0是背景
-                            largest_label = 1
-                            largest_area = stats[1, cv2.CC_STAT_AREA]
-
-                            for i in range(2, num_labels):
-                                if stats[i, cv2.CC_STAT_AREA] > largest_area:
-                                    largest_area = stats[i, cv2.CC_STAT_AREA]
-                                    largest_label = i
-
-                            largest_change_ratio = largest_area / np.sum(change_mask)
-                        else:
-                            largest_change_ratio = 1.0
-                    else:
-                        largest_change_ratio = 0.0
 
-                    # 直方图相关性（对整体内容变化敏感）
-                    hist_corr = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
-                    hist_diff_score = (1.0 - hist_corr) * 100
-
-                    # 边缘差异（对形状/结构变化敏感）
-                    if hasattr(self, '_prev_edges'):
-                        edge_diff_ratio = abs(edge_pixels - self._prev_edges) / (self._prev_edges + 1)
-                    else:
-                        edge_diff_ratio = 0.0
-                    self._prev_edges = edge_pixels
-
-                    # 汇总当前帧变化特征
-                    frame_features = {
-                        'time': current_time,
-                        'mean_diff': mean_diff,
-                        'hist_diff': hist_diff_score,
-                        'changed_area': changed_area_ratio,
-                        'change_concentration': largest_change_ratio,
-                        'edge_diff': edge_diff_ratio
-                    }
-
-                    # 保存到历史中
-                    frame_history.append(frame_features)
-                    if len(frame_history) > 15:  # 保留15帧历史
-                        frame_history.pop(0)
-
-                    # ===== 幻灯片变化VS手写内容的智能识别 =====
-
-                    # 手写内容特征:
-                    # 1. 小区域变化 (changed_area_ratio小)
-                    # 2. 变化区域集中 (largest_change_ratio大)
-                    # 3. 连续多帧小变化
-                    # 4. 直方图差异小
-
-                    is_writing_like = (
-                            changed_area_ratio < 0.15 and  # 变化区域小于15%
-                    largest_change_ratio> 0.6 and  # 变化集中
-                    hist_diff_score < 30 and  # 颜色分布变化小
-                    mean_diff < 20  # 整体差异小
-                    )
-
-                    # 幻灯片切换特征:
-                    # 1. 大区域变化
-                    # 2. 直方图差异大
-                    # 3. 边缘结构变化大
-
-                    # 综合变化分数 (slide change score)
-                    slide_score = (
-                            mean_diff * region_importance['global'] +
-                            hist_diff_score * region_importance['histdiff'] +
-                            edge_diff_ratio * 100 * region_importance['edges']
-                    )
-
-                    # 减去手写特征的影响
-                    if is_writing_like:
-                        consecutive_writing_frames += 1
-                        slide_score *= max(0.3, 1.0 - (consecutive_writing_frames * 0.1))  # 连续手写帧越多，分数越低
-                    else:
-                        consecutive_writing_frames = max(0, consecutive_writing_frames - 1)
-
-                    # 分析最近几帧的变化模式
-                    recent_changes = []
-                    if len(frame_history) >= 3:
-                        for f in frame_history[-3:]:
-                            recent_changes.append(f['mean_diff'])
-
-                    # 手写特征: 渐进式变化
-                    gradual_change = False
-                    if len(recent_changes)>= 3:
-                        if all(5 < x < 25 for x in recent_changes):  # 连续小变化
-                            gradual_change = True
-
-                    # 进一步抑制手写误判
-                    if gradual_change:
-                        slide_score *= 0.5
-
-                    # 最终判断
-                    is_slide_change = False
-
-                    # 明确是幻灯片切换的情况
-                    if (
-                            (slide_score > 45 and changed_area_ratio > 0.25) or  # 大变化+大面积
-                            (hist_diff_score > 60) or  # 颜色分布大变化
-                            (edge_diff_ratio > 0.4) or  # 边缘结构大变化
-                            (slide_score > 80)  # 极高分数
-                    ):
-                        is_slide_change = True
-
-                    # 如果确定是幻灯片变化，且满足最小时间间隔要求
-                    if is_slide_change and (current_time - slide_times[-1]) >= min_slide_duration:
-                        slide_times.append(current_time)
-                        consecutive_writing_frames = 0  # 重置手写计数
-
-                # 更新上一帧数据
-                prev_frame_gray = gray.copy()
-                prev_hist = hist.copy()
-
-            cap.release()
+            def report_progress(processed, expected, current_time, video_duration, slide_count):
+                if processed == 0:
+                    self.root.after(0, lambda: self.detection_progress.config(maximum=expected, value=0))
+                    return
+                self.root.after(0, lambda p=processed: self.detection_progress.config(value=p))
+                self.root.after(0, lambda: self.detection_status_label.config(
+                    text=f"Detection Progress: {current_time:.1f}s / {video_duration:.1f}s"))
+
+            result = detect_slides(self.video_path, HandwritingDetector(), progress_callback=report_progress,
+                                   progress_interval=10, fallback_duration=self.duration)
+            slide_times = result.slide_times
 
             def update_slides_data():
                 self.slides_detected = slide_times.copy()
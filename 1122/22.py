@@ -10,6 +10,12 @@ import cv2
 import os
 from collections import deque
 
+from slide_cache import SlideCache
+from slide_engine import (DEFAULT_DETECTOR, DETECTORS, THUMBNAIL_SIZE, CancelToken, create_detector,
+                          default_workers, detect_slides_parallel, parse_hash, resolve_reader, segment_count)
+from slide_index import SlideGroups
+from slide_packets import KEYFRAME_SNAP_SECONDS, cached_packet_index, detect_slides_prescreened
+
 
 class FFPlayer:
     def __init__(self, root):
@@ -32,6 +38,7 @@ class FFPlayer:
 
         # Audio-video sync related parameters
         self.video_fps = 25.0
+        self.video_aspect = 4 / 3  # 宽高比，缩略图按它显示
         self.last_frame_time = 0.0
         self.frame_start_time = 0.0  # System time when playback started
         self.playback_start_pos = 0.0  # Video position when playback started
@@ -46,9 +53,22 @@ class FFPlayer:
 
         # Slide detection related
         self.slides_detected = []
+        self.slide_hashes = []  # 与 slides_detected 对应的 64 位 dHash（检测完成前为 None）
+        self.slide_groups = None  # 按代表哈希分出的重复幻灯片（哈希齐全后才有）
+        # 与 slides_detected 对应的缩略图（检测完成后才有；从缓存载入时是图集的内存映射）
+        self.slide_thumbnails = []
         self.slide_buttons = []
+        self.slide_button_slides = []  # 每个按钮对应的幻灯片序号（0 起）
         self.detection_in_progress = False
         self.detection_thread = None
+        self.detection_cancel = None  # 当前检测的 CancelToken
+        self.slide_cache = SlideCache()
+        self.detection_reader = 'opencv'  # 打开视频时按分辨率选择，大视频的小尺寸灰度帧直接由 FFmpeg 输出
+        # 并行检测的进程数：默认不超过 4，环境变量 SLIDE_WORKERS 可以改（见 slide_engine.default_workers）
+        self.detection_workers = default_workers()
+        self.detection_segment_count = 1  # 打开视频时按帧数和帧率算出（见 detection_segments）
+        # 关键帧位置与每帧真实时间（PacketIndex），打开视频后在后台读取或建立，每个视频只扫描一次
+        self.frame_index = None
 
         # New: Current focused slide information
         self.current_slide_index = -1
@@ -102,6 +122,44 @@ class FFPlayer:
                                     state=tk.DISABLED)
         self.btn_detect.pack(side=tk.LEFT, padx=5)
 
+        self.btn_stop_detect = tk.Button(self.control_frame, text="Stop Detection",
+                                         command=self.cancel_detection, state=tk.DISABLED)
+        self.btn_stop_detect.pack(side=tk.LEFT, padx=5)
+
+        # 停止检测时是否保留已找到的幻灯片
+        self.keep_partial_slides = tk.BooleanVar(value=True)
+        self.chk_keep_partial = tk.Checkbutton(self.control_frame, text="Keep found slides",
+                                               variable=self.keep_partial_slides)
+        self.chk_keep_partial.pack(side=tk.LEFT, padx=5)
+
+        # 翻回前面的幻灯片时，列表里每张只显示一个按钮，点击跳到第一次出现的位置
+        self.group_repeated_slides = tk.BooleanVar(value=False)
+        self.chk_group_repeated = tk.Checkbutton(self.control_frame, text="Group repeated slides",
+                                                 variable=self.group_repeated_slides,
+                                                 command=self.on_group_repeated_toggled)
+        self.chk_group_repeated.pack(side=tk.LEFT, padx=5)
+
+        # 拖动进度条跳到之前最近的关键帧、点幻灯片跳到它开头的关键帧，跳转不需要从关键帧解码到目标
+        self.snap_to_keyframes = tk.BooleanVar(value=False)
+        self.chk_snap_keyframes = tk.Checkbutton(self.control_frame, text="Snap to keyframes",
+                                                 variable=self.snap_to_keyframes)
+        self.chk_snap_keyframes.pack(side=tk.LEFT, padx=5)
+
+        # 检测算法选择：干净的幻灯片用 basic 最快，有手写批注的视频用 handwriting
+        tk.Label(self.control_frame, text="Detector:").pack(side=tk.LEFT)
+        self.detector_name = tk.StringVar(value=DEFAULT_DETECTOR)
+        self.detector_combo = ttk.Combobox(self.control_frame, textvariable=self.detector_name,
+                                           values=list(DETECTORS), state="readonly", width=12)
+        self.detector_combo.pack(side=tk.LEFT, padx=5)
+        self.detector_combo.bind("<<ComboboxSelected>>", self.on_detector_selected)
+
+        # 屏幕录制类视频：先只读数据包大小，只在可能切换的位置附近解码
+        self.packet_prescreen = tk.BooleanVar(value=False)
+        self.chk_packet_prescreen = tk.Checkbutton(self.control_frame, text="Packet pre-screen",
+                                                   variable=self.packet_prescreen,
+                                                   command=self.on_detector_selected)
+        self.chk_packet_prescreen.pack(side=tk.LEFT, padx=5)
+
         # New: Exit slide focus mode button
         self.btn_exit_focus = tk.Button(self.control_frame, text="Show Full Progress",
                                         command=self.exit_slide_focus, state=tk.DISABLED)
@@ -240,23 +298,27 @@ class FFPlayer:
         # Update slide range display
         start_str = self.format_time(self.slide_start_time)
         end_str = self.format_time(self.slide_end_time)
-        self.slide_range_label.config(text=f"[Slide {slide_index}: {start_str}-{end_str}]")
+        range_text = f"[Slide {slide_index}: {start_str}-{end_str}]"
+        if self.slide_groups is not None:
+            first = self.slide_groups.first_occurrence(self.current_slide_index)
+            if first != self.current_slide_index:
+                range_text += f" (first shown as slide {first + 1} at {self.format_time(self.slides_detected[first])})"
+        self.slide_range_label.config(text=range_text)
 
         # Enable exit focus button
         self.btn_exit_focus.config(state=tk.NORMAL)
 
         # Update button colors
-        for i, btn in enumerate(self.slide_buttons):
-            if i == slide_index - 1:
-                btn.config(bg="lightblue", relief=tk.SUNKEN)
-            else:
-                btn.config(bg="lightgray", relief=tk.RAISED)
+        self.highlight_slide_button()
 
         # Perform jump
+        seek_time = target_time
+        if self.snap_to_keyframes.get() and self.frame_index is not None:
+            seek_time = self.frame_index.snap_to_keyframe(target_time, KEYFRAME_SNAP_SECONDS)
         was_playing = self.playing
         seek_thread = threading.Thread(
             target=self.perform_seek_improved,
-            args=(target_time, was_playing),
+            args=(seek_time, was_playing),
             daemon=True
         )
         seek_thread.start()
@@ -317,10 +379,43 @@ class FFPlayer:
             if target_pos > self.duration:
                 target_pos = self.duration
 
+        if self.snap_to_keyframes.get() and self.frame_index is not None:
+            keyframe = self.frame_index.keyframe_before(target_pos)
+            if not self.is_slide_focused or keyframe >= self.slide_start_time:
+                target_pos = keyframe
+
         was_playing = self.playing
         seek_thread = threading.Thread(target=self.perform_seek_improved, args=(target_pos, was_playing), daemon=True)
         seek_thread.start()
 
+    def grouped_view(self):
+        """True when the slide list shows one button per group of repeated slides"""
+        return self.group_repeated_slides.get() and self.slide_groups is not None
+
+    def button_index(self, slide_index):
+        """Index in slide_buttons of the button for 0-based slide_index"""
+        return self.slide_groups.group_of[slide_index] if self.grouped_view() else slide_index
+
+    def highlight_slide_button(self):
+        """Highlight the button of the focused slide"""
+        current = self.button_index(self.current_slide_index) if self.is_slide_focused else -1
+        for i, btn in enumerate(self.slide_buttons):
+            if i == current:
+                btn.config(bg="lightblue", relief=tk.SUNKEN)
+            else:
+                btn.config(bg="lightgray", relief=tk.RAISED)
+
+    def update_slide_groups(self):
+        """Group repeated slides once every slide has its representative hash"""
+        if self.slide_hashes and None not in self.slide_hashes:
+            self.slide_groups = SlideGroups(self.slides_detected, self.slide_hashes)
+        else:
+            self.slide_groups = None
+
+    def on_group_repeated_toggled(self):
+        self.create_slide_buttons()
+        self.highlight_slide_button()
+
     def create_slide_buttons(self):
         """Create slide jump buttons with time interval display"""
         self.clear_slide_buttons()
@@ -329,41 +424,12 @@ class FFPlayer:
             return
 
         # Use vertical layout - one button per row
-        for i, slide_time in enumerate(self.slides_detected):
-            start_time_str = self.format_time(slide_time)
-
-            # Calculate end time for this slide
-            if i < len(self.slides_detected) - 1:
-                # Not the last slide, end time is next slide's start time
-                end_time = self.slides_detected[i + 1]
-            else:
-                # Last slide, end time is video duration
-                end_time = self.duration
-
-            end_time_str = self.format_time(end_time)
-
-            # Create button text with time interval
-            button_text = f"Slide {i + 1}\n[{start_time_str} - {end_time_str}]"
-
-            btn = tk.Button(
-                self.slides_frame,
-                text=button_text,
-                command=lambda t=slide_time, idx=i + 1: self.jump_to_slide(t, idx),
-                width=25,  # 增加宽度以容纳时间区间
-                height=3,  # 增加高度以容纳两行文本
-                font=("Arial", 9),
-                relief=tk.RAISED,
-                bd=2,
-                bg="lightgray",
-                anchor="w",  # Left align text
-                justify=tk.LEFT  # Left justify multi-line text
-            )
-
-            # Add double-click event handler
-            btn.bind("<Double-Button-1>", lambda e, idx=i + 1: self.on_slide_double_click(idx))
-
-            btn.pack(fill=tk.X, pady=2, padx=5)
-            self.slide_buttons.append(btn)
+        if self.grouped_view():
+            for members in self.slide_groups.members:
+                self.add_slide_button(members[0], self.group_button_text(members))
+        else:
+            for i in range(len(self.slides_detected)):
+                self.add_slide_button(i)
 
         self.slides_frame.update_idletasks()
         self.slides_canvas.update_idletasks()
@@ -372,9 +438,92 @@ class FFPlayer:
         # Ensure canvas starts at top
         self.slides_canvas.yview_moveto(0)
 
+    def slide_button_text(self, i):
+        """Button text for slide i with its time interval"""
+        start_time_str = self.format_time(self.slides_detected[i])
+
+        # Calculate end time for this slide
+        if i < len(self.slides_detected) - 1:
+            # Not the last slide, end time is next slide's start time
+            end_time = self.slides_detected[i + 1]
+        else:
+            # Last slide, end time is video duration
+            end_time = self.duration
+
+        end_time_str = self.format_time(end_time)
+        return f"Slide {i + 1}\n[{start_time_str} - {end_time_str}]"
+
+    def group_button_text(self, members):
+        """Button text for a group of repeated slides: first interval plus the later appearances"""
+        text = self.slide_button_text(members[0])
+        if len(members) > 1:
+            later = ", ".join(self.format_time(self.slides_detected[i]) for i in members[1:])
+            text = text.replace("\n", f" \u00d7{len(members)}\n", 1) + f"\nAlso at: {later}"
+        return text
+
+    def add_slide_button(self, i, text=None):
+        """Create and pack the button for slide i"""
+        btn = tk.Button(
+            self.slides_frame,
+            text=text or self.slide_button_text(i),
+            command=lambda t=self.slides_detected[i], idx=i + 1: self.jump_to_slide(t, idx),
+            width=25,  # 增加宽度以容纳时间区间
+            height=3,  # 增加高度以容纳两行文本
+            font=("Arial", 9),
+            relief=tk.RAISED,
+            bd=2,
+            bg="lightgray",
+            anchor="w",  # Left align text
+            justify=tk.LEFT  # Left justify multi-line text
+        )
+
+        self.set_button_thumbnail(btn, i)
+
+        # Add double-click event handler
+        btn.bind("<Double-Button-1>", lambda e, idx=i + 1: self.on_slide_double_click(idx))
+
+        btn.pack(fill=tk.X, pady=2, padx=5)
+        self.slide_buttons.append(btn)
+        self.slide_button_slides.append(i)
+
+    def set_button_thumbnail(self, btn, i):
+        """Show the thumbnail of slide i on its button (no-op until detection has produced one)"""
+        if i >= len(self.slide_thumbnails) or self.slide_thumbnails[i] is None:
+            return
+        width = THUMBNAIL_SIZE[0]
+        height = max(1, int(round(width / self.video_aspect)))
+        # 缩略图取自 4:3 的检测帧，按视频的宽高比拉伸回来
+        image = Image.fromarray(np.asarray(self.slide_thumbnails[i])).resize((width, height), Image.BILINEAR)
+        photo = ImageTk.PhotoImage(image)
+        btn.config(image=photo, compound=tk.LEFT, width=0, height=0)
+        btn.image = photo  # Tk 不持有 PhotoImage 的引用
+
+    def refresh_slide_thumbnails(self):
+        """Put thumbnails on the buttons created while detection was still running"""
+        for btn, i in zip(self.slide_buttons, self.slide_button_slides):
+            self.set_button_thumbnail(btn, i)
+
+    def append_detected_slide(self, slide_time):
+        """Append one slide confirmed while detection is still running (no full rebuild)"""
+        self.slides_detected.append(slide_time)
+        self.slide_hashes.append(None)  # 代表哈希和缩略图在检测结束时才确定
+        self.slide_thumbnails.append(None)
+        self.slide_groups = None
+        i = len(self.slides_detected) - 1
+        if i > 0 and i - 1 < len(self.slide_buttons):
+            # 上一张的结束时间从视频结尾改为这一张的开始时间
+            self.slide_buttons[i - 1].config(text=self.slide_button_text(i - 1))
+            if self.is_slide_focused and self.current_slide_index == i - 1:
+                self.slide_end_time = slide_time
+                self.scale.configure(to=self.slide_end_time)
+        self.add_slide_button(i)
+
+        self.slides_frame.update_idletasks()
+        self.slides_canvas.configure(scrollregion=self.slides_canvas.bbox("all"))
+
     def on_slide_double_click(self, slide_index):
         """Handle double-click on slide button"""
-        if self.is_slide_focused and self.current_slide_index == slide_index - 1:
+        if self.is_slide_focused and self.button_index(self.current_slide_index) == self.button_index(slide_index - 1):
             # If double-clicking the currently focused slide, exit focus mode
             self.exit_slide_focus()
 
@@ -456,8 +605,10 @@ class FFPlayer:
             return
 
         self.video_path = file_path
+        self.frame_index = None
         self.stop_playback()
         self.reset_player()
+        self.slide_groups = None
         self.clear_slide_buttons()
 
         # Reset slide focus state
@@ -472,11 +623,19 @@ class FFPlayer:
             cap = cv2.VideoCapture(self.video_path)
             if cap.isOpened():
                 self.video_fps = cap.get(cv2.CAP_PROP_FPS)
+                # 与 parallel_segment_count 相同的帧数和帧率，不必在界面线程里再打开一次视频
+                self.detection_segment_count = segment_count(
+                    int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), self.video_fps, self.detection_workers)
                 if self.video_fps <= 0 or self.video_fps > 120:
                     self.video_fps = 25.0
+                width, height = cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)
+                self.video_aspect = width / height if width > 0 and height > 0 else 4 / 3
+                self.detection_reader = resolve_reader('auto', frame_height=height)
                 cap.release()
             else:
                 self.video_fps = 25.0
+                self.detection_reader = 'opencv'
+                self.detection_segment_count = 1
 
             metadata = temp_player.get_metadata()
 
@@ -511,12 +670,102 @@ class FFPlayer:
             self.scale.set(0)
             self.update_time_display(0.0, self.duration)
 
+            # Reopening a video that was analyzed before shows its slides as soon as its frame index is ready
+            self.load_frame_index()
+
         except Exception as e:
             self.duration = 600.0
             self.video_fps = 25.0
+            self.detection_reader = 'opencv'
+            self.detection_segment_count = 1
             self.scale.configure(to=self.duration)
             messagebox.showerror("Error", f"Cannot get video information: {str(e)}")
 
+    def load_frame_index(self):
+        """Load (or build on first open) the keyframe and timestamp index in the background, then cached slides"""
+        video_path = self.video_path
+        self.detection_status_label.config(text="正在建立关键帧索引...", fg="blue")
+
+        def build():
+            frame_index = self.fetch_frame_index(video_path)
+
+            def done():
+                if self.video_path != video_path:
+                    return
+                self.frame_index = frame_index
+                if not self.detection_in_progress and not self.slides_detected:
+                    self.detection_status_label.config(text="Slide Detection Status: Not Started", fg="blue")
+                    self.load_cached_slides()
+
+            self.root.after(0, done)
+
+        threading.Thread(target=build, daemon=True).start()
+
+    def fetch_frame_index(self, video_path):
+        """PacketIndex of the video (cached per file); None when its packets cannot be read"""
+        try:
+            return cached_packet_index(video_path, self.slide_cache)
+        except Exception as e:
+            print(f"Frame index unavailable: {e}")
+            return None
+
+    def real_times(self, slide_times, frame_index=None):
+        """Detector times (frames read / fps) as real timestamps; unchanged for constant frame rate videos
+
+        Every result shown here comes from a frame-by-frame pass (the pre-screen falls back to one on
+        variable frame rate videos), so the default counting of PacketIndex.real_times applies.
+        """
+        if frame_index is None:
+            frame_index = self.frame_index
+        return frame_index.real_times(slide_times) if frame_index is not None else list(slide_times)
+
+    def create_detector(self):
+        """Detector chosen in the picker (its name and parameters are part of the cache key)"""
+        return create_detector(self.detector_name.get(), verbose=True)
+
+    def detection_cache_reader(self):
+        """How detection fetches frames; part of the cache key, so pre-screened results are kept apart"""
+        return 'packets' if self.packet_prescreen.get() else self.detection_reader
+
+    def detection_segments(self):
+        """How many segments the parallel detection splits this video into; part of the cache key"""
+        return 1 if self.packet_prescreen.get() else self.detection_segment_count
+
+    def on_detector_selected(self, event=None):
+        """Switching the detector or the pre-screen shows the cached slides for those settings"""
+        self.detection_status_label.config(
+            text=f"Detector: {DETECTORS[self.detector_name.get()].description}", fg="blue")
+        if not self.video_path or self.detection_in_progress:
+            return
+        self.slides_detected = []
+        self.slide_hashes = []
+        self.slide_thumbnails = []
+        self.slide_groups = None
+        self.clear_slide_buttons()
+        self.btn_detect.config(text="Detect Slides")
+        self.load_cached_slides()
+
+    def load_cached_slides(self):
+        """Populate the slide list from the detection cache, returns True on a hit"""
+        detector = self.create_detector()
+        cached = self.slide_cache.load(self.video_path, detector, self.detection_cache_reader(),
+                                       self.detection_segments())
+        if not cached:
+            if self.slide_cache.has_checkpoint(self.video_path, detector, self.detection_cache_reader()):
+                self.detection_status_label.config(text="上次检测未完成，点击继续检测", fg="orange")
+                self.btn_detect.config(text="继续检测")
+            return False
+
+        self.slides_detected = self.real_times(cached['slide_times'])
+        self.slide_hashes = [parse_hash(h) for h in cached.get('slide_hashes', [None] * len(self.slides_detected))]
+        self.slide_thumbnails = self.slide_cache.open_thumbnails(cached) or []
+        self.update_slide_groups()
+        self.create_slide_buttons()
+        self.detection_status_label.config(
+            text=f"已从缓存载入: {len(self.slides_detected)} 张幻灯片", fg="green")
+        self.btn_detect.config(text="重新检测")
+        return True
+
     def detect_slides(self):
         """Detect slide change points"""
         if not self.video_path:
@@ -528,357 +777,165 @@ class FFPlayer:
             return
 
         self.detection_in_progress = True
+        self.detection_cancel = CancelToken()
         self.btn_detect.config(state=tk.DISABLED, text="Detecting...")
+        self.btn_stop_detect.config(state=tk.NORMAL)
+        self.detector_combo.config(state=tk.DISABLED)
+        self.chk_packet_prescreen.config(state=tk.DISABLED)
         self.detection_status_label.config(text="Slide Detection Status: Analyzing...", fg="orange")
 
         # Execute detection in new thread
-        self.detection_thread = threading.Thread(target=self.perform_slide_detection, daemon=True)
+        self.detection_thread = threading.Thread(target=self.perform_slide_detection,
+                                                 args=(self.detection_cancel,), daemon=True)
         self.detection_thread.start()
 
+    def cancel_detection(self, detach=False):
+        """Stop the running detection
 
-    def perform_slide_detection(self):
-        """执行优化的幻灯片检测逻辑"""
-        try:
-            self.slides_detected.clear()
-            cap = cv2.VideoCapture(self.video_path)
+        detach=True (switching videos) also drops the run, so its pending
+        UI updates are ignored instead of touching the new video's slide list.
+        """
+        if self.detection_cancel is None:
+            return
+        self.detection_cancel.cancel()
+        self.btn_stop_detect.config(state=tk.DISABLED)
+        if detach:
+            self.detection_cancel = None
+            self.detection_in_progress = False
+            self.detector_combo.config(state="readonly")
+            self.chk_packet_prescreen.config(state=tk.NORMAL)
+        else:
+            self.detection_status_label.config(text="正在停止检测...", fg="orange")
 
-            if not cap.isOpened():
-                raise Exception("Cannot open video file for analysis")
-
-            # 获取视频基本信息
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            video_duration = total_frames / fps if fps > 0 else self.duration
-
-            # === 优化的参数配置 ===
-            # 基础参数
-            base_skip_frames = max(1, int(fps * 0.3))  # 减少跳帧，提高检测精度
-            min_slide_duration = 2.0  # 最小幻灯片持续时间
-            min_static_duration = 1.5  # 最小静止时间（防止频繁误检）
-
-            # 多指标阈值配置
-            thresholds = {
-                'hist_correlation': 0.25,  # 直方图相关性阈值
-                'edge_change_ratio': 0.35,  # 边缘变化比例阈值
-                'chi_square': 25000,  # 卡方距离阈值
-                'ssim_threshold': 0.82,  # SSIM相似度阈值
-                'brightness_change': 0.15,  # 亮度变化阈值
-                'content_change': 0.20  # 内容变化综合阈值
-            }
-
-            # 自适应阈值参数
-            adaptive_params = {
-                'sensitivity_window': 50,  # 敏感度调整窗口
-                'low_activity_boost': 1.2,  # 低活动度增强因子
-                'high_activity_damping': 0.8,  # 高活动度抑制因子
-            }
-
-            # 初始化变量
-            prev_hist = None
-            prev_edges = None
-            prev_gray = None
-            prev_mean_brightness = None
-
-            slide_times = [0.0]  # 默认第一张幻灯片在开始位置
-            frame_count = 0
-            processed_frames = 0
-
-            # 静帧过滤相关变量
-            last_significant_change_time = 0.0
-            recent_changes = []  # 存储最近的变化强度
-            activity_history = []  # 活动度历史
-
-            # 设置进度条
-            expected_processed_frames = total_frames // base_skip_frames
-            self.root.after(0, lambda: self.detection_progress.config(
-                maximum=expected_processed_frames, value=0))
+    def perform_slide_detection(self, cancel_token):
+        """执行优化的幻灯片检测逻辑（检测本身由 slide_engine 完成）"""
+        def ui(callback):
+            # 只有仍是当前检测时才更新界面
+            self.root.after(0, lambda: callback() if self.detection_cancel is cancel_token else None)
 
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
+        # 只有逐帧检测会写断点（预筛选不写）；写没写要看文件，断点按时间间隔保存，刚开始就中断时还没有
+        detector = checkpoint = None
 
-                frame_count += 1
-                current_time = frame_count / fps
+        def resume_hint():
+            if checkpoint is None or not self.slide_cache.has_checkpoint(self.video_path, detector,
+                                                                         self.detection_reader):
+                return ""
+            return "（再次检测将从断点继续）"
 
-                # 动态调整跳帧策略
-                if len(recent_changes) > 10:
-                    avg_change = np.mean(recent_changes[-10:])
-                    if avg_change > 0.5:  # 高变化区域，减少跳帧
-                        skip_frames = max(1, int(base_skip_frames * 0.5))
-                    elif avg_change < 0.1:  # 低变化区域，增加跳帧
-                        skip_frames = min(base_skip_frames * 2, int(fps))
+        try:
+            ui(lambda: (self.slides_detected.clear(), self.slide_hashes.clear(), self.slide_thumbnails.clear(),
+                        self.clear_slide_buttons()))
+            # 检测器按"已读帧数 / fps"计时，显示前换成真实时间（可变帧率的录屏才有差别）
+            frame_index = self.frame_index
+            if frame_index is None:
+                frame_index = self.fetch_frame_index(self.video_path)
+
+            def report_slide(slide_time):
+                slide_time = self.real_times([slide_time], frame_index)[0]
+                ui(lambda: self.append_detected_slide(slide_time))
+
+            def report_progress(processed, expected, current_time, video_duration, slide_count):
+                if processed == 0:
+                    ui(lambda: self.detection_progress.config(maximum=expected, value=0))
+                    return
+                ui(lambda p=processed: self.detection_progress.config(value=p))
+                ui(lambda: self.detection_status_label.config(
+                    text=f"检测进度: {current_time:.1f}s / {video_duration:.1f}s (已找到 {slide_count} 张幻灯片)"))
+
+            detector = self.create_detector()
+            if self.packet_prescreen.get():
+                # 只扫描数据包、在候选位置附近解码，很快，所以不保存断点
+                result = detect_slides_prescreened(self.video_path, detector, progress_callback=report_progress,
+                                                   fallback_duration=self.duration, slide_callback=report_slide,
+                                                   cancel_token=cancel_token, packets=frame_index)
+            else:
+                # 长视频按时间分段，在多个进程中并行检测；定期保存断点，中断后再次检测会从断点继续
+                checkpoint = self.slide_cache.checkpoint_for(self.video_path, detector, self.detection_reader)
+                result = detect_slides_parallel(self.video_path, detector, workers=self.detection_workers,
+                                                progress_callback=report_progress,
+                                                fallback_duration=self.duration, reader=self.detection_reader,
+                                                checkpoint=checkpoint, slide_callback=report_slide,
+                                                cancel_token=cancel_token)
+            slide_times = self.real_times(result.slide_times, frame_index)
+            slide_hashes = result.slide_hashes
+            slide_thumbnails = result.slide_thumbnails
+
+            if result.cancelled:
+                hint = resume_hint()
+
+                def show_cancelled():
+                    if self.keep_partial_slides.get():
+                        rebuild = self.slides_detected != slide_times or self.group_repeated_slides.get()
+                        self.slides_detected = slide_times.copy()
+                        self.slide_hashes = list(slide_hashes)
+                        self.slide_thumbnails = list(slide_thumbnails)
+                        self.update_slide_groups()
+                        if rebuild:
+                            self.create_slide_buttons()
+                        else:
+                            self.refresh_slide_thumbnails()
+                        text = f"检测已停止: 保留 {len(self.slides_detected)} 张幻灯片{hint}"
                     else:
-                        skip_frames = base_skip_frames
-                else:
-                    skip_frames = base_skip_frames
-
-                if frame_count % skip_frames != 0:
-                    continue
+                        self.slides_detected = []
+                        self.slide_hashes = []
+                        self.slide_thumbnails = []
+                        self.slide_groups = None
+                        self.clear_slide_buttons()
+                        text = f"检测已停止{hint}"
+                    self.detection_status_label.config(text=text, fg="orange")
+
+                ui(show_cancelled)
+                return
 
-                processed_frames += 1
-
-                # 更新进度显示
-                if processed_frames % 15 == 0:
-                    progress = processed_frames
-                    self.root.after(0, lambda p=progress: self.detection_progress.config(value=p))
-                    self.root.after(0, lambda t=current_time: self.detection_status_label.config(
-                        text=f"检测进度: {current_time:.1f}s / {video_duration:.1f}s (已找到 {len(slide_times)} 张幻灯片)"))
-
-                # === 特征提取 ===
-                # 预处理帧
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                gray_resized = cv2.resize(gray, (320, 240))
-
-                # 1. 直方图特征
-                hist = cv2.calcHist([gray_resized], [0], None, [256], [0, 256])
-                hist = cv2.normalize(hist, hist).flatten()
-
-                # 2. 边缘特征
-                edges = cv2.Canny(gray_resized, 50, 150)
-                edge_count = np.sum(edges > 0)
-
-                # 3. 亮度特征
-                mean_brightness = np.mean(gray_resized)
-
-                # 4. 纹理特征（简化版LBP）
-                texture_score = self._calculate_texture_score(gray_resized)
-
-                if (prev_hist is not None and prev_edges is not None and
-                        prev_gray is not None and prev_mean_brightness is not None):
-
-                    # === 多指标计算 ===
-                    # 1. 直方图相关性
-                    hist_correlation = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
-
-                    # 2. 边缘变化率
-                    edge_change_ratio = abs(edge_count - prev_edges) / max(prev_edges, 1)
-
-                    # 3. 卡方距离
-                    chi_square = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CHISQR)
-
-                    # 4. SSIM结构相似度（简化实现）
-                    ssim_score = self._calculate_ssim(prev_gray, gray_resized)
-
-                    # 5. 亮度变化
-                    brightness_change = abs(mean_brightness - prev_mean_brightness) / max(prev_mean_brightness, 1)
-
-                    # 6. 整体内容变化度
-                    content_change_score = self._calculate_content_change(
-                        prev_gray, gray_resized, texture_score)
-
-                    # 记录变化强度用于自适应调整
-                    change_intensity = (
-                            (1 - hist_correlation) * 0.3 +
-                            edge_change_ratio * 0.2 +
-                            (1 - ssim_score) * 0.3 +
-                            brightness_change * 0.1 +
-                            content_change_score * 0.1
-                    )
-                    recent_changes.append(change_intensity)
-                    if len(recent_changes) > 50:
-                        recent_changes.pop(0)
-
-                    # === 自适应阈值调整 ===
-                    adjusted_thresholds = self._adjust_thresholds_adaptive(
-                        thresholds, recent_changes, adaptive_params)
-
-                    # === 多指标综合判断 ===
-                    scene_change_indicators = {
-                        'hist_low': hist_correlation < adjusted_thresholds['hist_correlation'],
-                        'edge_high': edge_change_ratio > adjusted_thresholds['edge_change_ratio'],
-                        'chi_high': chi_square > adjusted_thresholds['chi_square'],
-                        'ssim_low': ssim_score < adjusted_thresholds['ssim_threshold'],
-                        'brightness_change': brightness_change > adjusted_thresholds['brightness_change'],
-                        'content_change': content_change_score > adjusted_thresholds['content_change']
-                    }
-
-                    # 综合判断逻辑：需要满足多个条件
-                    scene_change = False
-                    positive_indicators = sum(scene_change_indicators.values())
-
-                    # 强变化：3个或以上指标触发
-                    if positive_indicators >= 3:
-                        scene_change = True
-                    # 中等变化：2个指标触发但包含关键指标
-                    elif positive_indicators >= 2:
-                        if (scene_change_indicators['hist_low'] and scene_change_indicators['ssim_low']) or \
-                                (scene_change_indicators['content_change'] and scene_change_indicators['edge_high']):
-                            scene_change = True
-
-                    # === 静帧过滤机制 ===
-                    if scene_change:
-                        # 检查是否有足够的静止时间
-                        time_since_last_change = current_time - last_significant_change_time
-
-                        # 如果距离上次显著变化时间足够长，且满足最小幻灯片持续时间
-                        if (time_since_last_change >= min_static_duration and
-                                (len(slide_times) == 0 or (current_time - slide_times[-1]) >= min_slide_duration)):
-
-                            # 进一步验证：检查变化是否持续
-                            if self._verify_slide_change(recent_changes, change_intensity):
-                                slide_times.append(current_time)
-                                last_significant_change_time = current_time
-
-                                # 调试信息输出（可选）
-                                print(f"检测到幻灯片切换 {len(slide_times)} 在 {current_time:.2f}s:")
-                                print(f"  - 直方图相关性: {hist_correlation:.3f}")
-                                print(f"  - SSIM: {ssim_score:.3f}")
-                                print(f"  - 边缘变化: {edge_change_ratio:.3f}")
-                                print(f"  - 综合变化强度: {change_intensity:.3f}")
-
-                    # 更新活动度历史
-                    activity_history.append(change_intensity)
-                    if len(activity_history) > 100:
-                        activity_history.pop(0)
-
-                # 更新历史数据
-                prev_hist = hist.copy()
-                prev_edges = edge_count
-                prev_gray = gray_resized.copy()
-                prev_mean_brightness = mean_brightness
-
-            cap.release()
-
-            # === 后处理优化 ===
-            # 移除过于接近的幻灯片切换点
-            if len(slide_times) > 1:
-                slide_times = self._post_process_slide_times(slide_times, min_slide_duration)
+            # 部分结果不写入缓存
+            self.slide_cache.store(self.video_path, detector, result, self.detection_cache_reader())
 
             # 更新结果
             def update_slides_data():
+                # 边检测边显示的列表通常已经完整，只有不一致或要按重复分组显示时才重建
+                rebuild = self.slides_detected != slide_times or self.group_repeated_slides.get()
                 self.slides_detected = slide_times.copy()
-                self.create_slide_buttons()
-                self.detection_status_label.config(
-                    text=f"检测完成: 发现 {len(self.slides_detected)} 张幻灯片", fg="green")
+                self.slide_hashes = list(slide_hashes)
+                self.slide_thumbnails = list(slide_thumbnails)
+                self.update_slide_groups()
+                if rebuild:
+                    self.create_slide_buttons()
+                else:
+                    self.refresh_slide_thumbnails()
+                text = f"检测完成: 发现 {len(self.slides_detected)} 张幻灯片"
+                if self.slide_groups is not None and len(self.slide_groups) < len(self.slides_detected):
+                    text += f"（{len(self.slide_groups)} 张不同的幻灯片）"
+                self.detection_status_label.config(text=text, fg="green")
 
-            self.root.after(0, update_slides_data)
+            ui(update_slides_data)
 
         except Exception as e:
+            # 后台线程里再抛出异常只会打印到控制台，这里直接告诉用户；已保存的断点保留
             error_msg = f"幻灯片检测失败: {str(e)}"
-            self.root.after(0, lambda: self.detection_status_label.config(
-                text="检测失败", fg="red"))
-            raise Exception(error_msg)
+            print(error_msg)
+            status = "检测失败（已保存进度，再次检测将从断点继续）" if resume_hint() else "检测失败"
+            ui(lambda: self.detection_status_label.config(text=status, fg="red"))
+            ui(lambda: messagebox.showerror("Error", error_msg))
 
         finally:
-            self.detection_in_progress = False
-            self.root.after(0, lambda: self.btn_detect.config(state="normal", text="重新检测"))
-            self.root.after(0, lambda: self.detection_progress.config(value=0))
-
-    def _calculate_ssim(self, img1, img2):
-        """计算简化版SSIM（不依赖scikit-image）"""
-        try:
-            # 确保图像类型一致
-            img1 = img1.astype(np.float64)
-            img2 = img2.astype(np.float64)
-
-            # 计算均值
-            mu1 = np.mean(img1)
-            mu2 = np.mean(img2)
-
-            # 计算方差和协方差
-            sigma1_sq = np.var(img1)
-            sigma2_sq = np.var(img2)
-            sigma12 = np.mean((img1 - mu1) * (img2 - mu2))
-
-            # SSIM常数
-            c1 = (0.01 * 255) ** 2
-            c2 = (0.03 * 255) ** 2
-
-            # 计算SSIM
-            numerator = (2 * mu1 * mu2 + c1) * (2 * sigma12 + c2)
-            denominator = (mu1 ** 2 + mu2 ** 2 + c1) * (sigma1_sq + sigma2_sq + c2)
-
-            ssim = numerator / denominator
-            return max(0, min(1, ssim))  # 限制在[0,1]范围内
-        except:
-            return 0.5  # 出错时返回中性值
-
-    def _calculate_texture_score(self, gray_img):
-        """计算纹理复杂度评分"""
-        try:
-            # 使用Sobel算子计算梯度
-            grad_x = cv2.Sobel(gray_img, cv2.CV_64F, 1, 0, ksize=3)
-            grad_y = cv2.Sobel(gray_img, cv2.CV_64F, 0, 1, ksize=3)
-            gradient_magnitude = np.sqrt(grad_x ** 2 + grad_y ** 2)
-
-            # 计算纹理复杂度
-            texture_score = np.std(gradient_magnitude) / (np.mean(gradient_magnitude) + 1e-7)
-            return min(texture_score / 10.0, 1.0)  # 归一化到[0,1]
-        except:
-            return 0.0
-
-    def _calculate_content_change(self, prev_gray, curr_gray, texture_score):
-        """计算整体内容变化度"""
-        try:
-            # 计算帧间差异
-            diff = cv2.absdiff(prev_gray, curr_gray)
-            mean_diff = np.mean(diff)
-
-            # 结合纹理信息
-            content_change = (mean_diff / 255.0) * (1 + texture_score * 0.5)
-            return min(content_change, 1.0)
-        except:
-            return 0.0
-
-    def _adjust_thresholds_adaptive(self, base_thresholds, recent_changes, adaptive_params):
-        """自适应阈值调整"""
-        adjusted = base_thresholds.copy()
-
-        if len(recent_changes) < 10:
-            return adjusted
-
-        # 计算最近的平均活动度
-        recent_activity = np.mean(recent_changes[-adaptive_params['sensitivity_window']:])
-
-        # 根据活动度调整阈值
-        if recent_activity < 0.1:  # 低活动度，提高敏感度
-            factor = adaptive_params['low_activity_boost']
-            adjusted['hist_correlation'] *= factor
-            adjusted['ssim_threshold'] *= factor
-            adjusted['content_change'] /= factor
-        elif recent_activity > 0.4:  # 高活动度，降低敏感度
-            factor = adaptive_params['high_activity_damping']
-            adjusted['hist_correlation'] *= factor
-            adjusted['ssim_threshold'] *= factor
-            adjusted['content_change'] /= factor
-
-        return adjusted
-
-    def _verify_slide_change(self, recent_changes, current_intensity):
-        """验证是否为真正的幻灯片切换"""
-        if len(recent_changes) < 5:
-            return True
-
-        # 检查变化是否显著且持续
-        recent_avg = np.mean(recent_changes[-5:])
-
-        # 当前变化强度应该明显高于最近平均值
-        intensity_ratio = current_intensity / (recent_avg + 1e-7)
-
-        # 如果当前变化是最近几帧中的明显峰值，认为是有效切换
-        return intensity_ratio > 1.5 and current_intensity > 0.15
-
-    def _post_process_slide_times(self, slide_times, min_duration):
-        """后处理：移除过于接近的切换点"""
-        if len(slide_times) <= 1:
-            return slide_times
-
-        filtered_times = [slide_times[0]]  # 保留第一个
-
-        for i in range(1, len(slide_times)):
-            if slide_times[i] - filtered_times[-1] >= min_duration:
-                filtered_times.append(slide_times[i])
-
-        return filtered_times
+            if self.detection_cancel is cancel_token:
+                self.detection_in_progress = False
+            ui(lambda: self.btn_detect.config(state="normal", text="重新检测"))
+            ui(lambda: self.btn_stop_detect.config(state=tk.DISABLED))
+            ui(lambda: self.detector_combo.config(state="readonly"))
+            ui(lambda: self.chk_packet_prescreen.config(state=tk.NORMAL))
+            ui(lambda: self.detection_progress.config(value=0))
 
     def clear_slide_buttons(self):
         """Clear all slide buttons"""
         for btn in self.slide_buttons:
             btn.destroy()
         self.slide_buttons.clear()
+        self.slide_button_slides.clear()
 
     def reset_player(self):
+        # 切换视频时停止旧视频的检测，免得后台进程继续占用 CPU
+        self.cancel_detection(detach=True)
         self.should_stop = True
         self.playing = False
         self.paused = False
@@ -1224,7 +1281,9 @@ class FFPlayer:
                 time.sleep(0.1)
 
                 try:
-                    self.player.seek(target_pos, relative=False)
+                    # 目标正好是关键帧时不需要精确 seek（从前一个关键帧解码到目标）
+                    accurate = self.frame_index is None or not self.frame_index.is_keyframe_time(target_pos)
+                    self.player.seek(target_pos, relative=False, accurate=accurate)
                     self.wait_for_seek_completion_with_verification(target_pos)
                     self.root.after(0, lambda: self.update_time_display(target_pos, self.duration))
                 except Exception as e:
@@ -10,6 +10,8 @@ import cv2
 import os
 from collections import deque
 
+from slide_engine import BasicDetector, detect_slides
+
 
 class FFPlayer:
     def __init__(self, root):
@@ -536,83 +538,21 @@ class FFPlayer:
         self.detection_thread.start()
 
     def perform_slide_detection(self):
-        """Execute main slide detection logic"""
+        """Execute main slide detection logic (slide_engine.BasicDetector)"""
         try:
             self.slides_detected.clear()
 
-            cap = cv2.VideoCapture(self.video_path)
-
-            if not cap.isOpened():
-                raise Exception("Cannot open video file for analysis")
-
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            video_duration = total_frames / fps if fps > 0 else self.duration
-
-            skip_frames = max(1, int(fps * 0.5))
-            threshold = 0.1
-            min_slide_duration = 1.0
-
-            prev_hist = None
-            prev_edges = None
-            slide_times = [0.0]  # Default first slide at beginning
-            frame_count = 0
-            processed_frames = 0
-
-            self.root.after(0, lambda: self.detection_progress.config(maximum=total_frames // skip_frames, value=0))
-
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame_count += 1
-
-                if frame_count % skip_frames != 0:
-                    continue
-
-                processed_frames += 1
-                current_time = frame_count / fps
-
-                if processed_frames % 10 == 0:
-                    progress = processed_frames
-                    self.root.after(0, lambda p=progress: self.detection_progress.config(value=p))
-                    self.root.after(0, lambda t=current_time: self.detection_status_label.config(
-                        text=f"Detection Progress: {current_time:.1f}s / {video_duration:.1f}s"))
-
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                gray = cv2.resize(gray, (320, 240))
-
-                hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-                hist = cv2.normalize(hist, hist).flatten()
-
-                edges = cv2.Canny(gray, 50, 150)
-                edge_count = np.sum(edges > 0)
-
-                if prev_hist is not None and prev_edges is not None:
-                    correlation = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
-                    edge_change = abs(edge_count - prev_edges) / max(prev_edges, 1)
-
-                    scene_change = False
-
-                    if correlation < threshold:
-                        scene_change = True
-
-                    if edge_change > 0.3:
-                        scene_change = True
-
-                    chi_square = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CHISQR)
-                    if chi_square > 30000:
-                        scene_change = True
-
-                    if scene_change:
-                        if len(slide_times) == 0 or (current_time - slide_times[-1]) >= min_slide_duration:
-                            slide_times.append(current_time)
-
-                prev_hist = hist.copy()
-                prev_edges = edge_count
-
-            cap.release()
+            def report_progress(processed, expected, current_time, video_duration, slide_count):
+                if processed == 0:
+                    self.root.after(0, lambda: self.detection_progress.config(maximum=expected, value=0))
+                    return
+                self.root.after(0, lambda p=processed: self.detection_progress.config(value=p))
+                self.root.after(0, lambda: self.detection_status_label.config(
+                    text=f"Detection Progress: {current_time:.1f}s / {video_duration:.1f}s"))
+
+            result = detect_slides(self.video_path, BasicDetector(), progress_callback=report_progress,
+                                   progress_interval=10, fallback_duration=self.duration)
+            slide_times = result.slide_times
 
             def update_slides_data():
                 self.slides_detected = slide_times.copy()
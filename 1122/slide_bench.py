@@ -0,0 +1,570 @@
+"""检测基准：生成已知切换时间的合成课程视频，并测量各检测算法的速度、内存和准确率
+
+    python slide_bench.py generate bench/                 # 写入 bench/*.mp4 和 bench/corpus.json
+    python slide_bench.py run bench/corpus.json -o bench_results.json
+    python slide_bench.py run bench/corpus.json --detector handwriting --tolerance 1.5
+    python slide_bench.py run bench/corpus.json --mode packets   # 粗到细 / 数据包预筛选的漏检也要量
+    python slide_bench.py check                                   # 自检，有失败时退出码为 1
+
+合成视频包含硬切换、淡入淡出切换、逐笔出现的手写批注、右下角的讲师画中画和翻回前面的幻灯片，
+其中手写和画中画都不应被判为切换。corpus.json 的格式与 slide_tune.py 的标注文件相同，
+另外用 slide_ids 标出每张幻灯片是第几张不同的幻灯片，用来检查重复幻灯片的分组。
+
+每次检测在单独的子进程中运行，峰值内存（ru_maxrss）互不影响。
+
+check 子命令生成几个小视频，检查已知答案的性质（例如可变帧率视频换算出的真实时间），
+不需要事先生成语料。
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from slide_cache import DetectionCheckpoint
+from slide_engine import (DEFAULT_GATE_THRESHOLD, DETECTORS, READERS, CancelToken, create_detector, detect_slides,
+                          detect_slides_coarse_to_fine, format_hash, resolve_reader)
+from slide_index import SlideGroups
+from slide_packets import detect_slides_prescreened, scan_packets
+from slide_series import decide_handwriting_series, decide_series, decide_series_vectorized, extract_feature_series
+from slide_tune import DEFAULT_GRID, build_detector, expand_grid, load_ground_truth, match_slides, precision_recall_f1
+
+try:
+    import resource  # 仅 Unix
+except ImportError:
+    resource = None
+
+try:
+    from ffpyplayer.pic import Image, SWScale
+    from ffpyplayer.writer import MediaWriter
+except ImportError:  # OpenCV 的 VideoWriter 只能写恒定帧率
+    MediaWriter = None
+
+# 语料中的视频：名称、分辨率、帧率、幻灯片数，以及是否加入手写 / 淡入淡出 / 画中画 / 翻回前面的幻灯片
+CORPUS = [
+    {'name': 'plain_360p25', 'size': (640, 360), 'fps': 25, 'slides': 8,
+     'handwriting': False, 'fades': False, 'inset': False, 'revisits': False},
+    {'name': 'fades_480p30', 'size': (854, 480), 'fps': 30, 'slides': 10,
+     'handwriting': False, 'fades': True, 'inset': False, 'revisits': False},
+    {'name': 'handwriting_720p25', 'size': (1280, 720), 'fps': 25, 'slides': 8,
+     'handwriting': True, 'fades': False, 'inset': False, 'revisits': False},
+    {'name': 'lecture_720p30', 'size': (1280, 720), 'fps': 30, 'slides': 12,
+     'handwriting': True, 'fades': True, 'inset': True, 'revisits': False},
+    {'name': 'lecture_1080p24', 'size': (1920, 1080), 'fps': 24, 'slides': 6,
+     'handwriting': True, 'fades': True, 'inset': True, 'revisits': False},
+    {'name': 'revisits_480p25', 'size': (854, 480), 'fps': 25, 'slides': 16,
+     'handwriting': True, 'fades': True, 'inset': False, 'revisits': True},
+    {'name': 'long_360p15', 'size': (640, 360), 'fps': 15, 'slides': 40,
+     'handwriting': True, 'fades': True, 'inset': True, 'revisits': False},
+]
+
+SLIDE_SECONDS = (4.0, 15.0)  # 每张幻灯片的停留时间范围
+REVISIT_PROBABILITY = 0.3  # revisits 视频里每次切换翻回前面某张幻灯片的概率
+FADE_SECONDS = 0.6  # 淡入淡出的时长，标注时间取淡变的中点
+NOISE_FRAMES = 8  # 循环使用的传感器噪声帧数
+
+# 可测的检测方式，与 slide_cli.py 的 --mode 同名
+MODES = ('linear', 'coarse', 'packets')
+
+# check 用的课程视频：手写、淡入淡出、画中画和翻回都有，自适应阈值和静帧过滤都会用到
+CHECK_SPEC = {'name': 'check_lecture', 'size': (640, 360), 'fps': 25, 'slides': 8,
+              'handwriting': True, 'fades': True, 'inset': True, 'revisits': True}
+# check 用的可变帧率视频：每段（时长秒, 帧率）依次拼接，像画面静止时降帧的录屏；在 changes 的时刻换幻灯片
+VFR_SPEC = {'size': (320, 240), 'segments': ((10.0, 30), (10.0, 10)), 'changes': (5.0, 12.0, 16.0)}
+
+
+def render_slide(rng, size, index):
+    """画一张幻灯片：纯色背景、标题、几行"文字"和几个图形"""
+    w, h = size
+    scale = h / 360
+    bg = rng.integers(150, 256, 3) if rng.random() < 0.7 else rng.integers(0, 100, 3)
+    fg = (20, 20, 20) if bg.mean() > 128 else (235, 235, 235)
+    img = np.empty((h, w, 3), np.uint8)
+    img[:] = bg
+    cv2.putText(img, f"Slide {index + 1}", (int(30 * scale), int(55 * scale)), cv2.FONT_HERSHEY_SIMPLEX,
+                1.4 * scale, fg, max(1, int(3 * scale)))
+    for line in range(int(rng.integers(2, 6))):
+        y = int((95 + line * 38) * scale)
+        words = ' '.join('x' * int(rng.integers(2, 9)) for _ in range(int(rng.integers(3, 7))))
+        cv2.putText(img, '- ' + words, (int(40 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 0.7 * scale, fg,
+                    max(1, int(2 * scale)))
+    for _ in range(int(rng.integers(1, 4))):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        x0, y0 = int(rng.integers(w // 2, w - 60)), int(rng.integers(h // 4, h - 60))
+        x1, y1 = min(w - 1, x0 + int(rng.integers(40, w // 3))), min(h - 1, y0 + int(rng.integers(30, h // 3)))
+        if rng.random() < 0.5:
+            cv2.rectangle(img, (x0, y0), (x1, y1), color, -1 if rng.random() < 0.5 else max(1, int(3 * scale)))
+        else:
+            cv2.circle(img, ((x0 + x1) // 2, (y0 + y1) // 2), max(10, min(x1 - x0, y1 - y0) // 2), color, -1)
+    return img
+
+
+def handwriting_strokes(rng, size, frames):
+    """一张幻灯片上的手写批注：返回每帧新增的线段列表（随机游走的笔迹，中间有停笔）"""
+    w, h = size
+    scale = h / 360
+    segments = [[] for _ in range(frames)]
+    frame = int(rng.integers(frames // 6, frames // 3 + 1))
+    while frame < frames:
+        # 一笔：在某个区域里连续画 0.5~2 秒
+        x, y = float(rng.integers(w // 10, w // 2)), float(rng.integers(h // 3, h - h // 6))
+        angle = rng.uniform(0, 2 * np.pi)
+        for _ in range(int(rng.integers(12, 50))):
+            if frame >= frames:
+                break
+            angle += rng.normal(0, 0.6)
+            nx = float(np.clip(x + np.cos(angle) * 4 * scale, 0, w - 1))
+            ny = float(np.clip(y + np.sin(angle) * 4 * scale, 0, h - 1))
+            segments[frame].append(((int(x), int(y)), (int(nx), int(ny))))
+            x, y = nx, ny
+            frame += 1
+        frame += int(rng.integers(5, 40))  # 停笔
+    return segments
+
+
+def draw_inset(img, frame_index, fps):
+    """右下角的讲师画面：缓慢晃动的头部和张合的嘴"""
+    h, w = img.shape[:2]
+    iw, ih = w // 5, h // 4
+    x0, y0 = w - iw - w // 40, h - ih - h // 40
+    inset = img[y0:y0 + ih, x0:x0 + iw]
+    inset[:] = (70, 90, 110)
+    t = frame_index / fps
+    cx = int(iw / 2 + np.sin(t * 0.9) * iw * 0.08)
+    cy = int(ih * 0.45 + np.sin(t * 1.7) * ih * 0.03)
+    cv2.ellipse(inset, (cx, ih + ih // 6), (iw // 3, ih // 3), 0, 0, 360, (40, 40, 120), -1)  # 肩膀
+    cv2.ellipse(inset, (cx, cy), (iw // 7, ih // 4), 0, 0, 360, (150, 180, 220), -1)  # 脸
+    mouth = max(1, int(abs(np.sin(t * 9.0)) * ih * 0.04))
+    cv2.ellipse(inset, (cx, cy + ih // 9), (iw // 20, mouth), 0, 0, 360, (40, 40, 80), -1)
+    cv2.rectangle(inset, (0, 0), (iw - 1, ih - 1), (255, 255, 255), max(1, h // 360))
+
+
+def generate_video(path, spec, seed=0):
+    """按 spec 写出一个视频，返回标注（切换时间，从 0.0 开始）"""
+    rng = np.random.default_rng(seed)
+    w, h = spec['size']
+    fps = spec['fps']
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (w, h))
+    if not writer.isOpened():
+        raise RuntimeError(f"Cannot open video writer for {path}")
+
+    noise = [np.repeat(rng.integers(0, 3, (h, w, 1), dtype=np.uint8), 3, axis=2) for _ in range(NOISE_FRAMES)]
+    fade_frames = max(2, int(round(FADE_SECONDS * fps)))
+    slide_times = [0.0]
+    slide_ids = []
+    originals = []  # 每张不同幻灯片的原始画面（不含手写），翻回时重新使用
+    frame_index = 0
+    previous = None
+    try:
+        for index in range(spec['slides']):
+            if spec['revisits'] and len(originals) >= 2 and rng.random() < REVISIT_PROBABILITY:
+                # 翻回前面的某张幻灯片（不是刚刚那张）
+                slide_id = int(rng.integers(0, len(originals) - 1))
+                if slide_id == slide_ids[-1]:
+                    slide_id = len(originals) - 1 if slide_ids[-1] != len(originals) - 1 else 0
+                slide = originals[slide_id].copy()
+            else:
+                slide_id = max(slide_ids, default=-1) + 1
+                slide = render_slide(rng, (w, h), slide_id)
+                if spec['revisits']:
+                    originals.append(slide.copy())
+            slide_ids.append(slide_id)
+            frames = int(round(rng.uniform(*SLIDE_SECONDS) * fps))
+            fade = spec['fades'] and previous is not None and rng.random() < 0.5
+            if index > 0:
+                # 淡变时取中点作为切换时间
+                slide_times.append((frame_index + (fade_frames // 2 if fade else 0)) / fps)
+            strokes = handwriting_strokes(rng, (w, h), frames) if spec['handwriting'] and rng.random() < 0.7 else None
+            thickness = max(2, h // 240)
+            ink = tuple(int(c) for c in rng.choice([(0, 0, 220), (200, 30, 30), (20, 140, 20)]))
+            for k in range(frames):
+                if strokes is not None:
+                    for p0, p1 in strokes[k]:
+                        cv2.line(slide, p0, p1, ink, thickness, cv2.LINE_AA)
+                if fade and k < fade_frames:
+                    frame = cv2.addWeighted(previous, 1.0 - (k + 1) / (fade_frames + 1),
+                                            slide, (k + 1) / (fade_frames + 1), 0)
+                else:
+                    frame = slide.copy()
+                if spec['inset']:
+                    draw_inset(frame, frame_index, fps)
+                cv2.add(frame, noise[frame_index % NOISE_FRAMES], dst=frame)
+                writer.write(frame)
+                frame_index += 1
+            previous = slide
+    finally:
+        writer.release()
+    return {'slide_times': [round(t, 4) for t in slide_times], 'slide_ids': slide_ids, 'frames': frame_index,
+            'duration': frame_index / fps}
+
+
+def generate_corpus(output_dir, specs=CORPUS, seed=0):
+    """写出全部视频和 corpus.json，返回 corpus.json 的路径
+
+    每个视频的随机种子由 seed 和视频名称决定，只生成其中几个（--only）时内容不变。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    entries = []
+    for spec in specs:
+        path = os.path.join(output_dir, spec['name'] + '.mp4')
+        start = time.perf_counter()
+        truth = generate_video(path, spec, seed + zlib.crc32(spec['name'].encode('utf-8')))
+        entry = {'video': os.path.abspath(path), 'width': spec['size'][0], 'height': spec['size'][1],
+                 'fps': spec['fps'], 'handwriting': spec['handwriting'], 'fades': spec['fades'],
+                 'inset': spec['inset'], 'revisits': spec['revisits']}
+        entry.update(truth)
+        entries.append(entry)
+        print(f"{path}: {truth['frames']} frames, {len(truth['slide_times'])} slides "
+              f"({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+    corpus_path = os.path.join(output_dir, 'corpus.json')
+    with open(corpus_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+    return corpus_path
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），不支持的平台返回 None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_one(video_path, detector_name, reader, gate_threshold=DEFAULT_GATE_THRESHOLD, mode='linear'):
+    """在子进程中检测一个视频，返回计时、内存和检测结果（reader 只对 linear 有效）"""
+    detector = create_detector(detector_name, ignore_unknown=True, gate_threshold=gate_threshold)
+    reader = resolve_reader(reader, video_path) if mode == 'linear' else None
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == 'coarse':
+        result = detect_slides_coarse_to_fine(video_path, detector)
+    elif mode == 'packets':
+        result = detect_slides_prescreened(video_path, detector)
+    else:
+        result = detect_slides(video_path, detector, reader=reader)
+    wall = time.perf_counter() - start
+    return {
+        'video': video_path,
+        'detector': detector_name,
+        'mode': mode,
+        'reader': reader,
+        'wall_seconds': wall,
+        'frames': result.total_frames,
+        'processed_frames': result.processed_frames,
+        'fps': result.total_frames / wall if wall > 0 else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'baseline_rss_mb': baseline,
+        'gate_hit_rate': result.stats.get('gate_hit_rate', 0.0),
+        'slide_times': result.slide_times,
+        'slide_hashes': result.slide_hashes,
+    }
+
+
+def score(record, truth, tolerance):
+    tp, fp, fn = match_slides(record['slide_times'], truth, tolerance)
+    record.update(tp=tp, fp=fp, fn=fn)
+    record['f1'] = precision_recall_f1(tp, fp, fn)[2]
+    return record
+
+
+def group_accuracy(record, truth_times, slide_ids, tolerance):
+    """重复幻灯片分组的准确率：检测到的幻灯片两两之间"是否同组"与标注一致的比例
+
+    每张检测到的幻灯片对应到它开始时正在显示的标注幻灯片；没有成对的幻灯片时返回 None。
+    """
+    groups = SlideGroups(record['slide_times'], record['slide_hashes'])
+    labels = []
+    for t in record['slide_times']:
+        shown = [i for i, start in enumerate(truth_times) if start <= t + tolerance]
+        labels.append(slide_ids[shown[-1]] if shown else None)
+    agree = total = 0
+    for i in range(len(labels)):
+        for j in range(i + 1, len(labels)):
+            if labels[i] is None or labels[j] is None:
+                continue
+            total += 1
+            agree += (groups.group_of[i] == groups.group_of[j]) == (labels[i] == labels[j])
+    return agree / total if total else None
+
+
+def run_benchmark(truth, detectors, reader, tolerance, repeat=1, gate_threshold=DEFAULT_GATE_THRESHOLD,
+                  slide_ids=None, mode='linear'):
+    """对每个 (视频, 检测算法) 组合运行 repeat 次，保留最快的一次"""
+    results = []
+    for video_path, times in truth.items():
+        for name in detectors:
+            best = None
+            for _ in range(repeat):
+                # 每次都用新进程：ru_maxrss 只增不减，共用进程时后面的测量会被前面的峰值掩盖
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    record = pool.submit(bench_one, video_path, name, reader, gate_threshold, mode).result()
+                if best is None or record['wall_seconds'] < best['wall_seconds']:
+                    best = record
+            score(best, times, tolerance)
+            if slide_ids and video_path in slide_ids:
+                best['group_accuracy'] = group_accuracy(best, times, slide_ids[video_path], tolerance)
+            best['slide_hashes'] = [format_hash(h) for h in best['slide_hashes']]
+            results.append(best)
+            print(f"{name:>12}  {os.path.basename(video_path)}: {best['wall_seconds']:.2f}s", file=sys.stderr)
+    return results
+
+
+def summarize(results):
+    """按检测算法汇总：总帧数 / 总耗时，最大峰值内存，合计 TP/FP/FN"""
+    summary = {}
+    for r in results:
+        s = summary.setdefault(r['detector'], {'frames': 0, 'wall_seconds': 0.0, 'peak_rss_mb': None,
+                                               'tp': 0, 'fp': 0, 'fn': 0})
+        s['frames'] += r['frames']
+        s['wall_seconds'] += r['wall_seconds']
+        if r['peak_rss_mb'] is not None:
+            s['peak_rss_mb'] = max(s['peak_rss_mb'] or 0.0, r['peak_rss_mb'])
+        for key in ('tp', 'fp', 'fn'):
+            s[key] += r[key]
+    for s in summary.values():
+        s['fps'] = s['frames'] / s['wall_seconds'] if s['wall_seconds'] > 0 else 0.0
+        s['precision'], s['recall'], s['f1'] = precision_recall_f1(s['tp'], s['fp'], s['fn'])
+    return summary
+
+
+def _format_rss(value):
+    return f"{value:8.1f}" if value is not None else f"{'n/a':>8}"
+
+
+def _format_ratio(value):
+    return f"{value:6.3f}" if value is not None else f"{'-':>6}"
+
+
+def print_report(results, summary):
+    print(f"{'detector':>12} {'video':<24} {'frames':>7} {'wall s':>7} {'frames/s':>9} {'RSS MB':>8} "
+          f"{'gate':>6} {'TP':>4} {'FP':>4} {'FN':>4} {'F1':>6} {'groups':>6}")
+    for r in results:
+        print(f"{r['detector']:>12} {os.path.basename(r['video']):<24} {r['frames']:7d} {r['wall_seconds']:7.2f} "
+              f"{r['fps']:9.1f} {_format_rss(r['peak_rss_mb'])} {r['gate_hit_rate']:6.1%} "
+              f"{r['tp']:4d} {r['fp']:4d} {r['fn']:4d} {r['f1']:6.3f} "
+              f"{_format_ratio(r.get('group_accuracy'))}")
+    print()
+    print(f"{'detector':>12} {'frames':>8} {'wall s':>8} {'frames/s':>9} {'RSS MB':>8} "
+          f"{'P':>6} {'R':>6} {'F1':>6}")
+    for name, s in summary.items():
+        print(f"{name:>12} {s['frames']:8d} {s['wall_seconds']:8.2f} {s['fps']:9.1f} {_format_rss(s['peak_rss_mb'])} "
+              f"{s['precision']:6.3f} {s['recall']:6.3f} {s['f1']:6.3f}")
+
+
+def generate_vfr_video(path, spec=VFR_SPEC, seed=0):
+    """用 ffpyplayer 按给定时间戳写出可变帧率视频，返回每帧的真实时间"""
+    if MediaWriter is None:
+        raise RuntimeError("ffpyplayer is required to write variable frame rate videos")
+    rng = np.random.default_rng(seed)
+    w, h = spec['size']
+    frame_times = []
+    start = 0.0
+    for seconds, fps in spec['segments']:
+        frame_times.extend(start + k / fps for k in range(int(round(seconds * fps))))
+        start += seconds
+    slides = [cv2.cvtColor(render_slide(rng, (w, h), i), cv2.COLOR_BGR2RGB)
+              for i in range(len(spec['changes']) + 1)]
+    # frame_rate 决定时间基，取最高的帧率，各段的时间戳才都能精确表示
+    max_fps = max(fps for _, fps in spec['segments'])
+    writer = MediaWriter(path, [{'pix_fmt_in': 'yuv420p', 'width_in': w, 'height_in': h, 'codec': 'mpeg4',
+                                 'frame_rate': (max_fps, 1)}], fmt='mp4', overwrite=True)
+    scale = SWScale(w, h, 'rgb24', ofmt='yuv420p')
+    try:
+        for t in frame_times:
+            slide = slides[int(np.searchsorted(spec['changes'], t + 1e-9))]
+            writer.write_frame(scale.scale(Image(plane_buffers=[slide.tobytes()], pix_fmt='rgb24', size=(w, h))), t)
+    finally:
+        writer.close()
+    return frame_times
+
+
+def check_real_times(work_dir):
+    """可变帧率视频上 PacketIndex.real_times 把检测器的时间换成分析的那一帧的真实时间"""
+    path = os.path.join(work_dir, 'vfr.mp4')
+    frame_times = np.asarray(generate_vfr_video(path))
+    packets = scan_packets(path)
+    assert packets.is_variable_rate(), "the test video is not detected as variable frame rate"
+    assert len(packets) == len(frame_times), f"{len(packets)} packets for {len(frame_times)} frames"
+    assert np.allclose(packets.times, frame_times, atol=1e-3), "packet timestamps differ from the written ones"
+
+    # 逐帧扫描在读完第 i 帧（帧号 i，已读 i + 1 帧）时计时；粗到细检测直接用帧号
+    frames = np.arange(len(frame_times))
+    counted = packets.real_times(list((frames + 1) / packets.fps))
+    assert np.allclose(counted, frame_times, atol=1e-3), "frames-read times map to the wrong frames"
+    indexed = packets.real_times(list(frames / packets.fps), counted=False)
+    assert np.allclose(indexed, frame_times, atol=1e-3), "frame-number times map to the wrong frames"
+
+    # 端到端：按固定步长扫描，换算出的时间应是第一个拍到新幻灯片的采样帧，它前一个采样帧还在切换之前
+    detector = create_detector(adaptive_skip=False)
+    result = detect_slides(path, detector)
+    detected = packets.real_times(result.slide_times)[1:]
+    changes = VFR_SPEC['changes']
+    assert len(detected) == len(changes), f"found changes at {detected}, expected {list(changes)}"
+    for found, change in zip(detected, changes):
+        previous = packets.times[max(packets.frame_at(found) - detector.base_skip_frames, 0)]
+        assert previous < change <= found, f"change at {change}s reported at {found}s"
+
+
+def check_video(work_dir):
+    """CHECK_SPEC 的视频，同一目录里的几项自检共用"""
+    path = os.path.join(work_dir, CHECK_SPEC['name'] + '.mp4')
+    if not os.path.exists(path):
+        generate_video(path, CHECK_SPEC)
+    return path
+
+
+def check_series(work_dir):
+    """同一条特征序列上，逐点判断（decide_series）与向量化判断给出相同的切换时间，默认网格的每组参数都比"""
+    series, meta = extract_feature_series(check_video(work_dir))
+    for config in [{}] + expand_grid(DEFAULT_GRID):
+        expected = decide_series(series, meta['fps'], build_detector(config))
+        actual = decide_series_vectorized(series, meta['fps'], build_detector(config))
+        assert actual == expected, f"{config or 'defaults'}: vectorized {actual}, per-sample {expected}"
+
+
+def check_handwriting_series(work_dir):
+    """重放手写指标序列与 HandwritingDetector 逐帧检测给出相同的切换时间
+
+    除默认参数外再比一组会多检出切换的参数，确认调优参数在两条路径上都生效。
+    """
+    path = check_video(work_dir)
+    series, meta = extract_feature_series(path, 1.0, kind='handwriting')
+    for config in ({}, {'change_max_score': 10, 'writing_decay': 0.3, 'min_slide_duration': 1.0}):
+        expected = detect_slides(path, build_detector(config, 'handwriting')).slide_times
+        actual = decide_handwriting_series(series, meta['fps'], build_detector(config, 'handwriting'))
+        assert actual == expected, f"{config or 'defaults'}: replayed {actual}, frame by frame {expected}"
+
+
+def check_pipeline(work_dir):
+    """解码线程 + 环形缓冲（ring_size）不改变任何检测器的结果"""
+    path = check_video(work_dir)
+    for name in DETECTORS:
+        expected = detect_slides(path, create_detector(name))
+        actual = detect_slides(path, create_detector(name), ring_size=8)
+        assert actual.slide_times == expected.slide_times, \
+            f"{name}: {actual.slide_times} with ring_size=8, {expected.slide_times} without"
+        assert actual.slide_hashes == expected.slide_hashes, f"{name}: slide hashes differ with ring_size=8"
+
+
+def check_resume(work_dir):
+    """中途取消再从断点续检：两次处理的采样帧数之和与切换时间都和一次检测完相同"""
+    path = check_video(work_dir)
+    for name in DETECTORS:
+        full = detect_slides(path, create_detector(name))
+        checkpoint = DetectionCheckpoint(os.path.join(work_dir, f'resume_{name}.ckpt.npz'))
+        checkpoint.clear()
+        cancel_token = CancelToken()
+        halfway = full.processed_frames // 2
+
+        def cancel_halfway(processed, *args):
+            if processed == halfway:
+                cancel_token.cancel()
+
+        first = detect_slides(path, create_detector(name), progress_callback=cancel_halfway, progress_interval=1,
+                              checkpoint=checkpoint, cancel_token=cancel_token)
+        assert first.cancelled, f"{name}: cancelling did not stop the detection"
+        rest = detect_slides(path, create_detector(name), checkpoint=checkpoint)
+        samples = first.processed_frames + rest.processed_frames
+        assert samples == full.processed_frames, \
+            f"{name}: {first.processed_frames} + {rest.processed_frames} samples, {full.processed_frames} in one run"
+        assert rest.slide_times == full.slide_times, \
+            f"{name}: resumed {rest.slide_times}, one run {full.slide_times}"
+
+
+# check 子命令的自检：名称 -> 函数(work_dir)，失败时抛 AssertionError
+CHECKS = {
+    'real-times': check_real_times,
+    'series': check_series,
+    'handwriting-series': check_handwriting_series,
+    'pipeline': check_pipeline,
+    'resume': check_resume,
+}
+
+
+def run_checks(names, work_dir):
+    """依次运行自检并打印结果，返回失败的个数"""
+    failures = 0
+    for name in names:
+        start = time.perf_counter()
+        try:
+            CHECKS[name](work_dir)
+        except Exception as e:  # 断言失败，或写不出测试视频（如没装 ffpyplayer）
+            failures += 1
+            print(f"FAIL  {name}: {e}")
+        else:
+            print(f"ok    {name} ({time.perf_counter() - start:.1f}s)")
+    return failures
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Synthetic lecture-video benchmark for the slide detectors.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help="Write the synthetic corpus and its corpus.json")
+    gen.add_argument('output_dir', help="Directory for the generated videos")
+    gen.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    gen.add_argument('--only', action='append', choices=[spec['name'] for spec in CORPUS],
+                     help="Generate only this video (repeatable)")
+
+    run = sub.add_parser('run', help="Benchmark the detectors on a corpus")
+    run.add_argument('truth', help="corpus.json from 'generate', or any slide_tune.py ground truth file")
+    run.add_argument('--detector', action='append', choices=sorted(DETECTORS),
+                     help="Detector to benchmark (repeatable; default: all registered detectors)")
+    run.add_argument('--mode', choices=MODES, default='linear',
+                     help="Detection mode, as in slide_cli.py (default: linear)")
+    run.add_argument('--reader', choices=READERS, default='opencv',
+                     help="Frame reader, linear mode only (default: opencv)")
+    run.add_argument('--tolerance', type=float, default=1.0,
+                     help="Max seconds between a detected and an annotated change to count as a match "
+                          "(default: 1)")
+    run.add_argument('--gate-threshold', type=float, default=DEFAULT_GATE_THRESHOLD,
+                     help="Static-frame gate threshold passed to every detector (0 disables; "
+                          "default: %(default)s)")
+    run.add_argument('--repeat', type=int, default=1, help="Runs per video and detector; the fastest is kept")
+    run.add_argument('-o', '--output', help="Write per-run results and the summary to this JSON file")
+
+    check = sub.add_parser('check', help="Run the self-checks on small generated videos")
+    check.add_argument('--only', action='append', choices=list(CHECKS), help="Run only this check (repeatable)")
+    check.add_argument('--work-dir', help="Keep the generated videos here (default: a temporary directory)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'generate':
+        specs = [spec for spec in CORPUS if not args.only or spec['name'] in args.only]
+        print(generate_corpus(args.output_dir, specs, args.seed))
+        return 0
+    if args.command == 'check':
+        names = args.only or list(CHECKS)
+        if args.work_dir:
+            os.makedirs(args.work_dir, exist_ok=True)
+            return 1 if run_checks(names, args.work_dir) else 0
+        with tempfile.TemporaryDirectory() as work_dir:
+            return 1 if run_checks(names, work_dir) else 0
+
+    truth = load_ground_truth(args.truth)
+    with open(args.truth, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    slide_ids = ({entry['video']: entry['slide_ids'] for entry in entries if 'slide_ids' in entry}
+                 if isinstance(entries, list) else None)
+    detectors = args.detector or list(DETECTORS)
+    results = run_benchmark(truth, detectors, args.reader, args.tolerance, max(1, args.repeat),
+                            args.gate_threshold, slide_ids, args.mode)
+    summary = summarize(results)
+    print_report(results, summary)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'results': results, 'summary': summary}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
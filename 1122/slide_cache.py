@@ -0,0 +1,255 @@
+"""幻灯片检测结果的磁盘缓存
+
+同一个视频反复打开时不必重新扫描。缓存键由两部分组成：
+  - 文件指纹：大小、修改时间、若干采样数据块的哈希（不读整个文件，大文件也很快）
+  - 检测器名称与全部参数（thresholds、adaptive_params 等）以及取帧方式
+任一部分变化都会得到新的键，旧结果自然失效。
+
+检测时截取的每张幻灯片缩略图与结果同键，存成一个 (幻灯片数, 高, 宽) 的 .npy 图集，
+读取时内存映射，界面显示缩略图不需要重新解码视频，也不必把全部缩略图读进内存。
+
+与检测参数无关、只取决于视频本身的数据（如关键帧与时间戳索引）用 video_key 得到的键，
+每个视频只需计算一次。
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+# 缓存目录，可用环境变量 SLIDE_CACHE_DIR 覆盖
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "slide_detection")
+
+# 采样哈希：读取的数据块数量和大小
+FINGERPRINT_BLOCKS = 8
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+
+# 检测断点的保存间隔（秒）
+CHECKPOINT_INTERVAL = 15.0
+
+# 缩略图图集的文件后缀
+THUMBNAIL_SUFFIX = '.thumbs.npy'
+
+
+def file_fingerprint(video_path, blocks=FINGERPRINT_BLOCKS, block_size=FINGERPRINT_BLOCK_SIZE):
+    """快速文件指纹：大小 + 修改时间 + 均匀分布的若干数据块的 SHA-1"""
+    st = os.stat(video_path)
+    size = st.st_size
+    digest = hashlib.sha1()
+    with open(video_path, 'rb') as f:
+        if size <= blocks * block_size:
+            digest.update(f.read())
+        else:
+            # 包含开头和结尾：容器头和索引通常在这两处
+            step = (size - block_size) // (blocks - 1)
+            for i in range(blocks):
+                f.seek(i * step)
+                digest.update(f.read(block_size))
+    return {'size': size, 'mtime_ns': st.st_mtime_ns, 'sample_hash': digest.hexdigest()}
+
+
+def cache_key(fingerprint, detector_name, params):
+    """由文件指纹和检测参数得到缓存键"""
+    payload = json.dumps({'file': fingerprint, 'detector': detector_name, 'params': params},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换，避免中途退出留下半个文件"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def write_thumbnail_atlas(path, thumbnails):
+    """把缩略图列表写成一个 .npy 图集，返回没有缩略图的序号；全部缺失时不写文件，返回 None
+
+    同样先写临时文件再替换。缺失的位置填 0。
+    """
+    present = [image for image in thumbnails if image is not None]
+    if not present:
+        return None
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        atlas = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8,
+                                          shape=(len(thumbnails),) + present[0].shape)
+        missing = []
+        for i, image in enumerate(thumbnails):
+            if image is None:
+                atlas[i] = 0
+                missing.append(i)
+            else:
+                atlas[i] = image
+        atlas.flush()
+        del atlas
+        os.replace(tmp_path, path)
+        return missing
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class DetectionCheckpoint:
+    """检测进度断点：处理到的帧号 + 检测器状态（detector.get_state()）
+
+    保存为 .npz：数组状态原样存放，其余状态存为一个 JSON 字符串，
+    读取时不需要 pickle。文件名来自缓存键，视频或参数变化后旧断点自然不会被使用。
+    """
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._last_save = time.monotonic()
+
+    def for_segment(self, index, count):
+        """并行检测时每个时间段使用独立的断点文件"""
+        base = self.path[:-len('.npz')] if self.path.endswith('.npz') else self.path
+        return DetectionCheckpoint(f"{base}.seg{index}of{count}.npz", self.interval)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """返回 (frame_count, state)，没有断点或文件损坏时返回 None"""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(str(data['__meta__']))
+                state = meta['state']
+                for name in data.files:
+                    if name != '__meta__':
+                        state[name] = data[name]
+            return meta['frame_count'], state
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def maybe_save(self, frame_count, detector):
+        """距上次保存超过 interval 秒时保存一次"""
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save(frame_count, detector)
+
+    def save(self, frame_count, detector):
+        """原子写入断点；写失败只放弃本次保存，不中断检测"""
+        self._last_save = time.monotonic()
+        state = detector.get_state()
+        arrays = {name: value for name, value in state.items() if isinstance(value, np.ndarray)}
+        meta = {'frame_count': int(frame_count), 'detector': detector.name,
+                'state': {name: value for name, value in state.items() if name not in arrays}}
+        arrays['__meta__'] = np.array(json.dumps(meta))
+        try:
+            directory = os.path.dirname(self.path)
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError:
+            pass
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SlideCache:
+    """按 (文件指纹, 检测器, 参数) 保存检测结果"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or os.environ.get('SLIDE_CACHE_DIR') or DEFAULT_CACHE_DIR
+
+    def key_for(self, video_path, detector, reader='opencv', segments=1):
+        """segments 是 detect_slides_parallel 的分段数：各段从预热区开始各自建立历史，
+        结果与单进程扫描不完全相同，所以分段数不同的结果分开保存（1 与单进程相同，键也不变）"""
+        params = dict(detector.params())
+        params['reader'] = reader
+        if segments > 1:
+            params['segments'] = segments
+        return cache_key(file_fingerprint(video_path), detector.name, params)
+
+    def video_key(self, video_path, kind):
+        """只取决于视频文件的数据（kind 区分种类）的缓存键"""
+        return cache_key(file_fingerprint(video_path), kind, {})
+
+    def path_for(self, key, suffix='.json'):
+        return os.path.join(self.cache_dir, key[:2], key + suffix)
+
+    def load(self, video_path, detector, reader='opencv', segments=1):
+        """返回缓存的结果字典（含 slide_times），没有时返回 None"""
+        try:
+            path = self.path_for(self.key_for(video_path, detector, reader, segments))
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def checkpoint_for(self, video_path, detector, reader='opencv', interval=CHECKPOINT_INTERVAL):
+        """与缓存结果同键的检测断点"""
+        return DetectionCheckpoint(self.path_for(self.key_for(video_path, detector, reader), '.ckpt.npz'),
+                                   interval)
+
+    def has_checkpoint(self, video_path, detector, reader='opencv'):
+        """是否有（整段或任一分段的）未完成检测"""
+        try:
+            key = self.key_for(video_path, detector, reader)
+            directory = os.path.dirname(self.path_for(key))
+            return any(name.startswith(key + '.ckpt') and name.endswith('.npz')
+                       for name in os.listdir(directory))
+        except OSError:
+            return False
+
+    def store(self, video_path, detector, result, reader='opencv'):
+        """保存 DetectionResult（含缩略图图集），分段数取自 result.stats；缓存写失败不影响检测本身"""
+        try:
+            key = self.key_for(video_path, detector, reader, result.stats.get('segments', 1))
+            path = self.path_for(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = result.to_dict()
+            missing = write_thumbnail_atlas(self.path_for(key, THUMBNAIL_SUFFIX), result.slide_thumbnails)
+            if missing is not None:
+                data['thumbnail_atlas'] = {'key': key, 'missing': missing}
+            write_json_atomic(path, data)
+            return path
+        except OSError:
+            return None
+
+    def open_thumbnails(self, cached):
+        """load() 结果的缩略图：与 slide_times 一一对应的列表，元素是图集的只读内存映射（缺失为 None）
+
+        没有图集（如旧缓存）或图集与结果对不上时返回 None。
+        """
+        info = cached.get('thumbnail_atlas')
+        if not info:
+            return None
+        try:
+            atlas = np.load(self.path_for(info['key'], THUMBNAIL_SUFFIX), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if atlas.ndim != 3 or len(atlas) != len(cached['slide_times']):
+            return None
+        missing = set(info['missing'])
+        return [None if i in missing else atlas[i] for i in range(len(atlas))]
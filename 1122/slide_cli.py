@@ -0,0 +1,269 @@
+"""命令行幻灯片检测
+
+在没有显示器的服务器上批量处理课程视频，把幻灯片切换时间写成 JSON：
+
+    python slide_cli.py lecture1.mp4 lecture2.mp4 -o slides.json
+    python slide_cli.py archive/*.mp4 --jobs 8 --output-dir results/
+    python slide_cli.py lecture1.mp4 --mode series --threshold ssim_threshold=0.75
+    python slide_cli.py screencast.mp4 --mode packets --detector basic
+    python slide_cli.py archive/*.mp4 --detector basic --detector-for "*annotated*=handwriting"
+    python slide_cli.py screencast.mp4 --real-times
+
+每个结果里的 slide_groups 把重复出现的幻灯片归为一组（按代表哈希），
+例如 {"slides": [2, 7], "times": [35.2, 410.6]} 表示第 3 张幻灯片在 410.6 秒又出现了一次。
+
+检测器按"帧号 / fps"计时，可变帧率的录屏会越来越偏；--real-times 用每个视频缓存一次的
+时间戳索引（slide_packets.PacketIndex）换成真实时间，恒定帧率的视频结果不变。
+"""
+import argparse
+import fnmatch
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from slide_cache import SlideCache
+from slide_engine import (DEFAULT_DETECTOR, DEFAULT_GATE_THRESHOLD, DEFAULT_THRESHOLDS, DETECTORS, READERS,
+                          DetectionError,
+                          DetectionResult, FrameSampler, create_detector, detect_slides,
+                          detect_slides_coarse_to_fine, detect_slides_parallel, parallel_segment_count, parse_hash,
+                          resolve_reader)
+from slide_index import DEFAULT_GROUP_RADIUS, SlideGroups
+from slide_packets import DEFAULT_MAX_GAP, cached_packet_index, detect_slides_prescreened, scan_packets
+from slide_series import cached_feature_series, decide_series_vectorized, extract_feature_series
+
+
+def detect_one(video_path, options):
+    """检测单个视频，返回可写入 JSON 的字典（在子进程中运行）
+
+    options 是命令行参数转成的字典。
+    """
+    try:
+        detector = build_detector(detector_name_for(video_path, options), options)
+        reader = resolve_reader(options['reader'], video_path)
+        packets = None
+        if options['real_times'] or options['mode'] == 'packets':
+            packets = packet_index_for(video_path, options)
+        item = run_detection(video_path, detector, reader, options, packets)
+        if options['real_times']:
+            use_real_times(item, packets, counted=options['mode'] != 'coarse')
+        return item
+    except (DetectionError, OSError) as e:
+        return {'video': video_path, 'error': str(e)}
+
+
+def run_detection(video_path, detector, reader, options, packets=None):
+    """按 --mode 检测，返回结果字典（时间为"帧号 / fps"）"""
+    if options['mode'] == 'series':
+        return detect_from_series(video_path, detector, reader, options)
+
+    # 只缓存逐帧扫描的结果：GUI 打开同一视频时用的也是这种结果
+    cache = SlideCache(options['cache_dir']) if options['cache'] and options['mode'] == 'linear' else None
+    if cache is not None:
+        segments = parallel_segment_count(video_path, options['workers']) if options['workers'] > 1 else 1
+        cached = cache.load(video_path, detector, reader, segments)
+        if cached is not None:
+            cached['cached'] = True
+            return cached
+
+    if options['mode'] == 'coarse':
+        result = detect_slides_coarse_to_fine(video_path, detector,
+                                              coarse_interval=options['coarse_interval'])
+    elif options['mode'] == 'packets':
+        result = detect_slides_prescreened(video_path, detector, max_gap=options['max_gap'], packets=packets)
+    elif options['workers'] > 1:
+        result = detect_slides_parallel(video_path, detector, workers=options['workers'],
+                                        sampling=options['sampling'], ring_size=options['ring_size'],
+                                        reader=reader)
+    else:
+        result = detect_slides(video_path, detector, sampling=options['sampling'],
+                               ring_size=options['ring_size'], reader=reader)
+    if cache is not None:
+        cache.store(video_path, detector, result, reader)
+    return result.to_dict()
+
+
+def packet_index_for(video_path, options):
+    """视频的关键帧与时间戳索引；允许缓存时每个视频只扫描一次"""
+    if options['cache']:
+        return cached_packet_index(video_path, SlideCache(options['cache_dir']))
+    return scan_packets(video_path)
+
+
+def use_real_times(item, packets, counted=True):
+    """把结果里的幻灯片时间换成真实时间（只有可变帧率的视频会变），counted 见 PacketIndex.real_times"""
+    item['slide_times'] = [round(t, 3) for t in packets.real_times(item['slide_times'], counted)]
+    if packets.is_variable_rate():
+        item['duration'] = round(packets.duration, 3)
+    item['real_times'] = True
+
+
+def add_slide_groups(item, radius):
+    """按代表哈希给结果加上重复幻灯片分组（没有完整哈希的结果不分组）"""
+    hashes = [parse_hash(h) for h in item.get('slide_hashes') or []]
+    if 'error' in item or len(hashes) != len(item['slide_times']):
+        return
+    item['slide_groups'] = SlideGroups(item['slide_times'], hashes, radius).to_list()
+
+
+def detector_name_for(video_path, options):
+    """该视频使用的检测算法：第一个匹配的 --detector-for，否则 --detector"""
+    for pattern, name in options['detector_for']:
+        if fnmatch.fnmatch(video_path, pattern) or fnmatch.fnmatch(os.path.basename(video_path), pattern):
+            return name
+    return options['detector']
+
+
+def build_detector(name, options):
+    """按名称和命令行选项创建检测器；--threshold 只作用于 multi_metric"""
+    kwargs = {'verbose': options['verbose'], 'gate_threshold': options['gate_threshold']}
+    if name == 'multi_metric':
+        kwargs.update(thresholds=options['thresholds'], adaptive_skip=options['mode'] != 'series')
+    return create_detector(name, ignore_unknown=True, **kwargs)
+
+
+def detect_from_series(video_path, detector, reader, options):
+    """两遍检测：特征序列来自缓存（或本次提取），判断只需毫秒级"""
+    if options['cache']:
+        cache = SlideCache(options['cache_dir'])
+        series, meta = cached_feature_series(video_path, cache, detector.base_skip_seconds, reader,
+                                             gate_threshold=detector.gate.threshold,
+                                             sampling=options['sampling'], ring_size=options['ring_size'])
+    else:
+        series, meta = extract_feature_series(video_path, detector.base_skip_seconds, reader,
+                                              sampling=options['sampling'], ring_size=options['ring_size'],
+                                              gate_threshold=detector.gate.threshold)
+    slide_times = decide_series_vectorized(series, meta['fps'], detector)
+    result = DetectionResult(video_path, slide_times, meta['fps'], meta['total_frames'], meta['duration'],
+                             detector.name, len(series), meta['elapsed'],
+                             stats=dict(meta.get('stats', {}), series_samples=len(series)))
+    return result.to_dict()
+
+
+def parse_threshold(text):
+    """--threshold 的值：NAME=VALUE"""
+    name, sep, value = text.partition('=')
+    if not sep or name not in DEFAULT_THRESHOLDS:
+        raise argparse.ArgumentTypeError(
+            f"expected NAME=VALUE with NAME one of {', '.join(DEFAULT_THRESHOLDS)}")
+    try:
+        return name, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid threshold value: {value!r}")
+
+
+def parse_detector_for(text):
+    """--detector-for 的值：GLOB=NAME"""
+    pattern, sep, name = text.rpartition('=')
+    if not sep or not pattern or name not in DETECTORS:
+        raise argparse.ArgumentTypeError(f"expected GLOB=NAME with NAME one of {', '.join(DETECTORS)}")
+    return pattern, name
+
+
+def write_json(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Detect slide changes in lecture videos without a GUI.")
+    parser.add_argument('videos', nargs='+', help="Video files to analyze")
+    parser.add_argument('-o', '--output', help="Write all results to one JSON file (default: stdout)")
+    parser.add_argument('--output-dir', help="Write one <video name>.slides.json per video into this directory")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of videos analyzed in parallel (default: 1)")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="Split each video into time segments analyzed by this many processes "
+                             "(linear mode only, default: 1)")
+    parser.add_argument('--mode', choices=('linear', 'coarse', 'packets', 'series'), default='linear',
+                        help="linear: scan sampled frames in order; "
+                             "coarse: seek every --coarse-interval seconds and bisect changes to the exact frame; "
+                             "packets: read packet sizes without decoding, then bisect only around packet "
+                             "spikes (plus one sample every --max-gap seconds); "
+                             "series: extract (or reuse cached) per-sample features at a fixed stride, then decide")
+    parser.add_argument('--detector', choices=list(DETECTORS), default=DEFAULT_DETECTOR,
+                        help="Detection algorithm: " + "; ".join(f"{name}: {cls.description}"
+                                                                  for name, cls in DETECTORS.items())
+                             + f" (default: {DEFAULT_DETECTOR})")
+    parser.add_argument('--detector-for', action='append', type=parse_detector_for, default=[],
+                        metavar='GLOB=NAME',
+                        help="Use detector NAME for videos whose path or file name matches GLOB "
+                             "(repeatable, first match wins)")
+    parser.add_argument('--threshold', dest='thresholds', type=parse_threshold, action='append', default=[],
+                        metavar='NAME=VALUE',
+                        help="Override a multi_metric detection threshold (repeatable)")
+    parser.add_argument('--gate-threshold', type=float, default=DEFAULT_GATE_THRESHOLD,
+                        help="Frames whose 32x24 thumbnail differs from the last analyzed frame by less than "
+                             "this mean gray level skip the full metrics (0 disables; default: %(default)s)")
+    parser.add_argument('--group-radius', type=int, default=DEFAULT_GROUP_RADIUS,
+                        help="Slides whose 64-bit hashes differ in at most this many bits count as the same "
+                             "slide in slide_groups (default: %(default)s)")
+    parser.add_argument('--coarse-interval', type=float, default=5.0,
+                        help="Seconds between coarse samples in coarse mode (default: 5)")
+    parser.add_argument('--max-gap', type=float, default=DEFAULT_MAX_GAP,
+                        help="Longest stretch without packet spikes left unsampled in packets mode "
+                             "(default: %(default)s)")
+    parser.add_argument('--real-times', action='store_true',
+                        help="Report slide times from the container timestamps (indexed once per video and "
+                             "cached) instead of frame number / fps; only differs for variable frame rate videos")
+    parser.add_argument('--sampling', choices=FrameSampler.MODES, default='auto',
+                        help="How unsampled frames are skipped in linear mode (default: chosen by stride)")
+    parser.add_argument('--reader', choices=READERS, default='auto',
+                        help="opencv: decode full frames with OpenCV; lowres: let FFmpeg output small gray "
+                             "frames (needs ffpyplayer); auto: lowres for videos at least 1080 pixels high when "
+                             "available, otherwise opencv (default)")
+    parser.add_argument('--ring-size', type=int, default=0,
+                        help="Decode on a separate thread into a ring of this many downscaled frames "
+                             "(linear mode only, default: 0 = decode and analyze on one thread)")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="Always rescan instead of reusing (and filling) the detection cache")
+    parser.add_argument('--cache-dir', help="Detection cache directory (default: $SLIDE_CACHE_DIR or "
+                                            "~/.cache/slide_detection)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Print every detected slide change")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    args.thresholds = dict(args.thresholds)
+    options = vars(args)
+    if args.mode == 'series':
+        # 特征序列只记录 multi_metric 的指标
+        others = sorted({detector_name_for(path, options) for path in args.videos} - {'multi_metric'})
+        if others:
+            parser.error(f"--mode series only supports the multi_metric detector (got {', '.join(others)})")
+
+    results = {}
+    if args.jobs > 1 and len(args.videos) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+            futures = {pool.submit(detect_one, path, options): path for path in args.videos}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                print(f"Done: {futures[future]}", file=sys.stderr)
+    else:
+        for path in args.videos:
+            results[path] = detect_one(path, options)
+            print(f"Done: {path}", file=sys.stderr)
+
+    # 保持与命令行参数相同的顺序
+    ordered = [results[path] for path in args.videos]
+    for item in ordered:
+        add_slide_groups(item, args.group_radius)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for item in ordered:
+            name = os.path.splitext(os.path.basename(item['video']))[0]
+            write_json(item, os.path.join(args.output_dir, f"{name}.slides.json"))
+    if args.output:
+        write_json(ordered, args.output)
+    elif not args.output_dir:
+        json.dump(ordered, sys.stdout, ensure_ascii=False, indent=2)
+        sys.stdout.write("\n")
+
+    return 1 if any('error' in item for item in ordered) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2172 @@
+"""幻灯片检测引擎（无界面版本）
+
+从 22.py 的 FFPlayer.perform_slide_detection 中抽离出来的检测逻辑，
+不依赖 tkinter，可以在没有显示器的服务器上运行。
+界面程序通过 progress_callback 获取进度，通过返回的 DetectionResult 获取结果。
+"""
+import bisect
+import inspect
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+try:
+    from ffpyplayer.player import MediaPlayer
+except ImportError:  # 服务器上可能只装了 OpenCV
+    MediaPlayer = None
+
+# 检测时统一使用的缩小分辨率
+DETECTION_SIZE = (320, 240)
+
+# 局部 SSIM 的窗口边长（像素）：按不重叠的窗口计算，320x240 得到 40x30 的 SSIM 图
+SSIM_WINDOW = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+# 多指标阈值配置
+DEFAULT_THRESHOLDS = {
+    'hist_correlation': 0.25,  # 直方图相关性阈值
+    'edge_change_ratio': 0.35,  # 边缘变化比例阈值
+    'chi_square': 25000,  # 卡方距离阈值
+    'ssim_threshold': 0.82,  # SSIM相似度阈值
+    'brightness_change': 0.15,  # 亮度变化阈值
+    'content_change': 0.20  # 内容变化综合阈值
+}
+
+# 自适应阈值参数
+DEFAULT_ADAPTIVE_PARAMS = {
+    'sensitivity_window': 50,  # 敏感度调整窗口
+    'low_activity_boost': 1.2,  # 低活动度增强因子
+    'high_activity_damping': 0.8,  # 高活动度抑制因子
+}
+
+# 切换验证：确认切换时的变化强度下限
+MIN_CHANGE_INTENSITY = 0.15
+
+# 手写感知检测（HandwritingDetector）的打分权重与判定阈值
+DEFAULT_HANDWRITING_PARAMS = {
+    # 综合分数 = mean_diff * weight_global + hist_diff_score * weight_histdiff + edge_diff_ratio * 100 * weight_edges
+    'weight_global': 1.0,  # 全局对比
+    'weight_histdiff': 1.2,  # 直方图差异
+    'weight_edges': 1.3,  # 边缘检测
+    # 像手写：变化区域小、集中，颜色分布和整体差异都小
+    'writing_max_area': 0.15,
+    'writing_min_concentration': 0.6,
+    'writing_max_hist_diff': 30,
+    'writing_max_mean_diff': 20,
+    # 连续手写帧的分数衰减：score *= max(writing_floor, 1 - 连续手写帧数 * writing_decay)
+    'writing_decay': 0.1,
+    'writing_floor': 0.3,
+    # 渐进式变化：最近 3 帧的 mean_diff 都在 (gradual_low, gradual_high) 内时分数乘 gradual_factor
+    'gradual_low': 5,
+    'gradual_high': 25,
+    'gradual_factor': 0.5,
+    # 切换判定：大变化+大面积、颜色分布大变化、边缘结构大变化、极高分数，满足其一即可
+    'change_score': 45,
+    'change_min_area': 0.25,
+    'change_hist_diff': 60,
+    'change_edge_diff': 0.4,
+    'change_max_score': 80,
+}
+
+
+# 级联检测第一级的缩略图尺寸，以及缩略图平均绝对差（灰度级）低于多少时直接判为静止帧
+GATE_SIZE = (32, 24)
+DEFAULT_GATE_THRESHOLD = 1.0
+
+# 与参考帧完全相同时 compare() 给出的指标，静止帧按它记入历史
+STATIC_FRAME_METRICS = {
+    'hist_correlation': 1.0,
+    'edge_change_ratio': 0.0,
+    'chi_square': 0.0,
+    'ssim_score': 1.0,
+    'ssim_map': None,
+    'brightness_change': 0.0,
+    'content_change_score': 0.0,
+    'change_intensity': 0.0,
+}
+
+
+# 感知哈希：dHash 比较 9x8 缩略图中每行相邻像素的明暗，得到 64 位指纹
+HASH_SIZE = 8
+# 幻灯片的代表哈希取切换后多少秒的采样帧（避开淡入淡出的中间帧）
+SLIDE_HASH_SETTLE = 1.0
+
+# 每张幻灯片的缩略图尺寸（与 DETECTION_SIZE 同为 4:3，直接从检测用的灰度帧缩小）
+THUMBNAIL_SIZE = (96, 72)
+
+
+class DetectionError(Exception):
+    """检测过程中无法继续的错误（如视频无法打开）"""
+
+
+class CancelToken:
+    """取消检测的标志，可在任意线程中调用 cancel()
+
+    检测循环每处理一个采样帧检查一次；被取消的检测返回 cancelled=True 的结果，
+    其中包含已经找到的幻灯片。
+    """
+
+    def __init__(self, event=None):
+        self._event = event if event is not None else threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+def ssim_frame_terms(gray, window=SSIM_WINDOW, out=None):
+    """单帧的局部 SSIM 项：(float32 图像, 乘积缓冲, 窗口均值, 窗口二阶矩)
+
+    窗口均值用 INTER_AREA 缩小得到（即不重叠窗口的盒式滤波），
+    每帧只需计算一次，与前后两帧比较时复用；out 可传入 ssim_terms_buffers() 的结果。
+    """
+    if out is None:
+        out = ssim_terms_buffers(gray.shape, window)
+    img, product, mu, sq = out
+    map_size = (mu.shape[1], mu.shape[0])
+    img[...] = gray
+    cv2.resize(img, map_size, dst=mu, interpolation=cv2.INTER_AREA)
+    cv2.multiply(img, img, dst=product)
+    cv2.resize(product, map_size, dst=sq, interpolation=cv2.INTER_AREA)
+    return out
+
+
+def ssim_terms_buffers(shape, window=SSIM_WINDOW):
+    """ssim_frame_terms 所需的 float32 缓冲"""
+    map_shape = (shape[0] // window, shape[1] // window)
+    return (np.empty(shape, np.float32), np.empty(shape, np.float32),
+            np.empty(map_shape, np.float32), np.empty(map_shape, np.float32))
+
+
+def windowed_ssim(terms1, terms2):
+    """由两帧的局部项计算 SSIM，返回 (全局 SSIM, 每个窗口一个值的粗略 SSIM 图)
+
+    全局 SSIM 与原来整幅图只算一组均值/方差/协方差的结果相同（窗口均匀铺满整幅图，
+    窗口矩的平均就是整幅图的矩），thresholds['ssim_threshold'] 按它标定。
+    窗口的平均 SSIM 对不同幻灯片也常在 0.7~0.85，不能直接套用这个阈值。
+    粗略图能反映局部变化，例如只多出一行要点时，全局 SSIM 几乎不变，
+    但对应窗口的 SSIM 明显下降。乘积写入 terms2 的乘积缓冲。
+    """
+    img1, _, mu1, sq1 = terms1
+    img2, product, mu2, sq2 = terms2
+    cv2.multiply(img1, img2, dst=product)
+    e12 = cv2.resize(product, (mu1.shape[1], mu1.shape[0]), interpolation=cv2.INTER_AREA)
+
+    # 以下都在窗口图（40x30）上计算，开销可以忽略
+    mu12 = mu1 * mu2
+    mu1_sq = mu1 * mu1
+    mu2_sq = mu2 * mu2
+    ssim_map = (((2 * mu12 + SSIM_C1) * (2 * (e12 - mu12) + SSIM_C2)) /
+                ((mu1_sq + mu2_sq + SSIM_C1) * (sq1 - mu1_sq + sq2 - mu2_sq + SSIM_C2)))
+
+    # 全局矩用 float64 累加，避免 float32 方差相减时的抵消误差
+    m1 = float(mu1.mean(dtype=np.float64))
+    m2 = float(mu2.mean(dtype=np.float64))
+    var1 = float(sq1.mean(dtype=np.float64)) - m1 * m1
+    var2 = float(sq2.mean(dtype=np.float64)) - m2 * m2
+    cov = float(e12.mean(dtype=np.float64)) - m1 * m2
+    ssim_score = (((2 * m1 * m2 + SSIM_C1) * (2 * cov + SSIM_C2)) /
+                  ((m1 * m1 + m2 * m2 + SSIM_C1) * (var1 + var2 + SSIM_C2)))
+    return max(0.0, min(1.0, ssim_score)), ssim_map
+
+
+def calculate_ssim(img1, img2):
+    """计算两帧的全局 SSIM（不依赖scikit-image）"""
+    ssim_score, _ = windowed_ssim(ssim_frame_terms(img1), ssim_frame_terms(img2))
+    return ssim_score
+
+
+def calculate_texture_score(gray_img):
+    """计算纹理复杂度评分"""
+    try:
+        # 使用Sobel算子计算梯度
+        grad_x = cv2.Sobel(gray_img, cv2.CV_64F, 1, 0, ksize=3)
+        grad_y = cv2.Sobel(gray_img, cv2.CV_64F, 0, 1, ksize=3)
+        gradient_magnitude = np.sqrt(grad_x ** 2 + grad_y ** 2)
+
+        # 计算纹理复杂度
+        texture_score = np.std(gradient_magnitude) / (np.mean(gradient_magnitude) + 1e-7)
+        return min(texture_score / 10.0, 1.0)  # 归一化到[0,1]
+    except Exception:
+        return 0.0
+
+
+def calculate_content_change(prev_gray, curr_gray, texture_score):
+    """计算整体内容变化度"""
+    try:
+        # 计算帧间差异
+        diff = cv2.absdiff(prev_gray, curr_gray)
+        mean_diff = np.mean(diff)
+
+        # 结合纹理信息
+        content_change = (mean_diff / 255.0) * (1 + texture_score * 0.5)
+        return min(content_change, 1.0)
+    except Exception:
+        return 0.0
+
+
+class RollingStats:
+    """定长环形缓冲，并为若干窗口长度维护滑动和
+
+    append() 和 mean(window) 都是 O(1)（与窗口长度无关）。
+    窗口内数据不足时 mean 对已有数据求平均，与 np.mean(values[-window:]) 相同。
+    滑动和每写满一圈按缓冲区重新求和一次，避免浮点误差累积。
+    """
+
+    def __init__(self, capacity, windows=()):
+        self.capacity = capacity
+        self._buffer = np.zeros(capacity, np.float64)
+        self._windows = sorted({min(w, capacity) for w in windows} | {capacity})
+        self.clear()
+
+    def clear(self):
+        self._count = 0  # 已写入的总个数
+        self._sums = dict.fromkeys(self._windows, 0.0)
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def append(self, value):
+        value = float(value)
+        buffer = self._buffer
+        for window in self._windows:
+            if self._count >= window:
+                self._sums[window] -= buffer[(self._count - window) % self.capacity]
+            self._sums[window] += value
+        buffer[self._count % self.capacity] = value
+        self._count += 1
+        if self._count % self.capacity == 0:
+            self._resum()
+
+    def _resum(self):
+        values = self.values()
+        for window in self._windows:
+            self._sums[window] = float(values[-window:].sum())
+
+    def mean(self, window):
+        """最近 window 个值的平均（window 须在构造时注册）"""
+        window = min(window, self.capacity)
+        n = min(self._count, window)
+        return self._sums[window] / n if n else 0.0
+
+    def tail(self, n):
+        """最近 n 个值（按时间顺序）"""
+        return self.values()[-n:] if n else self._buffer[:0]
+
+    def values(self):
+        """全部值（按时间顺序）"""
+        if self._count <= self.capacity:
+            return self._buffer[:self._count].copy()
+        start = self._count % self.capacity
+        return np.concatenate((self._buffer[start:], self._buffer[:start]))
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+
+def adjust_thresholds_adaptive(base_thresholds, recent_changes, adaptive_params):
+    """自适应阈值调整"""
+    if len(recent_changes) < 10:
+        return base_thresholds.copy()
+
+    # 计算最近的平均活动度（recent_changes 为 RollingStats）
+    recent_activity = recent_changes.mean(adaptive_params['sensitivity_window'])
+    return scale_thresholds(base_thresholds, recent_activity, adaptive_params)
+
+
+def scale_thresholds(base_thresholds, recent_activity, adaptive_params):
+    """根据活动度调整阈值"""
+    adjusted = base_thresholds.copy()
+    if recent_activity < 0.1:  # 低活动度，提高敏感度
+        factor = adaptive_params['low_activity_boost']
+        adjusted['hist_correlation'] *= factor
+        adjusted['ssim_threshold'] *= factor
+        adjusted['content_change'] /= factor
+    elif recent_activity > 0.4:  # 高活动度，降低敏感度
+        factor = adaptive_params['high_activity_damping']
+        adjusted['hist_correlation'] *= factor
+        adjusted['ssim_threshold'] *= factor
+        adjusted['content_change'] /= factor
+
+    return adjusted
+
+
+def verify_slide_change(recent_changes, current_intensity):
+    """验证是否为真正的幻灯片切换"""
+    if len(recent_changes) < 5:
+        return True
+
+    # 检查变化是否显著且持续
+    recent_avg = recent_changes.mean(5)
+
+    # 当前变化强度应该明显高于最近平均值
+    intensity_ratio = current_intensity / (recent_avg + 1e-7)
+
+    # 如果当前变化是最近几帧中的明显峰值，认为是有效切换
+    return intensity_ratio > 1.5 and current_intensity > MIN_CHANGE_INTENSITY
+
+
+def post_process_slide_times(slide_times, min_duration):
+    """后处理：移除过于接近的切换点"""
+    if len(slide_times) <= 1:
+        return slide_times
+
+    filtered_times = [slide_times[0]]  # 保留第一个
+
+    for i in range(1, len(slide_times)):
+        if slide_times[i] - filtered_times[-1] >= min_duration:
+            filtered_times.append(slide_times[i])
+
+    return filtered_times
+
+
+def extract_frame_features(gray_resized):
+    """提取单帧特征（直方图、边缘、亮度、纹理）"""
+    # 1. 直方图特征
+    hist = cv2.calcHist([gray_resized], [0], None, [256], [0, 256])
+    hist = cv2.normalize(hist, hist).flatten()
+
+    # 2. 边缘特征
+    edges = cv2.Canny(gray_resized, 50, 150)
+    edge_count = np.sum(edges > 0)
+
+    return {
+        'gray': gray_resized,
+        'hist': hist,
+        'edge_count': edge_count,
+        # 3. 亮度特征
+        'mean_brightness': np.mean(gray_resized),
+        # 4. 纹理特征（简化版LBP）
+        'texture_score': calculate_texture_score(gray_resized),
+    }
+
+
+def compare_frame_features(prev, curr):
+    """计算两帧之间的多项变化指标"""
+    # 1. 直方图相关性
+    hist_correlation = cv2.compareHist(prev['hist'], curr['hist'], cv2.HISTCMP_CORREL)
+
+    # 2. 边缘变化率
+    edge_change_ratio = abs(curr['edge_count'] - prev['edge_count']) / max(prev['edge_count'], 1)
+
+    # 3. 卡方距离
+    chi_square = cv2.compareHist(prev['hist'], curr['hist'], cv2.HISTCMP_CHISQR)
+
+    # 4. SSIM结构相似度（全局分数 + 局部窗口图）
+    ssim_score, ssim_map = windowed_ssim(ssim_frame_terms(prev['gray']), ssim_frame_terms(curr['gray']))
+
+    # 5. 亮度变化
+    brightness_change = (abs(curr['mean_brightness'] - prev['mean_brightness']) /
+                         max(prev['mean_brightness'], 1))
+
+    # 6. 整体内容变化度
+    content_change_score = calculate_content_change(prev['gray'], curr['gray'], curr['texture_score'])
+
+    # 综合变化强度（用于自适应调整）
+    change_intensity = (
+            (1 - hist_correlation) * 0.3 +
+            edge_change_ratio * 0.2 +
+            (1 - ssim_score) * 0.3 +
+            brightness_change * 0.1 +
+            content_change_score * 0.1
+    )
+
+    return {
+        'hist_correlation': hist_correlation,
+        'edge_change_ratio': edge_change_ratio,
+        'chi_square': chi_square,
+        'ssim_score': ssim_score,
+        'ssim_map': ssim_map,
+        'brightness_change': brightness_change,
+        'content_change_score': content_change_score,
+        'change_intensity': change_intensity,
+    }
+
+
+class FeatureExtractor:
+    """逐帧扫描用的特征提取器：结果与 extract_frame_features/compare_frame_features 相同，
+    但所有中间结果都写入预分配的缓冲区
+
+    两组特征缓冲交替使用，每次 extract() 写入上上次用过的那一组，
+    所以最近两次的结果（prev 和 curr）同时有效，不需要 copy。
+    灰度图复制进特征缓冲：经过 StaticGate 时 prev 可能是很多个采样帧之前的帧，
+    帧来源的缓冲区早已被覆盖。
+    每帧的局部 SSIM 项（局部均值、二阶矩）只在 extract() 中算一次，compare() 中直接复用。
+    """
+
+    def __init__(self):
+        self._shape = None
+        self._next_slot = 0
+
+    def _allocate(self, shape):
+        self._shape = shape
+        self._slots = [{'gray': np.empty(shape, np.uint8), 'hist': np.empty((256, 1), np.float32),
+                        'ssim_terms': ssim_terms_buffers(shape)}
+                       for _ in range(2)]
+        self._edges = np.empty(shape, np.uint8)
+        self._diff = np.empty(shape, np.uint8)
+        self._grad_x = np.empty(shape, np.float32)
+        self._grad_y = np.empty(shape, np.float32)
+        self._magnitude = np.empty(shape, np.float32)
+
+    def extract(self, gray_resized):
+        """提取单帧特征，返回的字典在下下次 extract() 之前有效"""
+        if gray_resized.shape != self._shape:
+            self._allocate(gray_resized.shape)
+        features = self._slots[self._next_slot]
+        self._next_slot ^= 1
+
+        np.copyto(features['gray'], gray_resized)
+        hist = cv2.calcHist([gray_resized], [0], None, [256], [0, 256], hist=features['hist'])
+        cv2.normalize(hist, hist)
+
+        cv2.Canny(gray_resized, 50, 150, edges=self._edges)
+        features['edge_count'] = cv2.countNonZero(self._edges)
+
+        features['mean_brightness'] = cv2.mean(gray_resized)[0]
+        ssim_frame_terms(gray_resized, out=features['ssim_terms'])
+
+        # 纹理：Sobel 梯度幅值的变异系数
+        cv2.Sobel(gray_resized, cv2.CV_32F, 1, 0, dst=self._grad_x, ksize=3)
+        cv2.Sobel(gray_resized, cv2.CV_32F, 0, 1, dst=self._grad_y, ksize=3)
+        cv2.magnitude(self._grad_x, self._grad_y, magnitude=self._magnitude)
+        grad_mean, grad_std = cv2.meanStdDev(self._magnitude)
+        features['texture_score'] = min(grad_std[0, 0] / (grad_mean[0, 0] + 1e-7) / 10.0, 1.0)
+        return features
+
+    def compare(self, prev, curr):
+        """计算两帧之间的多项变化指标（同 compare_frame_features）"""
+        hist_correlation = cv2.compareHist(prev['hist'], curr['hist'], cv2.HISTCMP_CORREL)
+        chi_square = cv2.compareHist(prev['hist'], curr['hist'], cv2.HISTCMP_CHISQR)
+        edge_change_ratio = abs(curr['edge_count'] - prev['edge_count']) / max(prev['edge_count'], 1)
+
+        ssim_score, ssim_map = windowed_ssim(prev['ssim_terms'], curr['ssim_terms'])
+
+        mu1, mu2 = prev['mean_brightness'], curr['mean_brightness']
+        brightness_change = abs(mu2 - mu1) / max(mu1, 1)
+
+        cv2.absdiff(prev['gray'], curr['gray'], dst=self._diff)
+        content_change_score = min((cv2.mean(self._diff)[0] / 255.0) * (1 + curr['texture_score'] * 0.5), 1.0)
+
+        change_intensity = (
+                (1 - hist_correlation) * 0.3 +
+                edge_change_ratio * 0.2 +
+                (1 - ssim_score) * 0.3 +
+                brightness_change * 0.1 +
+                content_change_score * 0.1
+        )
+
+        return {
+            'hist_correlation': hist_correlation,
+            'edge_change_ratio': edge_change_ratio,
+            'chi_square': chi_square,
+            'ssim_score': ssim_score,
+            'ssim_map': ssim_map,
+            'brightness_change': brightness_change,
+            'content_change_score': content_change_score,
+            'change_intensity': change_intensity,
+        }
+
+
+class StaticGate:
+    """级联检测的第一级：把 32x24 缩略图和参考帧比较，明显静止的帧不再计算完整指标
+
+    参考帧是上一次完整分析的帧，而不是上一采样帧：缓慢的累积变化
+    （淡入淡出、逐笔书写）最终仍会越过阈值，交给完整指标判断。
+    threshold <= 0 时关闭，所有帧都完整分析。
+    """
+
+    def __init__(self, threshold=DEFAULT_GATE_THRESHOLD):
+        self.threshold = threshold
+        self._thumb = np.empty((GATE_SIZE[1], GATE_SIZE[0]), np.uint8)
+        self._reference = np.empty_like(self._thumb)
+        self.reset()
+
+    def reset(self):
+        self.has_reference = False
+        self.checked = 0  # 与参考帧比较过的帧数
+        self.static = 0  # 其中被判为静止、跳过完整分析的帧数
+
+    def set_reference(self, gray):
+        cv2.resize(gray, GATE_SIZE, dst=self._reference, interpolation=cv2.INTER_AREA)
+        self.has_reference = True
+
+    def is_static(self, gray):
+        """当前帧与参考帧相同时返回 True；否则当前帧成为新的参考帧（调用方应完整分析它）"""
+        cv2.resize(gray, GATE_SIZE, dst=self._thumb, interpolation=cv2.INTER_AREA)
+        if self.has_reference and self.threshold > 0:
+            self.checked += 1
+            if cv2.norm(self._thumb, self._reference, cv2.NORM_L1) < self.threshold * self._thumb.size:
+                self.static += 1
+                return True
+        self._thumb, self._reference = self._reference, self._thumb
+        self.has_reference = True
+        return False
+
+    def stats(self):
+        return gate_stats(self.checked, self.static)
+
+
+def gate_stats(checked, static):
+    """StaticGate 计数器的统计信息（也用于合并并行分段的计数）"""
+    return {'gate_checked': checked, 'gate_static': static,
+            'gate_hit_rate': round(static / checked, 4) if checked else 0.0}
+
+
+def dhash(gray):
+    """64 位差值哈希（dHash），返回 Python int"""
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming_distance(hash1, hash2):
+    """两个哈希之间不同的位数（0~64）"""
+    return bin(hash1 ^ hash2).count('1')
+
+
+def format_hash(value):
+    """哈希写入 JSON 时用 16 位十六进制字符串（超过 2^53 的整数在很多 JSON 实现里会丢精度）"""
+    return None if value is None else f"{value:016x}"
+
+
+def parse_hash(text):
+    return None if text is None else int(text, 16)
+
+
+class FrameHashes:
+    """检测过程中每个采样帧的 dHash，用来给每张幻灯片选出代表哈希"""
+
+    def __init__(self):
+        self.times = []
+        self.hashes = []
+
+    def add(self, current_time, gray):
+        value = dhash(gray)
+        self.times.append(current_time)
+        self.hashes.append(value)
+        return value
+
+    def get_state(self):
+        return {'hash_times': np.array(self.times, np.float64), 'hash_values': np.array(self.hashes, np.uint64)}
+
+    def set_state(self, state):
+        self.times = [float(t) for t in state.get('hash_times', ())]
+        self.hashes = [int(h) for h in state.get('hash_values', ())]
+
+    def representative(self, slide_times, settle=SLIDE_HASH_SETTLE):
+        """每张幻灯片的代表哈希：切换 settle 秒后的第一个采样帧，幻灯片更短时取它的最后一个采样帧"""
+        result = []
+        for i, start in enumerate(slide_times):
+            end = slide_times[i + 1] if i + 1 < len(slide_times) else float('inf')
+            first = bisect.bisect_left(self.times, start)
+            last = bisect.bisect_left(self.times, end) - 1
+            if last < first:
+                result.append(None)  # 这段时间里没有采样帧
+                continue
+            result.append(self.hashes[min(bisect.bisect_left(self.times, start + settle, first, last + 1), last)])
+        return result
+
+
+def make_thumbnail(gray):
+    """THUMBNAIL_SIZE 的灰度缩略图"""
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA)
+
+
+class SlideThumbnails:
+    """检测过程中给每张幻灯片截取的缩略图，画面与代表哈希取同一时刻（切换 settle 秒后）
+
+    新幻灯片的第一个采样帧先存一幅，settle 秒后换成稳定下来的画面，
+    比 settle 还短的幻灯片也有缩略图。每张幻灯片只保留一幅，内存随幻灯片数而不是帧数增长。
+    """
+
+    def __init__(self, settle=SLIDE_HASH_SETTLE):
+        self.settle = settle
+        self.images = {}  # 幻灯片开始时间 -> 缩略图
+        self.current = None  # 正在截取的幻灯片的开始时间
+        self.settled = False  # 这张幻灯片是否已经截到 settle 之后的画面
+
+    def add(self, current_time, gray, slide_start):
+        """slide_start 为当前帧所在幻灯片的开始时间（detector.slide_times[-1]）"""
+        if slide_start != self.current:
+            self.current = slide_start
+            self.settled = False
+            self.images[slide_start] = None
+        if self.settled or (self.images[slide_start] is not None and current_time < slide_start + self.settle):
+            return
+        self.settled = current_time >= slide_start + self.settle
+        self.images[slide_start] = make_thumbnail(gray)
+
+    def get_state(self):
+        times = sorted(t for t, image in self.images.items() if image is not None)
+        images = (np.stack([self.images[t] for t in times]) if times
+                  else np.empty((0, THUMBNAIL_SIZE[1], THUMBNAIL_SIZE[0]), np.uint8))
+        return {'thumbnail_times': np.array(times, np.float64), 'thumbnail_images': images,
+                'thumbnail_settled': self.settled}
+
+    def set_state(self, state):
+        times = [float(t) for t in state.get('thumbnail_times', ())]
+        self.images = dict(zip(times, state.get('thumbnail_images', ())))
+        self.current = times[-1] if times else None
+        self.settled = bool(state.get('thumbnail_settled', False))
+
+    def for_slides(self, slide_times):
+        """与 slide_times 一一对应的缩略图（没有采样帧的幻灯片为 None）"""
+        return [self.images.get(t) for t in slide_times]
+
+
+def vote_scene_change(metrics, thresholds):
+    """多指标综合判断：需要满足多个条件才算场景变化"""
+    scene_change_indicators = {
+        'hist_low': metrics['hist_correlation'] < thresholds['hist_correlation'],
+        'edge_high': metrics['edge_change_ratio'] > thresholds['edge_change_ratio'],
+        'chi_high': metrics['chi_square'] > thresholds['chi_square'],
+        'ssim_low': metrics['ssim_score'] < thresholds['ssim_threshold'],
+        'brightness_change': metrics['brightness_change'] > thresholds['brightness_change'],
+        'content_change': metrics['content_change_score'] > thresholds['content_change']
+    }
+
+    positive_indicators = sum(scene_change_indicators.values())
+
+    # 强变化：3个或以上指标触发
+    if positive_indicators >= 3:
+        return True
+    # 中等变化：2个指标触发但包含关键指标
+    if positive_indicators >= 2:
+        if (scene_change_indicators['hist_low'] and scene_change_indicators['ssim_low']) or \
+                (scene_change_indicators['content_change'] and scene_change_indicators['edge_high']):
+            return True
+    return False
+
+
+# 检测算法注册表：名称 -> 检测器类，GUI 和命令行按名称选择
+#
+# 检测器接口：name / description 类属性；reset(fps)、params()、skip_frames()、candidate_strides()、
+# process(gray, t) -> 是否确认切换、finish() -> 切换时间；extract_features() / frames_differ()
+# 供粗到细检测使用，get_state() / set_state() 供断点续检使用
+DETECTORS = {}
+DEFAULT_DETECTOR = 'multi_metric'
+
+
+def register_detector(cls):
+    """类装饰器：按 cls.name 注册检测器"""
+    DETECTORS[cls.name] = cls
+    return cls
+
+
+def create_detector(name=DEFAULT_DETECTOR, ignore_unknown=False, **kwargs):
+    """按名称创建检测器，kwargs 传给构造函数
+
+    ignore_unknown=True 时丢弃该检测器不支持的参数，方便对所有检测器传同一组通用选项
+    （如 gate_threshold、verbose）。
+    """
+    try:
+        cls = DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown detector {name!r} (available: {', '.join(DETECTORS)})") from None
+    if ignore_unknown:
+        accepted = inspect.signature(cls).parameters
+        kwargs = {key: value for key, value in kwargs.items() if key in accepted}
+    return cls(**kwargs)
+
+
+@register_detector
+class MultiMetricDetector:
+    """多指标自适应幻灯片检测（22.py 算法）
+
+    只负责"看帧做判断"，不负责读视频：驱动循环按 skip_frames() 给出的步长
+    把缩小后的灰度帧喂给 process()，最后调用 finish() 取得切换时间。
+    """
+
+    name = 'multi_metric'
+    description = "Multi-metric adaptive (SSIM, histogram, edges, content)"
+
+    def __init__(self, thresholds=None, adaptive_params=None, min_slide_duration=2.0,
+                 min_static_duration=1.5, base_skip_seconds=0.3, adaptive_skip=True,
+                 gate_threshold=DEFAULT_GATE_THRESHOLD, verbose=False):
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        if thresholds:
+            self.thresholds.update(thresholds)
+        self.adaptive_params = dict(DEFAULT_ADAPTIVE_PARAMS)
+        if adaptive_params:
+            self.adaptive_params.update(adaptive_params)
+        self.min_slide_duration = min_slide_duration  # 最小幻灯片持续时间
+        self.min_static_duration = min_static_duration  # 最小静止时间（防止频繁误检）
+        self.base_skip_seconds = base_skip_seconds
+        self.adaptive_skip = adaptive_skip  # False 时固定按 base_skip_seconds 采样
+        self.gate = StaticGate(gate_threshold)
+        self.verbose = verbose
+        self.reset(25.0)
+
+    def params(self):
+        """返回影响检测结果的全部参数"""
+        return {
+            'thresholds': self.thresholds,
+            'adaptive_params': self.adaptive_params,
+            'min_slide_duration': self.min_slide_duration,
+            'min_static_duration': self.min_static_duration,
+            'base_skip_seconds': self.base_skip_seconds,
+            'adaptive_skip': self.adaptive_skip,
+            'gate_threshold': self.gate.threshold,
+            'ssim': 'global',  # ssim_score 的算法；曾用窗口平均 SSIM 算出的缓存结果因此失效
+        }
+
+    def reset(self, fps):
+        """开始分析新视频前重置状态"""
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.base_skip_frames = max(1, int(self.fps * self.base_skip_seconds))
+
+        self.prev_features = None  # 上一次完整分析的帧的特征
+        self.extractor = FeatureExtractor()
+        self.gate.reset()
+        self.frame_hashes = FrameHashes()  # 每个采样帧的 dHash
+        self.thumbnails = SlideThumbnails()  # 每张幻灯片的缩略图
+
+        self.slide_times = [0.0]  # 默认第一张幻灯片在开始位置
+        self.last_significant_change_time = 0.0
+        # 最近的变化强度；skip_frames / 自适应阈值 / 切换验证分别取最近 10、sensitivity_window、5 个的均值
+        self.recent_changes = RollingStats(
+            50, windows=(5, 10, self.adaptive_params['sensitivity_window']))
+        self.activity_history = RollingStats(100)  # 活动度历史
+
+    def get_state(self):
+        """导出断点续检所需的全部状态：numpy 数组原样保留，其余值均可 JSON 序列化"""
+        state = {
+            'slide_times': list(self.slide_times),
+            'last_significant_change_time': self.last_significant_change_time,
+            'recent_changes': self.recent_changes.values().tolist(),
+            'activity_history': self.activity_history.values().tolist(),
+        }
+        if self.prev_features is not None:
+            # 其余特征都由这一帧确定，恢复时重新提取即可
+            state['prev_gray'] = self.prev_features['gray']
+        state.update(self.frame_hashes.get_state())
+        state.update(self.thumbnails.get_state())
+        return state
+
+    def set_state(self, state):
+        """恢复 get_state() 导出的状态（需先 reset）"""
+        self.slide_times = list(state['slide_times'])
+        self.last_significant_change_time = state['last_significant_change_time']
+        self.recent_changes.clear()
+        self.recent_changes.extend(state['recent_changes'])
+        self.activity_history.clear()
+        self.activity_history.extend(state['activity_history'])
+        self.frame_hashes.set_state(state)
+        self.thumbnails.set_state(state)
+        self.gate.reset()
+        if state.get('prev_gray') is not None:
+            self.prev_features = self.extractor.extract(np.ascontiguousarray(state['prev_gray'], dtype=np.uint8))
+            self.gate.set_reference(self.prev_features['gray'])
+        else:
+            self.prev_features = None
+
+    def skip_frames(self):
+        """根据最近的变化强度动态调整跳帧步长"""
+        if self.adaptive_skip and len(self.recent_changes) > 10:
+            avg_change = self.recent_changes.mean(10)
+            if avg_change > 0.5:  # 高变化区域，减少跳帧
+                return max(1, int(self.base_skip_frames * 0.5))
+            elif avg_change < 0.1:  # 低变化区域，增加跳帧
+                return min(self.base_skip_frames * 2, int(self.fps))
+        return self.base_skip_frames
+
+    def candidate_strides(self):
+        """skip_frames() 可能返回的全部步长"""
+        if not self.adaptive_skip:
+            return {self.base_skip_frames}
+        return {max(1, int(self.base_skip_frames * 0.5)), self.base_skip_frames,
+                min(self.base_skip_frames * 2, int(self.fps))}
+
+    def process(self, gray_resized, current_time):
+        """分析一帧缩小后的灰度图，确认新幻灯片时返回 True"""
+        self.frame_hashes.add(current_time, gray_resized)
+        self.thumbnails.add(current_time, gray_resized, self.slide_times[-1])
+        if self.gate.is_static(gray_resized):
+            # 与 prev_features 相同：按"没有变化"记入历史，跳过完整指标
+            return self.decide(STATIC_FRAME_METRICS, current_time)
+
+        features = self.extractor.extract(gray_resized)
+
+        confirmed = False
+        if self.prev_features is not None:
+            metrics = self.extractor.compare(self.prev_features, features)
+            confirmed = self.decide(metrics, current_time)
+
+        # 更新历史数据（特征缓冲交替使用，不需要复制）
+        self.prev_features = features
+        return confirmed
+
+    @staticmethod
+    def extract_features(gray_resized):
+        """单帧特征（独立分配，可长期保存），供 frames_differ 使用"""
+        return extract_frame_features(gray_resized)
+
+    def frames_differ(self, prev_features, curr_features):
+        """判断两帧是否属于不同幻灯片，规则与逐帧扫描确认切换时相同
+
+        逐帧扫描遇到切换时，之前是静止的幻灯片：活动度低，阈值按 low_activity_boost 放宽，
+        切换还须通过 verify_slide_change（变化强度超过 MIN_CHANGE_INTENSITY，且远高于最近的平均）。
+        二分比较的正是"切换前的画面"和"可能已切换的画面"，所以按同样的状态判断；
+        最小间隔由粗到细检测最后的后处理保证。
+        """
+        metrics = compare_frame_features(prev_features, curr_features)
+        thresholds = scale_thresholds(self.thresholds, 0.0, self.adaptive_params)
+        return (vote_scene_change(metrics, thresholds) and
+                metrics['change_intensity'] > MIN_CHANGE_INTENSITY)
+
+    def decide(self, metrics, current_time):
+        """自适应阈值、多指标综合判断与静帧过滤，确认新幻灯片时返回 True
+
+        process() 对每对相邻采样帧调用；也可直接喂入预先提取的指标序列（见 slide_series）。
+        """
+        change_intensity = metrics['change_intensity']
+
+        # 记录变化强度用于自适应调整
+        self.recent_changes.append(change_intensity)
+
+        # === 自适应阈值调整 ===
+        adjusted_thresholds = adjust_thresholds_adaptive(
+            self.thresholds, self.recent_changes, self.adaptive_params)
+
+        # === 多指标综合判断 ===
+        scene_change = vote_scene_change(metrics, adjusted_thresholds)
+
+        confirmed = False
+        # === 静帧过滤机制 ===
+        if scene_change:
+            # 检查是否有足够的静止时间
+            time_since_last_change = current_time - self.last_significant_change_time
+
+            # 如果距离上次显著变化时间足够长，且满足最小幻灯片持续时间
+            if (time_since_last_change >= self.min_static_duration and
+                    (len(self.slide_times) == 0 or
+                     (current_time - self.slide_times[-1]) >= self.min_slide_duration)):
+
+                # 进一步验证：检查变化是否持续
+                if verify_slide_change(self.recent_changes, change_intensity):
+                    self.slide_times.append(current_time)
+                    self.last_significant_change_time = current_time
+                    confirmed = True
+
+                    if self.verbose:
+                        print(f"检测到幻灯片切换 {len(self.slide_times)} 在 {current_time:.2f}s:")
+                        print(f"  - 直方图相关性: {metrics['hist_correlation']:.3f}")
+                        print(f"  - SSIM: {metrics['ssim_score']:.3f}")
+                        print(f"  - 边缘变化: {metrics['edge_change_ratio']:.3f}")
+                        print(f"  - 综合变化强度: {change_intensity:.3f}")
+
+        # 更新活动度历史
+        self.activity_history.append(change_intensity)
+
+        return confirmed
+
+    def finish(self):
+        """结束分析，返回后处理后的切换时间"""
+        slide_times = self.slide_times
+        # 移除过于接近的幻灯片切换点
+        if len(slide_times) > 1:
+            slide_times = post_process_slide_times(slide_times, self.min_slide_duration)
+        return list(slide_times)
+
+    def slide_hashes(self):
+        """finish() 中每张幻灯片的代表哈希"""
+        return self.frame_hashes.representative(self.finish())
+
+    def slide_thumbnails(self):
+        """finish() 中每张幻灯片的缩略图"""
+        return self.thumbnails.for_slides(self.finish())
+
+
+@register_detector
+class BasicDetector:
+    """基础检测（final3.py / 13.py 算法）：直方图相关性、边缘数量变化、卡方距离任一超限即切换"""
+
+    name = 'basic'
+    description = "Basic (histogram / edges, fastest)"
+
+    def __init__(self, correlation_threshold=0.1, edge_change_threshold=0.3, chi_square_threshold=30000,
+                 min_slide_duration=1.0, skip_seconds=0.5, gate_threshold=DEFAULT_GATE_THRESHOLD, verbose=False):
+        self.correlation_threshold = correlation_threshold
+        self.edge_change_threshold = edge_change_threshold
+        self.chi_square_threshold = chi_square_threshold
+        self.min_slide_duration = min_slide_duration
+        self.skip_seconds = skip_seconds
+        self.gate = StaticGate(gate_threshold)
+        self.verbose = verbose
+        self.reset(25.0)
+
+    def params(self):
+        return {
+            'gate_threshold': self.gate.threshold,
+            'correlation_threshold': self.correlation_threshold,
+            'edge_change_threshold': self.edge_change_threshold,
+            'chi_square_threshold': self.chi_square_threshold,
+            'min_slide_duration': self.min_slide_duration,
+            'skip_seconds': self.skip_seconds,
+        }
+
+    def reset(self, fps):
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.base_skip_frames = max(1, int(self.fps * self.skip_seconds))
+        self.prev_features = None
+        self.gate.reset()
+        self.frame_hashes = FrameHashes()
+        self.thumbnails = SlideThumbnails()
+        self.slide_times = [0.0]  # Default first slide at beginning
+
+    def get_state(self):
+        state = {'slide_times': list(self.slide_times)}
+        if self.prev_features is not None:
+            state['prev_gray'] = self.prev_features['gray']
+        state.update(self.frame_hashes.get_state())
+        state.update(self.thumbnails.get_state())
+        return state
+
+    def set_state(self, state):
+        self.slide_times = list(state['slide_times'])
+        self.frame_hashes.set_state(state)
+        self.thumbnails.set_state(state)
+        self.gate.reset()
+        prev_gray = state.get('prev_gray')
+        self.prev_features = self.extract_features(np.asarray(prev_gray, np.uint8)) if prev_gray is not None else None
+        if self.prev_features is not None:
+            self.gate.set_reference(self.prev_features['gray'])
+
+    def skip_frames(self):
+        return self.base_skip_frames
+
+    def candidate_strides(self):
+        return {self.base_skip_frames}
+
+    @staticmethod
+    def extract_features(gray_resized):
+        # 灰度图要复制：经过 StaticGate 时参考帧会保留很多个采样帧
+        gray_resized = gray_resized.copy()
+        hist = cv2.calcHist([gray_resized], [0], None, [256], [0, 256])
+        hist = cv2.normalize(hist, hist).flatten()
+        edge_count = cv2.countNonZero(cv2.Canny(gray_resized, 50, 150))
+        return {'gray': gray_resized, 'hist': hist, 'edge_count': edge_count}
+
+    def frames_differ(self, prev_features, curr_features):
+        correlation = cv2.compareHist(prev_features['hist'], curr_features['hist'], cv2.HISTCMP_CORREL)
+        if correlation < self.correlation_threshold:
+            return True
+        edge_change = (abs(curr_features['edge_count'] - prev_features['edge_count']) /
+                       max(prev_features['edge_count'], 1))
+        if edge_change > self.edge_change_threshold:
+            return True
+        chi_square = cv2.compareHist(prev_features['hist'], curr_features['hist'], cv2.HISTCMP_CHISQR)
+        return chi_square > self.chi_square_threshold
+
+    def process(self, gray_resized, current_time):
+        self.frame_hashes.add(current_time, gray_resized)
+        self.thumbnails.add(current_time, gray_resized, self.slide_times[-1])
+        if self.gate.is_static(gray_resized):
+            return False  # 与 prev_features 相同，不可能是切换
+        features = self.extract_features(gray_resized)
+        confirmed = False
+        if self.prev_features is not None and self.frames_differ(self.prev_features, features):
+            if (current_time - self.slide_times[-1]) >= self.min_slide_duration:
+                self.slide_times.append(current_time)
+                confirmed = True
+                if self.verbose:
+                    print(f"Slide change {len(self.slide_times)} at {current_time:.2f}s")
+        self.prev_features = features
+        return confirmed
+
+    def finish(self):
+        return list(self.slide_times)
+
+    def slide_hashes(self):
+        """finish() 中每张幻灯片的代表哈希"""
+        return self.frame_hashes.representative(self.finish())
+
+    def slide_thumbnails(self):
+        """finish() 中每张幻灯片的缩略图"""
+        return self.thumbnails.for_slides(self.finish())
+
+
+@register_detector
+class HandwritingDetector:
+    """区分幻灯片切换与教师手写注释的检测（1333.py 算法）
+
+    手写的特点是变化面积小、集中在一处、持续多帧的小幅变化，
+    这类变化会按连续手写帧数压低切换分数。
+    """
+
+    name = 'handwriting'
+    description = "Handwriting-aware (ignores annotations)"
+
+    # 变化图的分块数（宽 x 高）：320x240 的检测帧分成 20x20 像素的块
+    CHANGE_GRID = (16, 12)
+
+    def __init__(self, score_params=None, min_slide_duration=2.0, skip_seconds=1.0,
+                 gate_threshold=DEFAULT_GATE_THRESHOLD, verbose=False):
+        self.score_params = dict(DEFAULT_HANDWRITING_PARAMS)
+        if score_params:
+            self.score_params.update(score_params)
+        self.min_slide_duration = min_slide_duration  # 幻灯片间最小间隔
+        self.skip_seconds = skip_seconds
+        self.gate = StaticGate(gate_threshold)
+        self.verbose = verbose
+        self.reset(25.0)
+
+    def params(self):
+        return {'score_params': self.score_params, 'min_slide_duration': self.min_slide_duration,
+                'skip_seconds': self.skip_seconds, 'gate_threshold': self.gate.threshold}
+
+    def reset(self, fps):
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.base_skip_frames = max(1, int(self.fps * self.skip_seconds))
+        self.prev_features = None
+        self.gate.reset()
+        self.frame_hashes = FrameHashes()
+        self.thumbnails = SlideThumbnails()
+        self.prev_edges = None  # 第一次比较时没有上一帧的边缘数，边缘差异记为 0
+        self.mean_diff_history = RollingStats(15)  # 最近几帧的平均差异
+        self.consecutive_writing_frames = 0
+        self.slide_times = [0.0]  # 第一帧作为第一张幻灯片
+
+    def get_state(self):
+        state = {
+            'slide_times': list(self.slide_times),
+            'prev_edges': self.prev_edges,
+            'mean_diff_history': self.mean_diff_history.values().tolist(),
+            'consecutive_writing_frames': self.consecutive_writing_frames,
+        }
+        if self.prev_features is not None:
+            state['prev_gray'] = self.prev_features['gray']
+        state.update(self.frame_hashes.get_state())
+        state.update(self.thumbnails.get_state())
+        return state
+
+    def set_state(self, state):
+        self.slide_times = list(state['slide_times'])
+        self.frame_hashes.set_state(state)
+        self.thumbnails.set_state(state)
+        self.prev_edges = state['prev_edges']
+        self.mean_diff_history.clear()
+        self.mean_diff_history.extend(state['mean_diff_history'])
+        self.consecutive_writing_frames = state['consecutive_writing_frames']
+        self.gate.reset()
+        prev_gray = state.get('prev_gray')
+        self.prev_features = self.extract_features(np.asarray(prev_gray, np.uint8)) if prev_gray is not None else None
+        if self.prev_features is not None:
+            self.gate.set_reference(self.prev_features['gray'])
+
+    def skip_frames(self):
+        return self.base_skip_frames
+
+    def candidate_strides(self):
+        return {self.base_skip_frames}
+
+    @staticmethod
+    def extract_features(gray_resized):
+        gray_resized = gray_resized.copy()  # 经过 StaticGate 时参考帧会保留很多个采样帧
+        # 边缘检测（对形状变化敏感，对文字添加不太敏感）
+        edge_count = cv2.countNonZero(cv2.Canny(gray_resized, 50, 150))
+        hist = cv2.calcHist([gray_resized], [0], None, [64], [0, 256])
+        hist = cv2.normalize(hist, hist).flatten()
+        return {'gray': gray_resized, 'hist': hist, 'edge_count': edge_count}
+
+    def compare(self, prev, curr, prev_edges):
+        """两帧之间的变化指标；prev_edges 为 None 时边缘差异记为 0"""
+        frame_diff = cv2.absdiff(prev['gray'], curr['gray'])
+        mean_diff = cv2.mean(frame_diff)[0]
+
+        # 分块变化图：面积插值后每块的值就是块内变化像素的占比
+        change_mask = (frame_diff > 30).astype(np.float32)  # 阈值决定什么算"变化"
+        change_map = cv2.resize(change_mask, self.CHANGE_GRID, interpolation=cv2.INTER_AREA)
+        changed_area_ratio = float(change_map.mean())
+
+        # 变化集中度：相连的变化块中最大的一片占全部变化的比例
+        # （只在 16x12 的块上标记连通区域，不必在整幅掩码上逐像素标记）
+        total_change = change_map.sum()
+        if total_change > 0:
+            num_labels, labels = cv2.connectedComponents((change_map > 0).astype(np.uint8), connectivity=4)
+            region_change = np.bincount(labels.ravel(), change_map.ravel(), minlength=num_labels)
+            change_concentration = float(region_change[1:].max() / total_change)  # 0是没有变化的块
+        else:
+            change_concentration = 0.0
+
+        # 直方图相关性（对整体内容变化敏感）
+        hist_corr = cv2.compareHist(prev['hist'], curr['hist'], cv2.HISTCMP_CORREL)
+        hist_diff_score = (1.0 - hist_corr) * 100
+
+        # 边缘差异（对形状/结构变化敏感）
+        edge_diff_ratio = 0.0 if prev_edges is None else abs(curr['edge_count'] - prev_edges) / (prev_edges + 1)
+
+        return {
+            'mean_diff': mean_diff,
+            'changed_area_ratio': changed_area_ratio,
+            'change_concentration': change_concentration,
+            'hist_diff_score': hist_diff_score,
+            'edge_diff_ratio': edge_diff_ratio,
+        }
+
+    def slide_score(self, metrics):
+        """综合变化分数，以及这次变化是否像手写"""
+        p = self.score_params
+        is_writing_like = (
+                metrics['changed_area_ratio'] < p['writing_max_area'] and  # 变化区域小
+                metrics['change_concentration'] > p['writing_min_concentration'] and  # 变化集中
+                metrics['hist_diff_score'] < p['writing_max_hist_diff'] and  # 颜色分布变化小
+                metrics['mean_diff'] < p['writing_max_mean_diff']  # 整体差异小
+        )
+        score = (
+                metrics['mean_diff'] * p['weight_global'] +
+                metrics['hist_diff_score'] * p['weight_histdiff'] +
+                metrics['edge_diff_ratio'] * 100 * p['weight_edges']
+        )
+        return score, is_writing_like
+
+    def is_slide_change(self, score, metrics):
+        p = self.score_params
+        return (
+                (score > p['change_score'] and metrics['changed_area_ratio'] > p['change_min_area']) or  # 大变化+大面积
+                (metrics['hist_diff_score'] > p['change_hist_diff']) or  # 颜色分布大变化
+                (metrics['edge_diff_ratio'] > p['change_edge_diff']) or  # 边缘结构大变化
+                (score > p['change_max_score'])  # 极高分数
+        )
+
+    def frames_differ(self, prev_features, curr_features):
+        """不考虑手写历史，只看两帧本身是否像幻灯片切换"""
+        metrics = self.compare(prev_features, curr_features, prev_features['edge_count'])
+        score, _ = self.slide_score(metrics)
+        return self.is_slide_change(score, metrics)
+
+    def process(self, gray_resized, current_time):
+        self.frame_hashes.add(current_time, gray_resized)
+        self.thumbnails.add(current_time, gray_resized, self.slide_times[-1])
+        if self.gate.is_static(gray_resized):
+            # 与 prev_features 相同：相当于一次没有任何变化的比较（分数为 0，也不像手写）
+            if self.prev_edges is None:
+                self.prev_edges = self.prev_features['edge_count']
+            self.decide_static()
+            return False
+
+        features = self.extract_features(gray_resized)
+        confirmed = False
+        if self.prev_features is not None:
+            metrics = self.compare(self.prev_features, features, self.prev_edges)
+            self.prev_edges = features['edge_count']
+            confirmed = self.decide(metrics, current_time)
+        self.prev_features = features
+        return confirmed
+
+    def decide_static(self):
+        """被 StaticGate 判为静止的采样点：mean_diff 记为 0，连续手写帧数减一"""
+        self.mean_diff_history.append(0.0)
+        self.consecutive_writing_frames = max(0, self.consecutive_writing_frames - 1)
+
+    def decide(self, metrics, current_time):
+        """手写抑制与切换判定，确认新幻灯片时返回 True
+
+        process() 对每对相邻采样帧调用；也可直接喂入预先提取的指标序列（见 slide_series）。
+        """
+        p = self.score_params
+        self.mean_diff_history.append(metrics['mean_diff'])
+
+        score, is_writing_like = self.slide_score(metrics)
+        # 减去手写特征的影响：连续手写帧越多，分数越低
+        if is_writing_like:
+            self.consecutive_writing_frames += 1
+            score *= max(p['writing_floor'], 1.0 - (self.consecutive_writing_frames * p['writing_decay']))
+        else:
+            self.consecutive_writing_frames = max(0, self.consecutive_writing_frames - 1)
+
+        # 手写特征: 渐进式变化（连续小变化），进一步抑制手写误判
+        if len(self.mean_diff_history) >= 3 and all(
+                p['gradual_low'] < x < p['gradual_high'] for x in self.mean_diff_history.tail(3)):
+            score *= p['gradual_factor']
+
+        if self.is_slide_change(score, metrics) and (current_time - self.slide_times[-1]) >= self.min_slide_duration:
+            self.slide_times.append(current_time)
+            self.consecutive_writing_frames = 0  # 重置手写计数
+            if self.verbose:
+                print(f"Slide change {len(self.slide_times)} at {current_time:.2f}s (score {score:.1f})")
+            return True
+        return False
+
+    def finish(self):
+        return list(self.slide_times)
+
+    def slide_hashes(self):
+        """finish() 中每张幻灯片的代表哈希"""
+        return self.frame_hashes.representative(self.finish())
+
+    def slide_thumbnails(self):
+        """finish() 中每张幻灯片的缩略图"""
+        return self.thumbnails.for_slides(self.finish())
+
+
+@register_detector
+class HashDetector:
+    """感知哈希检测：相邻采样帧 dHash 的汉明距离超过阈值即切换
+
+    每帧只需一次 9x8 缩放，比直方图 + SSIM 便宜得多，适合没有动画和批注的干净幻灯片。
+    """
+
+    name = 'hash'
+    description = "Perceptual hash (dHash Hamming distance, cheapest)"
+
+    def __init__(self, hamming_threshold=4, min_slide_duration=1.0, skip_seconds=0.5, verbose=False):
+        self.hamming_threshold = hamming_threshold  # 超过这么多位不同即视为切换
+        self.min_slide_duration = min_slide_duration
+        self.skip_seconds = skip_seconds
+        self.verbose = verbose
+        self.reset(25.0)
+
+    def params(self):
+        return {'hamming_threshold': self.hamming_threshold, 'min_slide_duration': self.min_slide_duration,
+                'skip_seconds': self.skip_seconds, 'hash_size': HASH_SIZE}
+
+    def reset(self, fps):
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.base_skip_frames = max(1, int(self.fps * self.skip_seconds))
+        self.prev_hash = None
+        self.frame_hashes = FrameHashes()
+        self.thumbnails = SlideThumbnails()
+        self.slide_times = [0.0]
+
+    def get_state(self):
+        state = {'slide_times': list(self.slide_times), 'prev_hash': format_hash(self.prev_hash)}
+        state.update(self.frame_hashes.get_state())
+        state.update(self.thumbnails.get_state())
+        return state
+
+    def set_state(self, state):
+        self.slide_times = list(state['slide_times'])
+        self.prev_hash = parse_hash(state['prev_hash'])
+        self.frame_hashes.set_state(state)
+        self.thumbnails.set_state(state)
+
+    def skip_frames(self):
+        return self.base_skip_frames
+
+    def candidate_strides(self):
+        return {self.base_skip_frames}
+
+    @staticmethod
+    def extract_features(gray_resized):
+        return {'gray': gray_resized.copy(), 'hash': dhash(gray_resized)}
+
+    def frames_differ(self, prev_features, curr_features):
+        return hamming_distance(prev_features['hash'], curr_features['hash']) > self.hamming_threshold
+
+    def process(self, gray_resized, current_time):
+        value = self.frame_hashes.add(current_time, gray_resized)
+        self.thumbnails.add(current_time, gray_resized, self.slide_times[-1])
+        confirmed = False
+        if self.prev_hash is not None:
+            distance = hamming_distance(self.prev_hash, value)
+            if distance > self.hamming_threshold and (current_time - self.slide_times[-1]) >= self.min_slide_duration:
+                self.slide_times.append(current_time)
+                confirmed = True
+                if self.verbose:
+                    print(f"Slide change {len(self.slide_times)} at {current_time:.2f}s (hamming {distance})")
+        self.prev_hash = value
+        return confirmed
+
+    def finish(self):
+        return list(self.slide_times)
+
+    def slide_hashes(self):
+        return self.frame_hashes.representative(self.finish())
+
+    def slide_thumbnails(self):
+        return self.thumbnails.for_slides(self.finish())
+
+
+class DetectionResult:
+    """一次检测的结果"""
+
+    def __init__(self, video_path, slide_times, fps, total_frames, duration,
+                 detector_name, processed_frames=0, elapsed=0.0, stats=None, cancelled=False,
+                 slide_hashes=None, slide_thumbnails=None):
+        self.video_path = video_path
+        self.slide_times = slide_times
+        self.fps = fps
+        self.total_frames = total_frames
+        self.duration = duration
+        self.detector_name = detector_name
+        self.processed_frames = processed_frames
+        self.elapsed = elapsed
+        self.stats = stats or {}  # 取帧/分析过程的统计信息
+        self.cancelled = cancelled  # True 时 slide_times 只是取消前找到的部分
+        # 与 slide_times 一一对应的 64 位 dHash（没有采样帧的幻灯片为 None）
+        self.slide_hashes = slide_hashes if slide_hashes is not None else [None] * len(slide_times)
+        # 与 slide_times 一一对应的 THUMBNAIL_SIZE 灰度缩略图（不写入 to_dict，由 SlideCache 存成图集）
+        self.slide_thumbnails = (slide_thumbnails if slide_thumbnails is not None
+                                 else [None] * len(slide_times))
+
+    def to_dict(self):
+        return {
+            'video': self.video_path,
+            'detector': self.detector_name,
+            'fps': self.fps,
+            'total_frames': self.total_frames,
+            'duration': self.duration,
+            'processed_frames': self.processed_frames,
+            'elapsed': round(self.elapsed, 3),
+            'stats': self.stats,
+            'cancelled': self.cancelled,
+            'slide_times': [round(t, 3) for t in self.slide_times],
+            'slide_hashes': [format_hash(h) for h in self.slide_hashes],
+        }
+
+
+class FrameSampler:
+    """按步长从 VideoCapture 取采样帧
+
+    三种取帧方式：
+      read - 每帧都 read（步长为 1 时没有可省的工作）
+      grab - 跳过的帧只 grab，不做 retrieve（省去 BGR 转换和内存拷贝）
+      seek - 直接设置 CAP_PROP_POS_FRAMES 跳到目标帧（步长远大于 GOP 时才划算）
+    mode='auto' 时按步长自动选择。
+    """
+
+    MODES = ('auto', 'read', 'grab', 'seek')
+
+    # 步长达到多少秒的帧数时改用 seek
+    SEEK_MIN_STRIDE_SECONDS = 10.0
+
+    def __init__(self, cap, fps, mode='auto', start_frame=0, end_frame=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown sampling mode: {mode}")
+        self.cap = cap
+        self.fps = fps
+        self.mode = mode
+        self.end_frame = end_frame  # 只取 frame_count <= end_frame 的帧
+        self.frame_count = 0  # 已经越过的帧数（与原来的 frame_count 含义相同）
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            self.frame_count = start_frame
+        self.grabbed = 0
+        self.retrieved = 0
+        self.seeks = 0
+        self._frame = None  # 复用的 BGR 解码缓冲
+
+    def choose_mode(self, stride):
+        if self.mode != 'auto':
+            return self.mode
+        if stride <= 1:
+            return 'read'
+        if stride >= self.fps * self.SEEK_MIN_STRIDE_SECONDS:
+            return 'seek'
+        return 'grab'
+
+    def next(self, stride):
+        """前进到下一个满足 frame_count % stride == 0 的帧
+
+        返回 (frame_count, frame)，视频结束时返回 (frame_count, None)。
+        """
+        target = (self.frame_count // stride + 1) * stride
+        if self.end_frame is not None and target > self.end_frame:
+            return self.frame_count, None
+        mode = self.choose_mode(stride)
+
+        if mode == 'seek' and target - self.frame_count > 1:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, target - 1)
+            self.seeks += 1
+            self.frame_count = target - 1
+
+        while self.frame_count < target - 1:
+            if mode == 'read':
+                ret, _ = self.cap.read()
+            else:
+                ret = self.cap.grab()
+            if not ret:
+                return self.frame_count, None
+            self.grabbed += 1
+            if mode == 'read':
+                self.retrieved += 1
+            self.frame_count += 1
+
+        ret, frame = self.cap.read(self._frame)
+        if not ret:
+            return self.frame_count, None
+        self._frame = frame  # 之后的 read 直接解码到同一块内存
+        self.grabbed += 1
+        self.retrieved += 1
+        self.frame_count = target
+        return target, frame
+
+    def samples(self, detector):
+        """按 detector 当前步长依次产出 (frame_count, 缩小后的灰度图)
+
+        灰度图写入两块交替使用的缓冲区：上一个产出的数组在下一帧产出后仍然有效。
+        """
+        outputs = [np.empty((DETECTION_SIZE[1], DETECTION_SIZE[0]), np.uint8) for _ in range(2)]
+        gray = None
+        index = 0
+        while True:
+            frame_count, frame = self.next(detector.skip_frames())
+            if frame is None:
+                return
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=gray)
+            yield frame_count, cv2.resize(gray, DETECTION_SIZE, dst=outputs[index])
+            index ^= 1
+
+    def stats_dict(self):
+        return {'grabbed': self.grabbed, 'retrieved': self.retrieved, 'seeks': self.seeks}
+
+
+class LowResFrameSource:
+    """让 FFmpeg 直接输出检测分辨率的灰度帧（ffpyplayer MediaPlayer）
+
+    out_fmt='gray' 只取亮度平面，set_size 让缩放在 FFmpeg 的解码线程里完成，
+    支持 lowres 的编解码器（MJPEG、MPEG-4 Part 2 等）还会直接以 1/2、1/4 分辨率解码。
+    Python 这边只会拿到 320x240 的灰度数据，不会接触原始的 1080p/4K 帧。
+    MediaPlayer 自带解码线程，所以不需要 FramePipeline；也无法 grab 跳帧，
+    每一帧都会被缩小后交给 Python，由这里按步长挑选。
+    """
+
+    def __init__(self, video_path, fps, frame_size=None, start_frame=0, end_frame=None):
+        if MediaPlayer is None:
+            raise DetectionError("ffpyplayer is required for the low-resolution reader")
+        self.video_path = video_path
+        self.fps = fps
+        self.frame_size = frame_size  # 原始 (宽, 高)，用于选择 lowres 级别
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.delivered = 0
+        self.lowres = 0
+
+    def _lowres_level(self):
+        """在缩小后仍不低于检测分辨率的前提下，尽量多降几级"""
+        if not self.frame_size:
+            return 0
+        width, height = self.frame_size
+        level = 0
+        while (level < 3 and (width >> (level + 1)) >= DETECTION_SIZE[0] and
+               (height >> (level + 1)) >= DETECTION_SIZE[1]):
+            level += 1
+        return level
+
+    def _open_player(self):
+        self.lowres = self._lowres_level()
+        ff_opts = {'out_fmt': 'gray', 'an': True, 'sn': True, 'sync': 'video',
+                   'framedrop': False, 'lowres': self.lowres}
+        if self.start_frame > 0:
+            ff_opts['ss'] = self.start_frame / self.fps
+        player = MediaPlayer(self.video_path, ff_opts=ff_opts)
+        player.set_size(*DETECTION_SIZE)
+        return player
+
+    def samples(self, detector):
+        """与 FrameSampler.samples 相同的接口"""
+        player = self._open_player()
+        width, height = DETECTION_SIZE
+        try:
+            frame_count = None
+            next_needed = None
+            while True:
+                frame, val = player.get_frame()
+                if val == 'eof':
+                    return
+                if frame is None:
+                    time.sleep(0.0002)
+                    continue
+
+                img, pts = frame
+                if frame_count is None:
+                    # seek 之后第一帧的位置以 pts 为准，此后逐帧计数
+                    frame_count = int(round((pts or 0.0) * self.fps)) if self.start_frame > 0 else 0
+                    stride = detector.skip_frames()
+                    next_needed = (frame_count // stride + 1) * stride
+                frame_count += 1
+                self.delivered += 1
+
+                if self.end_frame is not None and frame_count > self.end_frame:
+                    return
+                if frame_count != next_needed:
+                    continue
+
+                linesize = img.get_linesizes()[0]
+                plane = np.frombuffer(img.to_bytearray()[0], dtype=np.uint8)
+                yield frame_count, plane.reshape(height, linesize)[:, :width]
+
+                stride = detector.skip_frames()
+                next_needed = (frame_count // stride + 1) * stride
+        finally:
+            player.close_player()
+
+    def stats_dict(self):
+        return {'delivered': self.delivered, 'lowres': self.lowres}
+
+
+class PipelineStats:
+    """流水线各阶段的进度与背压统计，可在检测过程中从其他线程读取"""
+
+    def __init__(self, ring_size):
+        self.ring_size = ring_size
+        self.grabbed = 0  # 解码线程越过的帧
+        self.retrieved = 0  # 解码线程转换并放入环中的帧
+        self.analyzed = 0  # 分析线程实际处理的帧
+        self.unused = 0  # 放入环中但按最终步长不需要的帧
+        self.decoder_blocked = 0.0  # 环满、解码线程等待空槽的总秒数
+        self.analyzer_starved = 0.0  # 环空、分析线程等待新帧的总秒数
+        self.peak_fill = 0
+        self.fill_total = 0
+
+    def bottleneck(self):
+        """谁在等谁：解码线程常等空槽说明分析慢，分析线程常等新帧说明解码慢"""
+        if self.decoder_blocked > self.analyzer_starved:
+            return 'analyze'
+        return 'decode'
+
+    def to_dict(self):
+        return {
+            'ring_size': self.ring_size,
+            'grabbed': self.grabbed,
+            'retrieved': self.retrieved,
+            'analyzed': self.analyzed,
+            'unused': self.unused,
+            'decoder_blocked': round(self.decoder_blocked, 3),
+            'analyzer_starved': round(self.analyzer_starved, 3),
+            'peak_fill': self.peak_fill,
+            'mean_fill': round(self.fill_total / max(self.retrieved, 1), 2),
+            'bottleneck': self.bottleneck(),
+        }
+
+
+class FramePipeline:
+    """解码线程 → 有界帧环 → 分析线程
+
+    解码线程负责 grab/retrieve/灰度化/缩小，把结果写进预分配的帧环槽位；
+    分析线程（调用 samples() 的线程）取出槽位做特征提取与判断。
+    OpenCV 解码时会释放 GIL，所以两边可以真正重叠。
+
+    动态步长由分析结果决定，解码线程事先并不知道下一帧要不要，
+    所以它会放入"任一候选步长下可能需要"的帧；分析线程每处理完一帧就公布
+    下一帧需要的 frame_count，解码线程据此跳过肯定用不到的帧。
+    分析线程只接受恰好等于该 frame_count 的帧，结果与单线程逐帧扫描完全相同。
+    """
+
+    def __init__(self, cap, fps, ring_size=8, start_frame=0, end_frame=None, stats=None):
+        if ring_size < 2:
+            raise ValueError("ring_size must be at least 2")
+        self.cap = cap
+        self.fps = fps
+        self.end_frame = end_frame
+        self.start_frame = start_frame
+        if start_frame > 0:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+        width, height = DETECTION_SIZE
+        self.slots = np.empty((ring_size, height, width), dtype=np.uint8)
+        self.free_slots = queue.Queue()
+        for i in range(ring_size):
+            self.free_slots.put(i)
+        self.filled = queue.Queue()
+        self.stats = stats if stats is not None else PipelineStats(ring_size)
+
+        self.next_needed = 0  # 分析线程公布的下一个需要的 frame_count
+        self.strides = ()
+        self.stop_event = threading.Event()
+        self.error = None
+        self.thread = None
+
+    def _acquire_slot(self):
+        """取一个空槽位；环满时阻塞并计入背压时间"""
+        try:
+            return self.free_slots.get_nowait()
+        except queue.Empty:
+            pass
+        waited_from = time.perf_counter()
+        while not self.stop_event.is_set():
+            try:
+                slot = self.free_slots.get(timeout=0.1)
+                self.stats.decoder_blocked += time.perf_counter() - waited_from
+                return slot
+            except queue.Empty:
+                continue
+        return None
+
+    def _decode_loop(self):
+        frame_count = self.start_frame
+        full_gray = None
+        try:
+            while not self.stop_event.is_set():
+                if self.end_frame is not None and frame_count >= self.end_frame:
+                    break
+                if not self.cap.grab():
+                    break
+                frame_count += 1
+                self.stats.grabbed += 1
+
+                needed = self.next_needed
+                if frame_count < needed:
+                    continue
+                if frame_count != needed and not any(frame_count % s == 0 for s in self.strides):
+                    continue
+
+                ret, frame = self.cap.retrieve()
+                if not ret:
+                    break
+                slot = self._acquire_slot()
+                if slot is None:
+                    break
+                full_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=full_gray)
+                cv2.resize(full_gray, DETECTION_SIZE, dst=self.slots[slot])
+
+                self.filled.put((frame_count, slot))
+                fill = self.filled.qsize()
+                self.stats.retrieved += 1
+                self.stats.fill_total += fill
+                self.stats.peak_fill = max(self.stats.peak_fill, fill)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.filled.put((None, None))
+
+    def samples(self, detector):
+        """与 FrameSampler.samples 相同的接口，产出的灰度图是帧环槽位的视图"""
+        self.strides = tuple(detector.candidate_strides())
+        stride = detector.skip_frames()
+        self.next_needed = (self.start_frame // stride + 1) * stride
+        self.thread = threading.Thread(target=self._decode_loop, daemon=True)
+        self.thread.start()
+
+        held_slot = None  # 作为 prev 帧仍被 detector 引用的槽位
+        try:
+            while True:
+                try:
+                    frame_count, slot = self.filled.get_nowait()
+                except queue.Empty:
+                    waited_from = time.perf_counter()
+                    frame_count, slot = self.filled.get()
+                    self.stats.analyzer_starved += time.perf_counter() - waited_from
+
+                if frame_count is None:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                if frame_count != self.next_needed:
+                    self.stats.unused += 1
+                    self.free_slots.put(slot)
+                    continue
+
+                yield frame_count, self.slots[slot]
+
+                self.stats.analyzed += 1
+                if held_slot is not None:
+                    self.free_slots.put(held_slot)
+                held_slot = slot
+                stride = detector.skip_frames()
+                self.next_needed = (frame_count // stride + 1) * stride
+        finally:
+            self.stop_event.set()
+            self.thread.join(timeout=5.0)
+
+    def stats_dict(self):
+        return self.stats.to_dict()
+
+
+def open_capture(video_path):
+    """打开视频并返回 (cap, fps, total_frames)"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise DetectionError("Cannot open video file for analysis")
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return cap, fps, total_frames
+
+
+READERS = ('opencv', 'lowres', 'auto')
+
+# 'auto' 只对不低于这个高度的视频选 lowres：小视频 OpenCV 解码整帧本来就快，经 FFmpeg 缩放输出
+# 反而更慢（360p 慢 2～3 倍，720p 持平或略慢），1080p 起才快一倍左右
+LOWRES_MIN_HEIGHT = 1080
+
+
+def resolve_reader(reader, video_path=None, frame_height=None):
+    """把 'auto' 换成实际使用的取帧方式
+
+    'auto' 在装有 ffpyplayer 且视频高度不低于 LOWRES_MIN_HEIGHT 时选 lowres，否则选 opencv。
+    frame_height 未知时从 video_path 读取；两者都没有时按 opencv 处理。
+    """
+    if reader not in READERS:
+        raise ValueError(f"Unknown reader: {reader}")
+    if reader != 'auto':
+        return reader
+    if MediaPlayer is None:
+        return 'opencv'
+    if frame_height is None and video_path is not None:
+        cap = cv2.VideoCapture(video_path)
+        frame_height = cap.get(cv2.CAP_PROP_FRAME_HEIGHT) if cap.isOpened() else 0
+        cap.release()
+    return 'lowres' if (frame_height or 0) >= LOWRES_MIN_HEIGHT else 'opencv'
+
+
+def detect_slides(video_path, detector=None, progress_callback=None, progress_interval=15,
+                  fallback_duration=0.0, sampling='auto', start_frame=0, end_frame=None,
+                  ring_size=0, pipeline_stats=None, reader='opencv', checkpoint=None,
+                  keep_checkpoint=False, slide_callback=None, cancel_token=None):
+    """检测一个视频中的幻灯片切换点
+
+    progress_callback(processed, expected, current_time, video_duration, slide_count)
+    每处理 progress_interval 个采样帧调用一次，可在任意线程中调用。
+    sampling 为 FrameSampler 的取帧方式，默认按步长自动选择。
+    start_frame/end_frame 限定只分析 frame_count 在 (start_frame, end_frame] 内的帧。
+    ring_size > 0 时改用 FramePipeline：解码在独立线程中进行，帧环容量为 ring_size；
+    可传入 PipelineStats 对象在检测过程中查看各阶段状态。
+    reader='lowres' 时由 LowResFrameSource 让 FFmpeg 直接输出小尺寸灰度帧
+    （此时 sampling 和 ring_size 不起作用）；'auto' 按视频高度选择，见 resolve_reader。
+    checkpoint（如 slide_cache.DetectionCheckpoint）会定期保存检测进度，
+    下次用同一个 checkpoint 调用时从断点继续；正常结束后删除断点，
+    keep_checkpoint=True 时保留（并行分段由上层统一删除）。
+    slide_callback(slide_time) 在每张幻灯片确认后立即调用（按时间顺序，含开头的 0.0），
+    报告的时间与最终结果一致，可在任意线程中调用。
+    cancel_token（CancelToken）被取消时尽快停止，返回 cancelled=True 的部分结果；
+    有 checkpoint 时保存当前进度而不是删除。
+    """
+    if reader not in READERS:
+        raise ValueError(f"Unknown reader: {reader}")
+    if detector is None:
+        detector = MultiMetricDetector()
+
+    start = time.perf_counter()
+    cap, fps, total_frames = open_capture(video_path)
+    try:
+        reader = resolve_reader(reader, frame_height=cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        video_duration = total_frames / fps if fps > 0 else fallback_duration
+        detector.reset(fps)
+        fps = detector.fps
+
+        resumed_from = None
+        saved = checkpoint.load() if checkpoint is not None else None
+        if saved is not None:
+            resumed_from, state = saved
+            detector.set_state(state)
+            start_frame = max(start_frame, resumed_from)
+
+        # 最小间隔后处理是贪心的：新切换点只会追加到结果末尾，不会改变已报告的部分
+        published = []
+
+        def publish_slides():
+            for slide_time in detector.finish()[len(published):]:
+                published.append(slide_time)
+                slide_callback(slide_time)
+
+        if slide_callback:
+            publish_slides()
+
+        last_frame = total_frames if end_frame is None else min(end_frame, total_frames)
+        expected_processed_frames = max(0, last_frame - start_frame) // detector.base_skip_frames
+        if progress_callback:
+            progress_callback(0, expected_processed_frames, start_frame / fps, video_duration, 1)
+
+        if reader == 'lowres':
+            frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            source = LowResFrameSource(video_path, fps, frame_size, start_frame, end_frame)
+        elif ring_size:
+            source = FramePipeline(cap, fps, ring_size, start_frame, end_frame, pipeline_stats)
+        else:
+            source = FrameSampler(cap, fps, sampling, start_frame, end_frame)
+        processed_frames = 0
+        frame_count = start_frame
+        # 检测器已经处理完的最后一个采样帧；取消时取到的下一个采样帧还没处理，断点只能记到这里
+        last_processed = start_frame
+        cancelled = False
+
+        for frame_count, gray_resized in source.samples(detector):
+            if cancel_token is not None and cancel_token.cancelled:
+                cancelled = True
+                break
+            current_time = frame_count / fps
+            processed_frames += 1
+            if detector.process(gray_resized, current_time) and slide_callback:
+                publish_slides()
+            last_processed = frame_count
+
+            if checkpoint is not None:
+                checkpoint.maybe_save(frame_count, detector)
+
+            if progress_callback and processed_frames % progress_interval == 0:
+                progress_callback(processed_frames, expected_processed_frames, current_time,
+                                  video_duration, len(detector.slide_times))
+    finally:
+        cap.release()
+
+    if checkpoint is not None:
+        if cancelled:
+            checkpoint.save(last_processed, detector)
+        elif keep_checkpoint:
+            # 标记到段尾，续检时直接跳过已完成的部分
+            checkpoint.save(max(frame_count, last_frame), detector)
+        else:
+            checkpoint.clear()
+
+    stats = source.stats_dict()
+    gate = getattr(detector, 'gate', None)
+    if gate is not None:
+        stats.update(gate.stats())
+    if resumed_from is not None:
+        stats['resumed_from_frame'] = resumed_from
+    slide_hashes = detector.slide_hashes() if hasattr(detector, 'slide_hashes') else None
+    slide_thumbnails = detector.slide_thumbnails() if hasattr(detector, 'slide_thumbnails') else None
+    return DetectionResult(video_path, detector.finish(), fps, total_frames, video_duration,
+                           detector.name, processed_frames, time.perf_counter() - start, stats=stats,
+                           cancelled=cancelled, slide_hashes=slide_hashes, slide_thumbnails=slide_thumbnails)
+
+
+class _SeekReader:
+    """按帧号随机读取检测用特征；相邻帧顺序读，不相邻才 seek"""
+
+    def __init__(self, cap, extract_features):
+        self.cap = cap
+        self.extract_features = extract_features
+        self.next_index = 0
+        self.cache = {}
+        self.decoded = 0
+        self.seeks = 0
+
+    def features(self, index):
+        if index in self.cache:
+            return self.cache[index]
+        if index != self.next_index:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self.seeks += 1
+        ret, frame = self.cap.read()
+        if not ret:
+            self.next_index = -1
+            return None
+        self.decoded += 1
+        self.next_index = index + 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        features = self.extract_features(cv2.resize(gray, DETECTION_SIZE))
+        self.cache[index] = features
+        return features
+
+    def forget_before(self, index):
+        """丢弃已经用不到的帧，保持缓存很小"""
+        for key in [k for k in self.cache if k < index]:
+            del self.cache[key]
+
+
+def detect_slides_coarse_to_fine(video_path, detector=None, coarse_interval=5.0, progress_callback=None,
+                                 fallback_duration=0.0, positions=None, slide_callback=None, cancel_token=None):
+    """粗采样 + 二分细化的幻灯片检测
+
+    每隔 coarse_interval 秒 seek 取一个样本，相邻样本被 detector.frames_differ
+    判定为不同幻灯片时在两者之间二分，直到定位到切换发生的那一帧。
+    幻灯片通常静止几十秒，解码帧数可以比逐帧扫描少一到两个数量级。
+    同一粗区间内"切走又切回"（A→B→A）的变化看不到，
+    所以 coarse_interval 应小于最短的幻灯片时长。
+    positions 可直接给出粗样本的帧号（如 slide_packets 按数据包大小选出的位置），此时忽略 coarse_interval。
+    slide_callback / cancel_token 的含义与 detect_slides 相同。
+    """
+    if detector is None:
+        detector = MultiMetricDetector()
+
+    start = time.perf_counter()
+    cap, fps, total_frames = open_capture(video_path)
+    try:
+        video_duration = total_frames / fps if fps > 0 else fallback_duration
+        detector.reset(fps)
+        fps = detector.fps
+
+        last_index = max(total_frames - 1, 0)
+        if positions is None:
+            step = max(1, int(round(coarse_interval * fps)))
+            positions = list(range(0, last_index, step)) + [last_index]
+        else:
+            positions = sorted({0} | {min(max(int(p), 0), last_index) for p in positions})
+        if progress_callback:
+            progress_callback(0, len(positions), 0.0, video_duration, 1)
+
+        reader = _SeekReader(cap, detector.extract_features)
+        boundaries = []
+        bisect_steps = 0
+
+        prev_index, prev_features = 0, reader.features(0)
+        if prev_features is None:
+            raise DetectionError("Cannot read the first frame for analysis")
+        # 幻灯片开始时间 -> 代表哈希 / 缩略图
+        hashes = {0.0: dhash(prev_features['gray'])}
+        thumbnails = {0.0: make_thumbnail(prev_features['gray'])}
+
+        # 边界按时间顺序找到，最小间隔后处理是贪心的，已报告的部分不会再变
+        published = []
+
+        def publish_slides():
+            confirmed = post_process_slide_times([0.0] + [b / fps for b in boundaries], detector.min_slide_duration)
+            for slide_time in confirmed[len(published):]:
+                published.append(slide_time)
+                slide_callback(slide_time)
+
+        if slide_callback:
+            publish_slides()
+
+        cancelled = False
+        for sample_no, index in enumerate(positions[1:], start=1):
+            if cancel_token is not None and cancel_token.cancelled:
+                cancelled = True
+                break
+            features = reader.features(index)
+            if features is None:
+                break
+
+            lo, lo_features = prev_index, prev_features
+            found = len(boundaries)
+            # 同一个粗区间内可能不止一次切换：找到一个边界后从边界继续比较
+            while detector.frames_differ(lo_features, features):
+                hi = index
+                while hi - lo > 1:
+                    mid = (lo + hi) // 2
+                    mid_features = reader.features(mid)
+                    bisect_steps += 1
+                    if mid_features is None or detector.frames_differ(lo_features, mid_features):
+                        hi = mid
+                    else:
+                        lo, lo_features = mid, mid_features
+                boundaries.append(hi)
+                lo, lo_features = hi, reader.features(hi)
+                if lo_features is None:
+                    break
+                hashes[hi / fps] = dhash(lo_features['gray'])
+                thumbnails[hi / fps] = make_thumbnail(lo_features['gray'])
+            if len(boundaries) > found:
+                # 区间内最后一张幻灯片用粗样本的哈希和画面：它在边界之后，已越过淡入淡出
+                hashes[boundaries[-1] / fps] = dhash(features['gray'])
+                thumbnails[boundaries[-1] / fps] = make_thumbnail(features['gray'])
+                if slide_callback:
+                    publish_slides()
+
+            reader.forget_before(index)
+            prev_index, prev_features = index, features
+
+            if progress_callback and sample_no % 15 == 0:
+                progress_callback(sample_no, len(positions), index / fps, video_duration,
+                                  len(boundaries) + 1)
+    finally:
+        cap.release()
+
+    # 边界帧号 / fps 即新幻灯片第一帧的时间
+    slide_times = post_process_slide_times([0.0] + [b / fps for b in boundaries],
+                                           detector.min_slide_duration)
+    stats = {'coarse_samples': len(positions), 'bisect_steps': bisect_steps,
+             'retrieved': reader.decoded, 'seeks': reader.seeks}
+    return DetectionResult(video_path, list(slide_times), fps, total_frames, video_duration,
+                           detector.name, reader.decoded, time.perf_counter() - start, stats=stats,
+                           cancelled=cancelled, slide_hashes=[hashes.get(t) for t in slide_times],
+                           slide_thumbnails=[thumbnails.get(t) for t in slide_times])
+
+
+# 并行检测默认最多用几个工作进程（每个进程各自解码，再多也会被磁盘和内存带宽拖住）；
+# 环境变量 SLIDE_WORKERS 可以改
+MAX_DEFAULT_WORKERS = 4
+# 每段至少多长（秒），更短的视频不值得分段
+DEFAULT_MIN_SEGMENT_SECONDS = 120.0
+# 工作进程用 spawn 启动：GUI 进程里有 Tk 和 ffpyplayer 的线程，fork 出的子进程可能卡在它们持有的锁上
+WORKER_START_METHOD = 'spawn'
+
+# 工作进程内的取消标志和逐张报告幻灯片的队列（由进程池 initializer 设置）
+_worker_cancel_token = None
+_worker_slide_queue = None
+
+
+def _init_segment_worker(cancel_event, slide_queue):
+    global _worker_cancel_token, _worker_slide_queue
+    _worker_cancel_token = CancelToken(cancel_event)
+    _worker_slide_queue = slide_queue
+
+
+def _detect_segment(video_path, detector, segment_index, scan_start, segment_start, segment_end, sampling,
+                    ring_size, reader, checkpoint):
+    """进程池中分析一个时间段，只返回属于 (segment_start, segment_end] 的切换时间及其代表哈希和缩略图
+
+    有报告队列时，每确认一张幻灯片就把 (segment_index, 时间) 放进队列（含预热区的，由主进程筛选）。
+    """
+    slide_callback = None
+    if _worker_slide_queue is not None:
+        def slide_callback(slide_time):
+            _worker_slide_queue.put((segment_index, slide_time))
+
+    result = detect_slides(video_path, detector, sampling=sampling, start_frame=scan_start,
+                           end_frame=segment_end, ring_size=ring_size, reader=reader,
+                           checkpoint=checkpoint, keep_checkpoint=True, slide_callback=slide_callback,
+                           cancel_token=_worker_cancel_token)
+    owned = [i for i, t in enumerate(result.slide_times)
+             if round(t * result.fps) > segment_start or (t == 0.0 and segment_start == 0)]
+    hashes = {result.slide_times[i]: result.slide_hashes[i] for i in owned}
+    thumbnails = {result.slide_times[i]: result.slide_thumbnails[i] for i in owned}
+    changes = [t for t in result.slide_times[1:] if round(t * result.fps) > segment_start]
+    return changes, hashes, thumbnails, result.processed_frames, result.stats, result.cancelled
+
+
+def split_segments(total_frames, segments, warmup_frames):
+    """把视频切成若干段，返回 [(scan_start, segment_start, segment_end), ...]
+
+    每段从 segment_start 之前 warmup_frames 帧开始扫描，让自适应阈值、
+    静帧过滤等历史状态在进入本段之前就已建立。
+    """
+    bounds = [total_frames * i // segments for i in range(segments + 1)]
+    return [(max(0, bounds[i] - warmup_frames), bounds[i], bounds[i + 1]) for i in range(segments)]
+
+
+def default_workers():
+    """并行检测的默认进程数：环境变量 SLIDE_WORKERS，否则 CPU 核数，但不超过 MAX_DEFAULT_WORKERS"""
+    try:
+        workers = int(os.environ.get('SLIDE_WORKERS', ''))
+    except ValueError:
+        workers = min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS)
+    return max(1, workers)
+
+
+def segment_count(total_frames, fps, workers, min_segment_seconds=DEFAULT_MIN_SEGMENT_SECONDS):
+    """detect_slides_parallel 把视频切成几段；1 表示退化为单进程 detect_slides"""
+    fps = fps if fps and fps > 0 else 25.0
+    return max(1, min(workers, int(total_frames / (fps * min_segment_seconds))))
+
+
+def parallel_segment_count(video_path, workers=None, min_segment_seconds=DEFAULT_MIN_SEGMENT_SECONDS):
+    """同上，直接读视频的帧数和帧率（结果与分段有关，缓存键要用到）"""
+    cap, fps, total_frames = open_capture(video_path)
+    cap.release()
+    return segment_count(total_frames, fps, workers or default_workers(), min_segment_seconds)
+
+
+def detect_slides_parallel(video_path, detector=None, workers=None, progress_callback=None,
+                           fallback_duration=0.0, sampling='auto', warmup_seconds=30.0,
+                           min_segment_seconds=DEFAULT_MIN_SEGMENT_SECONDS, ring_size=0, reader='opencv',
+                           checkpoint=None, slide_callback=None, cancel_token=None):
+    """把视频按时间切段，每段在独立进程里用自己的 VideoCapture 检测，再拼接结果
+
+    段边界附近的切换：每段都带 warmup_seconds 的预热扫描（预热区的结果丢弃），
+    所以紧挨边界的切换由后一段在有完整历史的情况下判定；
+    同一次切换被相邻两段分别报告时，最后的最小间隔后处理会把它们合并。
+    视频太短（每段不足 min_segment_seconds）时退化为单进程 detect_slides。
+    checkpoint 会按段拆分（checkpoint.for_segment），每段各自续检，全部完成后删除。
+    slide_callback 按时间顺序报告：工作进程每确认一张幻灯片就通过队列告诉主进程，
+    之前各段都已完成的那一段（最早的未完成段）边检测边报告，更靠后的段等前面的段完成后再报告。
+    cancel_token 被取消时通知所有工作进程停止，返回各段已找到的切换点（cancelled=True），
+    分段断点保留以便下次继续。
+    workers 默认见 default_workers()；分段数记在 stats['segments']，结果随分段略有不同，缓存时要区分。
+    """
+    if detector is None:
+        detector = MultiMetricDetector()
+    workers = workers or default_workers()
+
+    start = time.perf_counter()
+    cap, fps, total_frames = open_capture(video_path)
+    cap.release()
+    fps = fps if fps and fps > 0 else 25.0
+    video_duration = total_frames / fps if total_frames > 0 else fallback_duration
+
+    segments = segment_count(total_frames, fps, workers, min_segment_seconds)
+    if segments <= 1:
+        return detect_slides(video_path, detector, progress_callback,
+                             fallback_duration=fallback_duration, sampling=sampling, ring_size=ring_size,
+                             reader=reader, checkpoint=checkpoint, slide_callback=slide_callback,
+                             cancel_token=cancel_token)
+
+    plan = split_segments(total_frames, segments, int(warmup_seconds * fps))
+    segment_checkpoints = [checkpoint.for_segment(i, len(plan)) if checkpoint is not None else None
+                           for i in range(len(plan))]
+    if progress_callback:
+        progress_callback(0, len(plan), 0.0, video_duration, 1)
+
+    changes = []
+    slide_hashes = {}
+    slide_thumbnails = {}
+    processed_frames = 0
+    segment_stats = []
+    # 按段顺序流式报告：只有前面的段都完成，后处理结果的前缀才确定。
+    # 已完成的段用最终结果，最早的未完成段用工作进程已报告的部分（逐帧扫描的结果只会在末尾追加）
+    segment_changes_by_index = {}
+    live_changes = [[] for _ in plan]
+    published = []
+    next_segment = 0
+    cancelled = False
+
+    def publish_slides():
+        nonlocal next_segment
+        while next_segment in segment_changes_by_index:
+            next_segment += 1
+        ordered = []
+        for index in range(next_segment):
+            ordered.extend(segment_changes_by_index[index])
+        if next_segment < len(plan):
+            ordered.extend(live_changes[next_segment])
+        confirmed = post_process_slide_times([0.0] + sorted(ordered), detector.min_slide_duration)
+        for slide_time in confirmed[len(published):]:
+            published.append(slide_time)
+            slide_callback(slide_time)
+
+    # 工作进程不能直接使用调用方的 CancelToken 和回调，通过进程池 initializer 传入进程间 Event 和队列
+    context = multiprocessing.get_context(WORKER_START_METHOD)
+    cancel_event = context.Event()
+    slide_queue = context.Queue() if slide_callback else None
+    with ProcessPoolExecutor(max_workers=segments, mp_context=context, initializer=_init_segment_worker,
+                             initargs=(cancel_event, slide_queue)) as pool:
+        futures = {pool.submit(_detect_segment, video_path, detector, index, scan_start, seg_start, seg_end,
+                               sampling, ring_size, reader, segment_checkpoint): index
+                   for index, ((scan_start, seg_start, seg_end), segment_checkpoint)
+                   in enumerate(zip(plan, segment_checkpoints))}
+        pending = set(futures)
+        done = 0
+        while pending:
+            finished, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            if cancel_token is not None and cancel_token.cancelled:
+                cancel_event.set()
+            if slide_queue is not None:
+                reported = False
+                while True:
+                    try:
+                        index, slide_time = slide_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    # 与 _detect_segment 一样只要本段的切换，预热区的丢弃
+                    if round(slide_time * fps) > plan[index][1]:
+                        live_changes[index].append(slide_time)
+                        reported = True
+                if reported and not cancelled and not (cancel_token is not None and cancel_token.cancelled):
+                    publish_slides()
+            for future in finished:
+                done += 1
+                (segment_changes, segment_hashes, segment_thumbnails, segment_processed, stats,
+                 segment_cancelled) = future.result()
+                cancelled = cancelled or segment_cancelled
+                changes.extend(segment_changes)
+                slide_hashes.update(segment_hashes)
+                slide_thumbnails.update(segment_thumbnails)
+                processed_frames += segment_processed
+                segment_stats.append(stats)
+                segment_changes_by_index[futures[future]] = segment_changes
+                if slide_callback and not cancelled:
+                    publish_slides()
+                if progress_callback:
+                    progress_callback(done, len(plan), video_duration * done / len(plan), video_duration,
+                                      len(changes) + 1)
+
+    if not cancelled:
+        for segment_checkpoint in segment_checkpoints:
+            if segment_checkpoint is not None:
+                segment_checkpoint.clear()
+
+    slide_times = post_process_slide_times([0.0] + sorted(changes), detector.min_slide_duration)
+    stats = {'segments': len(plan), 'workers': workers,
+             'retrieved': sum(s.get('retrieved', 0) for s in segment_stats),
+             'grabbed': sum(s.get('grabbed', 0) for s in segment_stats)}
+    if any('gate_checked' in s for s in segment_stats):
+        stats.update(gate_stats(sum(s.get('gate_checked', 0) for s in segment_stats),
+                                sum(s.get('gate_static', 0) for s in segment_stats)))
+    return DetectionResult(video_path, list(slide_times), fps, total_frames, video_duration,
+                           detector.name, processed_frames, time.perf_counter() - start, stats=stats,
+                           cancelled=cancelled, slide_hashes=[slide_hashes.get(t) for t in slide_times],
+                           slide_thumbnails=[slide_thumbnails.get(t) for t in slide_times])
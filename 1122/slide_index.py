@@ -0,0 +1,110 @@
+"""重复幻灯片分组：按 dHash 把视觉上相同的幻灯片聚成一组
+
+讲课时经常翻回前面的幻灯片，检测结果里每次翻回都是一张"新"幻灯片。
+SlideGroups 把代表哈希相近（汉明距离 <= radius）的幻灯片归为一组，
+可以查询"第 N 张幻灯片出现在 t1, t2, t3"以及"这张幻灯片第一次出现在哪里"。
+
+查找相近哈希用多索引哈希（multi-index hashing）：把 64 位哈希切成 radius + 1 段，
+每段建一个字典。两个哈希最多有 radius 位不同时，按抽屉原理至少有一段完全相同，
+所以只需比较与查询哈希某一段相同的候选，而不是和所有已有的哈希逐个比较。
+"""
+from slide_engine import HASH_SIZE, hamming_distance
+
+# 同一张幻灯片再次出现时代表哈希通常只差 0~2 位；套用同一模板的不同幻灯片可能只差 4 位
+DEFAULT_GROUP_RADIUS = 3
+
+
+class HashIndex:
+    """按汉明距离查找相近哈希的多索引表"""
+
+    def __init__(self, radius=DEFAULT_GROUP_RADIUS, bits=HASH_SIZE * HASH_SIZE):
+        self.radius = radius
+        chunks = radius + 1
+        if chunks > bits:
+            raise ValueError(f"radius {radius} is too large for {bits}-bit hashes")
+        # 每段的 (右移位数, 掩码)；位数除不尽时前几段多一位
+        self._chunks = []
+        shift = 0
+        for i in range(chunks):
+            width = bits // chunks + (1 if i < bits % chunks else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        self._tables = [{} for _ in range(chunks)]
+        self.hashes = []
+        self.keys = []
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, value, key):
+        """加入一个哈希，key 为查询时返回的标识（如组号）"""
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.keys.append(key)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((value >> shift) & mask, []).append(position)
+
+    def query(self, value):
+        """所有距离 <= radius 的 (key, 距离)，按距离从小到大排列"""
+        candidates = set()
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            candidates.update(table.get((value >> shift) & mask, ()))
+        matches = []
+        for position in sorted(candidates):
+            distance = hamming_distance(value, self.hashes[position])
+            if distance <= self.radius:
+                matches.append((distance, position))
+        matches.sort()
+        return [(self.keys[position], distance) for distance, position in matches]
+
+    def nearest(self, value):
+        """最近的 (key, 距离)，没有距离 <= radius 的哈希时返回 None"""
+        matches = self.query(value)
+        return matches[0] if matches else None
+
+
+class SlideGroups:
+    """把重复出现的幻灯片分组
+
+    group_of[i] 是第 i 张幻灯片的组号，组号按第一次出现的顺序编号；
+    members[g] 是第 g 组的幻灯片序号（按时间）。没有哈希的幻灯片各自成组。
+    """
+
+    def __init__(self, slide_times, slide_hashes, radius=DEFAULT_GROUP_RADIUS):
+        self.slide_times = list(slide_times)
+        self.radius = radius
+        self.group_of = []
+        self.members = []
+        index = HashIndex(radius)
+        for i, value in enumerate(slide_hashes):
+            match = index.nearest(value) if value is not None else None
+            if match is None:
+                group = len(self.members)
+                self.members.append([])
+            else:
+                group = match[0]
+            self.group_of.append(group)
+            self.members[group].append(i)
+            if value is not None:
+                # 组内每次出现的哈希都加入索引，批注逐渐增多的幻灯片仍能匹配到最近的一次
+                index.add(value, group)
+
+    def __len__(self):
+        return len(self.members)
+
+    def first_occurrence(self, slide_index):
+        """这张幻灯片第一次出现时的幻灯片序号"""
+        return self.members[self.group_of[slide_index]][0]
+
+    def appearances(self, slide_index):
+        """这张幻灯片每次出现的开始时间"""
+        return [self.slide_times[i] for i in self.members[self.group_of[slide_index]]]
+
+    def repeated(self):
+        """出现不止一次的组"""
+        return [group for group, members in enumerate(self.members) if len(members) > 1]
+
+    def to_list(self):
+        """可写入 JSON 的分组列表"""
+        return [{'slides': list(members), 'times': [round(self.slide_times[i], 3) for i in members]}
+                for members in self.members]
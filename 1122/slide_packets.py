@@ -0,0 +1,282 @@
+"""压缩域预筛选：只解复用、不解码，按数据包大小找出可能发生切换的位置
+
+静止的幻灯片几乎没有帧间变化，帧间编码的数据包只有几百字节；切换时数据包突然变大，
+编码器往往还会在画面突变处提前插入关键帧。预扫描用 OpenCV 的原始数据包模式
+（CAP_PROP_FORMAT = -1）逐个读出视频包，只记录包大小、是否关键帧和 PTS，
+速度接近读盘速度。之后只在候选区域两侧解码，由粗到细检测的二分定位切换帧：
+
+    python slide_cli.py lecture.mp4 --mode packets --max-gap 10
+
+包大小看不出来的切换（例如恰好落在周期关键帧上的切换）由每隔 max_gap 秒的补充采样兜底，
+与 coarse 模式一样，补充采样之间"切走又切回"且没有大数据包的变化看不到。
+
+同一遍扫描得到的关键帧位置和每帧的真实时间戳也是播放器需要的：PacketIndex 按视频文件
+缓存（cached_packet_index），播放器据此把跳转目标对齐到关键帧，可变帧率的录屏
+把检测器按"帧号 / fps"算出的时间换成真实时间（real_times）：
+
+    python slide_cli.py screencast.mp4 --real-times
+"""
+import os
+import tempfile
+import time
+import warnings
+
+import cv2
+import numpy as np
+
+from slide_engine import DetectionError, MultiMetricDetector, detect_slides, detect_slides_coarse_to_fine
+
+# 帧间包比前 BASELINE_SECONDS 秒帧间包大小的中位数大 SPIKE_RATIO 倍，
+# 且不小于关键帧中位大小的 MIN_SPIKE_KEYFRAME_SHARE 时，算作候选
+SPIKE_RATIO = 4.0
+BASELINE_SECONDS = 1.0
+MIN_SPIKE_KEYFRAME_SHARE = 0.05
+
+# 相隔不到 MERGE_SECONDS 的候选帧合并成一个区域（淡入淡出会连续产生大包）
+MERGE_SECONDS = 1.0
+# 区域结束后再往后 MARGIN_SECONDS 取样，确保越过淡入淡出的最后几帧
+MARGIN_SECONDS = 0.2
+# 没有候选的长段每隔 DEFAULT_MAX_GAP 秒补一个样本
+DEFAULT_MAX_GAP = 10.0
+
+# 跳到幻灯片时，开始后 KEYFRAME_SNAP_SECONDS 秒内有关键帧就跳到关键帧
+KEYFRAME_SNAP_SECONDS = 0.5
+# 比较时间戳时的容差（秒），吸收毫秒换算的舍入误差
+TIME_TOLERANCE = 1e-4
+
+# 缓存文件的后缀；格式变化时改名，旧文件自然不再使用
+INDEX_SUFFIX = '.packets.npz'
+
+
+class PacketIndex:
+    """按显示顺序排列的每帧数据包信息：包大小、是否关键帧、显示时间（秒，第一帧为 0）"""
+
+    def __init__(self, sizes, keyframes, times, fps):
+        # 有 B 帧时解码顺序与显示顺序不同，按时间戳排回显示顺序
+        order = np.argsort(times, kind='stable')
+        self.sizes = np.asarray(sizes, np.int64)[order]
+        self.keyframes = np.asarray(keyframes, bool)[order]
+        self.times = np.asarray(times, np.float64)[order]
+        if len(self.times):
+            self.times -= self.times[0]
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @property
+    def keyframe_times(self):
+        return self.times[self.keyframes]
+
+    @property
+    def duration(self):
+        """最后一帧结束的时间（最后一帧的长度按它与前一帧的间隔计）"""
+        if len(self.times) < 2:
+            return len(self.times) / self.fps
+        return float(2 * self.times[-1] - self.times[-2])
+
+    def is_variable_rate(self):
+        """是否有帧的时间与"帧号 / fps"相差半帧以上（可变帧率的录屏）"""
+        nominal = np.arange(len(self.times)) / self.fps
+        return bool(len(self.times)) and bool(np.abs(self.times - nominal).max() > 0.5 / self.fps)
+
+    def frame_at(self, t):
+        """t 秒时显示的帧号"""
+        frame = np.searchsorted(self.times, t + TIME_TOLERANCE, side='right') - 1
+        return int(min(max(frame, 0), max(len(self.times) - 1, 0)))
+
+    def real_times(self, nominal_times, counted=True):
+        """把检测器算出的时间换成这些帧的真实时间；恒定帧率时原样返回
+
+        逐帧扫描（detect_slides、detect_slides_parallel、series 模式）的时间是"已读帧数 / fps"，
+        已读帧数包含当前帧，对应的帧号要减 1；粗到细检测的时间就是"帧号 / fps"，传 counted=False。
+        """
+        if not len(self.times) or not self.is_variable_rate():
+            return list(nominal_times)
+        frames = np.rint(np.asarray(nominal_times, np.float64) * self.fps).astype(np.int64)
+        if counted:
+            frames -= 1
+        frames = np.clip(frames, 0, len(self.times) - 1)
+        return [round(float(t), 6) for t in self.times[frames]]
+
+    def keyframe_before(self, t):
+        """t 秒及之前最近的关键帧时间，没有时返回 0"""
+        key_times = self.keyframe_times
+        k = np.searchsorted(key_times, t + TIME_TOLERANCE, side='right') - 1
+        return float(key_times[k]) if k >= 0 else 0.0
+
+    def snap_to_keyframe(self, t, limit=KEYFRAME_SNAP_SECONDS):
+        """[t, t + limit] 内的第一个关键帧时间，没有时返回 t
+
+        幻灯片开始后不久的关键帧显示的仍是这张幻灯片，跳到那里不必从更早的关键帧解码过来。
+        """
+        key_times = self.keyframe_times
+        k = np.searchsorted(key_times, t - TIME_TOLERANCE, side='left')
+        if k < len(key_times) and key_times[k] <= t + limit:
+            return float(key_times[k])
+        return t
+
+    def is_keyframe_time(self, t):
+        """t 秒处是否正好是一个关键帧（跳转到这里不需要精确 seek）"""
+        if not len(self.times):
+            return False
+        frame = self.frame_at(t)
+        return bool(self.keyframes[frame]) and abs(self.times[frame] - t) <= TIME_TOLERANCE
+
+    def save(self, path):
+        """原子写入 .npz"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, sizes=self.sizes, keyframes=self.keyframes, times=self.times,
+                         fps=np.float64(self.fps))
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['sizes'], data['keyframes'], data['times'], float(data['fps']))
+
+
+def scan_packets(video_path):
+    """读出全部视频包（不解码），返回 PacketIndex"""
+    cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG)
+    try:
+        if not cap.isOpened():
+            raise DetectionError("Cannot open video file for analysis")
+        if not cap.set(cv2.CAP_PROP_FORMAT, -1):
+            raise DetectionError("This OpenCV build cannot read raw video packets")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        fps = fps if fps and fps > 0 else 25.0
+        sizes, keyframes, times = [], [], []
+        while True:
+            ok, packet = cap.read()
+            if not ok:
+                break
+            sizes.append(packet.size)
+            keyframes.append(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) != 0)
+            # CAP_PROP_PTS 是按 fps 取整的帧号，可变帧率时会重复；POS_MSEC 是这个包的真实显示时间
+            times.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+    finally:
+        cap.release()
+    times = np.asarray(times, np.float64)
+    if len(times) and (np.any(times < 0) or len(np.unique(times)) != len(times)):
+        times = np.arange(len(times)) / fps  # 没有可用的时间戳时按解码顺序
+    return PacketIndex(sizes, keyframes, times, fps)
+
+
+def cached_packet_index(video_path, cache):
+    """从 SlideCache 取这个视频的 PacketIndex，没有时扫描并存入缓存（与检测参数无关，每个视频只扫一次）"""
+    path = cache.path_for(cache.video_key(video_path, 'packet_index'), INDEX_SUFFIX)
+    try:
+        return PacketIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+    packets = scan_packets(video_path)
+    try:
+        packets.save(path)
+    except OSError:
+        pass  # 缓存写失败不影响结果
+    return packets
+
+
+def candidate_regions(packets, spike_ratio=SPIKE_RATIO, merge_seconds=MERGE_SECONDS):
+    """可能发生切换的区域，返回 [(第一帧, 最后一帧), ...]（显示顺序的帧号）"""
+    n = len(packets)
+    if n == 0:
+        return []
+    sizes = packets.sizes.astype(np.float64)
+    keyframes = packets.keyframes
+
+    # 基线：前 BASELINE_SECONDS 秒内帧间包大小的中位数（关键帧不计）
+    window = max(1, int(round(BASELINE_SECONDS * packets.fps)))
+    inter_sizes = np.where(keyframes, np.nan, sizes)
+    history = np.lib.stride_tricks.sliding_window_view(np.concatenate([np.full(window, np.nan), inter_sizes]),
+                                                       window)[:n]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # 窗口里全是关键帧时中位数为 NaN
+        baseline = np.nanmedian(history, axis=1)
+    min_size = MIN_SPIKE_KEYFRAME_SHARE * np.median(sizes[keyframes]) if keyframes.any() else 0.0
+    spikes = ~keyframes & (sizes > spike_ratio * baseline) & (sizes >= min_size)
+
+    # 编码器在画面突变处插入的关键帧比常规的关键帧间隔来得早
+    key_index = np.flatnonzero(keyframes)
+    if len(key_index) > 2:
+        intervals = np.diff(key_index)
+        regular = np.bincount(intervals).argmax()
+        spikes[key_index[1:][intervals < regular]] = True
+
+    frames = np.flatnonzero(spikes)
+    if not len(frames):
+        return []
+    breaks = np.flatnonzero(np.diff(frames) > merge_seconds * packets.fps)
+    starts = np.concatenate([[frames[0]], frames[breaks + 1]])
+    ends = np.concatenate([frames[breaks], [frames[-1]]])
+    return [(int(a), int(b)) for a, b in zip(starts, ends)]
+
+
+def sample_positions(packets, regions, max_gap=DEFAULT_MAX_GAP):
+    """粗到细检测的样本帧号：每个区域前后各一个，长段里每隔 max_gap 秒补一个"""
+    last = len(packets) - 1
+    margin = int(round(MARGIN_SECONDS * packets.fps))
+    positions = {0, max(last, 0)}
+    for first, end in regions:
+        positions.add(max(first - 1, 0))
+        positions.add(min(end + margin, last))
+
+    # 补充样本尽量取关键帧：seek 到关键帧只需解码这一帧
+    gap = max(1, int(round(max_gap * packets.fps)))
+    key_index = np.flatnonzero(packets.keyframes)
+    ordered = sorted(positions)
+    for a, b in zip(ordered, ordered[1:]):
+        target = a + gap
+        while target < b - gap // 2:
+            k = np.searchsorted(key_index, target, side='right') - 1
+            position = int(key_index[k]) if k >= 0 and key_index[k] > a else target
+            positions.add(position)
+            target = position + gap
+    return sorted(positions)
+
+
+def detect_slides_prescreened(video_path, detector=None, max_gap=DEFAULT_MAX_GAP, progress_callback=None,
+                              fallback_duration=0.0, slide_callback=None, cancel_token=None, packets=None):
+    """先扫描数据包选出候选区域，再只在候选附近解码做粗到细检测
+
+    回调与 cancel_token 的含义与 slide_engine.detect_slides 相同。
+    packets 是已有的 PacketIndex（如 cached_packet_index 的结果），给出时不再扫描。
+    返回的时间与粗到细检测一样是"帧号 / fps"，需要真实时间时用 packets.real_times 换算。
+
+    可变帧率的视频上 OpenCV 按帧号 seek 会落到别的帧，这时改为逐帧扫描（stats 里记 variable_rate），
+    时间是逐帧扫描的"已读帧数 / fps"，正好是 real_times 默认的换算方式。
+    """
+    if detector is None:
+        detector = MultiMetricDetector()
+    start = time.perf_counter()
+    if packets is None:
+        packets = scan_packets(video_path)
+    if packets.is_variable_rate():
+        result = detect_slides(video_path, detector, progress_callback=progress_callback,
+                               fallback_duration=fallback_duration, slide_callback=slide_callback,
+                               cancel_token=cancel_token)
+        result.stats.update({'packets': len(packets), 'variable_rate': True})
+        result.elapsed = time.perf_counter() - start
+        return result
+    regions = candidate_regions(packets)
+    positions = sample_positions(packets, regions, max_gap)
+    scan_seconds = time.perf_counter() - start
+
+    result = detect_slides_coarse_to_fine(video_path, detector, progress_callback=progress_callback,
+                                          fallback_duration=fallback_duration, positions=positions,
+                                          slide_callback=slide_callback, cancel_token=cancel_token)
+    result.stats.update({'packets': len(packets), 'candidate_regions': len(regions),
+                         'packet_scan_seconds': round(scan_seconds, 3)})
+    result.elapsed = time.perf_counter() - start
+    return result
@@ -0,0 +1,328 @@
+"""特征序列：把检测拆成"提取特征"和"判断"两遍
+
+第一遍解码视频，按固定步长对相邻采样帧计算各项变化指标，保存为 .npy（结构化数组，
+读取时可内存映射）；第二遍只读这些指标，按 thresholds / adaptive_params 投票判断切换点。
+调整灵敏度时只需重跑第二遍，不必重新解码视频。
+
+两遍的结果与 gate_threshold 相同的 MultiMetricDetector(adaptive_skip=False) 逐帧检测的结果相同：
+自适应跳帧依赖判断状态，固定步长的特征序列无法复现它。被 StaticGate 判为静止的采样点
+记为"与参考帧完全相同"的指标，与逐帧检测时记入历史的值一致。
+decide_series 逐点调用检测器的判断逻辑；decide_series_vectorized 用数组运算
+一次算完整条序列，结果相同，适合大量参数组合的快速重算。
+
+HandwritingDetector 也可以这样拆开：kind='handwriting' 时记录它的手写指标
+（HANDWRITING_SERIES_FIELDS），decide_handwriting_series 逐点重放它的判断，
+结果与同样 gate_threshold、skip_seconds 的 HandwritingDetector 逐帧检测相同。
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from slide_cache import write_json_atomic
+from slide_engine import (DEFAULT_GATE_THRESHOLD, MIN_CHANGE_INTENSITY, STATIC_FRAME_METRICS, FeatureExtractor,
+                          HandwritingDetector, MultiMetricDetector, StaticGate, detect_slides,
+                          post_process_slide_times)
+
+# 每个采样点保存的字段：时间戳 + 与上一采样帧比较的各项指标
+SERIES_FIELDS = ('time', 'hist_correlation', 'chi_square', 'ssim_score', 'edge_change_ratio',
+                 'brightness_change', 'content_change_score', 'change_intensity')
+SERIES_DTYPE = np.dtype([(name, np.float64) for name in SERIES_FIELDS])
+STATIC_ROW = tuple(STATIC_FRAME_METRICS[name] for name in SERIES_FIELDS[1:])
+
+# 手写检测的序列：时间戳 + 是否被 StaticGate 判为静止 + HandwritingDetector.compare 的各项指标
+HANDWRITING_SERIES_FIELDS = ('time', 'static', 'mean_diff', 'changed_area_ratio', 'change_concentration',
+                             'hist_diff_score', 'edge_diff_ratio')
+HANDWRITING_SERIES_DTYPE = np.dtype([(name, np.float64) for name in HANDWRITING_SERIES_FIELDS])
+
+
+class FeatureRecorder:
+    """只提取指标、不做判断的"检测器"，由 detect_slides 驱动读帧"""
+
+    name = 'feature_series'
+    dtype = SERIES_DTYPE
+
+    def __init__(self, base_skip_seconds=0.3, gate_threshold=DEFAULT_GATE_THRESHOLD):
+        self.base_skip_seconds = base_skip_seconds
+        self.gate = StaticGate(gate_threshold)
+        self.reset(25.0)
+
+    def params(self):
+        return {'base_skip_seconds': self.base_skip_seconds, 'gate_threshold': self.gate.threshold,
+                'fields': list(SERIES_FIELDS), 'ssim': 'global'}
+
+    def reset(self, fps):
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.base_skip_frames = max(1, int(self.fps * self.base_skip_seconds))
+        self.extractor = FeatureExtractor()
+        self.gate.reset()
+        self.prev_features = None
+        self.slide_times = [0.0]
+        self.rows = []
+
+    def skip_frames(self):
+        return self.base_skip_frames
+
+    def candidate_strides(self):
+        return {self.base_skip_frames}
+
+    def process(self, gray_resized, current_time):
+        if self.gate.is_static(gray_resized):
+            self.rows.append((current_time,) + STATIC_ROW)
+            return False
+        features = self.extractor.extract(gray_resized)
+        if self.prev_features is not None:
+            metrics = self.extractor.compare(self.prev_features, features)
+            self.rows.append((current_time,) + tuple(metrics[name] for name in SERIES_FIELDS[1:]))
+        self.prev_features = features
+        return False
+
+    def finish(self):
+        return [0.0]
+
+    def series(self):
+        return np.array(self.rows, dtype=SERIES_DTYPE)
+
+
+class HandwritingRecorder:
+    """只提取 HandwritingDetector 的指标、不做判断，由 detect_slides 驱动读帧"""
+
+    name = 'handwriting_series'
+    dtype = HANDWRITING_SERIES_DTYPE
+
+    def __init__(self, skip_seconds=1.0, gate_threshold=DEFAULT_GATE_THRESHOLD):
+        self.skip_seconds = skip_seconds
+        self.gate = StaticGate(gate_threshold)
+        self.scorer = HandwritingDetector(skip_seconds=skip_seconds)  # 只用它的 compare()
+        self.reset(25.0)
+
+    def params(self):
+        return {'skip_seconds': self.skip_seconds, 'gate_threshold': self.gate.threshold,
+                'fields': list(HANDWRITING_SERIES_FIELDS)}
+
+    def reset(self, fps):
+        self.fps = fps if fps and fps > 0 else 25.0
+        self.base_skip_frames = max(1, int(self.fps * self.skip_seconds))
+        self.gate.reset()
+        self.prev_features = None
+        self.prev_edges = None
+        self.slide_times = [0.0]
+        self.rows = []
+
+    def skip_frames(self):
+        return self.base_skip_frames
+
+    def candidate_strides(self):
+        return {self.base_skip_frames}
+
+    def process(self, gray_resized, current_time):
+        # 与 HandwritingDetector.process 相同的取帧和边缘数传递，只是把指标记下来
+        if self.gate.is_static(gray_resized):
+            if self.prev_edges is None:
+                self.prev_edges = self.prev_features['edge_count']
+            self.rows.append((current_time, 1.0, 0.0, 0.0, 0.0, 0.0, 0.0))
+            return False
+        features = HandwritingDetector.extract_features(gray_resized)
+        if self.prev_features is not None:
+            metrics = self.scorer.compare(self.prev_features, features, self.prev_edges)
+            self.prev_edges = features['edge_count']
+            self.rows.append((current_time, 0.0) + tuple(metrics[name] for name in HANDWRITING_SERIES_FIELDS[2:]))
+        self.prev_features = features
+        return False
+
+    def finish(self):
+        return [0.0]
+
+    def series(self):
+        return np.array(self.rows, dtype=HANDWRITING_SERIES_DTYPE)
+
+
+# 序列种类 -> 记录器；记录器的构造参数都是 (采样步长秒数, gate_threshold)
+SERIES_RECORDERS = {
+    'multi_metric': FeatureRecorder,
+    'handwriting': HandwritingRecorder,
+}
+
+
+def extract_feature_series(video_path, base_skip_seconds=0.3, reader='opencv', sampling='auto',
+                           ring_size=0, progress_callback=None, fallback_duration=0.0,
+                           gate_threshold=DEFAULT_GATE_THRESHOLD, kind='multi_metric'):
+    """第一遍：解码视频，返回 (特征序列, 元数据)；kind 见 SERIES_RECORDERS"""
+    recorder = SERIES_RECORDERS[kind](base_skip_seconds, gate_threshold)
+    result = detect_slides(video_path, recorder, progress_callback, fallback_duration=fallback_duration,
+                           sampling=sampling, ring_size=ring_size, reader=reader)
+    meta = {
+        'video': video_path,
+        'fps': result.fps,
+        'total_frames': result.total_frames,
+        'duration': result.duration,
+        'base_skip_seconds': base_skip_seconds,
+        'gate_threshold': gate_threshold,
+        'kind': kind,
+        'reader': reader,
+        'elapsed': round(result.elapsed, 3),
+        'stats': result.stats,
+    }
+    return recorder.series(), meta
+
+
+def save_feature_series(path, series, meta):
+    """保存为 path（.npy）和同名 .json 元数据，均为原子写入"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.asarray(series))
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    write_json_atomic(_meta_path(path), meta)
+
+
+def load_feature_series(path, mmap=True, dtype=SERIES_DTYPE):
+    """读取 save_feature_series 保存的 (特征序列, 元数据)，默认内存映射"""
+    series = np.load(path, mmap_mode='r' if mmap else None, allow_pickle=False)
+    if series.dtype != dtype:
+        raise ValueError(f"Unexpected feature series layout in {path}")
+    with open(_meta_path(path), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return series, meta
+
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def cached_feature_series(video_path, cache, base_skip_seconds=0.3, reader='opencv',
+                          gate_threshold=DEFAULT_GATE_THRESHOLD, kind='multi_metric', **kwargs):
+    """从 SlideCache 取特征序列，没有时提取并存入缓存"""
+    recorder = SERIES_RECORDERS[kind](base_skip_seconds, gate_threshold)
+    path = cache.path_for(cache.key_for(video_path, recorder, reader), '.features.npy')
+    try:
+        return load_feature_series(path, dtype=recorder.dtype)
+    except (OSError, ValueError):
+        pass
+    series, meta = extract_feature_series(video_path, base_skip_seconds, reader, gate_threshold=gate_threshold,
+                                          kind=kind, **kwargs)
+    try:
+        save_feature_series(path, series, meta)
+    except OSError:
+        pass  # 缓存写失败不影响结果
+    return series, meta
+
+
+def decide_series(series, fps, detector=None):
+    """第二遍：对特征序列逐点执行 MultiMetricDetector 的判断逻辑，返回切换时间"""
+    if detector is None:
+        detector = MultiMetricDetector(adaptive_skip=False)
+    detector.reset(fps)
+    # 按列取出再逐行组装，比逐行访问（可能是内存映射的）结构化数组快得多
+    columns = [series[name].tolist() for name in SERIES_FIELDS]
+    for row in zip(*columns):
+        detector.decide(dict(zip(SERIES_FIELDS[1:], row[1:])), row[0])
+    return detector.finish()
+
+
+def trailing_mean(values, window):
+    """每个位置上最近 window 个值（含当前）的平均；不足 window 个时对已有的值求平均"""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    out = np.empty(n)
+    head = min(window - 1, n)
+    out[:head] = np.cumsum(values[:head]) / np.arange(1, head + 1)
+    if n >= window:
+        out[head:] = sliding_window_view(values, window).mean(axis=1)
+    return out
+
+
+def decide_series_vectorized(series, fps, detector=None):
+    """decide_series 的数组版：对整条序列一次算出自适应阈值、投票和验证，再贪心选出切换点
+
+    与逐点判断等价的原因：
+      - recent_changes 只依赖 change_intensity 序列，与判断结果无关，可用滑动均值一次算出；
+      - 自适应阈值、多指标投票、切换验证都只依赖当前点和这些滑动均值；
+      - 静帧过滤里的"上次显著变化时间"和"上一张幻灯片时间"都只在确认切换时更新，
+        且总是相等，所以候选点上的选择就是按最小间隔的贪心选取（用 searchsorted 跳转）。
+    """
+    if detector is None:
+        detector = MultiMetricDetector(adaptive_skip=False)
+    detector.reset(fps)
+    capacity = detector.recent_changes.capacity
+    params = detector.adaptive_params
+    base = detector.thresholds
+
+    times = np.asarray(series['time'], dtype=np.float64)
+    intensity = np.asarray(series['change_intensity'], dtype=np.float64)
+    count = np.minimum(np.arange(1, len(times) + 1), capacity)  # 追加当前值后 recent_changes 的长度
+
+    # === 自适应阈值调整 ===
+    activity = trailing_mean(intensity, min(params['sensitivity_window'], capacity))
+    factor = np.ones(len(times))
+    low = (count >= 10) & (activity < 0.1)
+    high = (count >= 10) & ~low & (activity > 0.4)
+    factor[low] = params['low_activity_boost']
+    factor[high] = params['high_activity_damping']
+
+    # === 多指标综合判断 ===
+    hist_low = series['hist_correlation'] < base['hist_correlation'] * factor
+    edge_high = series['edge_change_ratio'] > base['edge_change_ratio']
+    chi_high = series['chi_square'] > base['chi_square']
+    ssim_low = series['ssim_score'] < base['ssim_threshold'] * factor
+    brightness = series['brightness_change'] > base['brightness_change']
+    content = series['content_change_score'] > base['content_change'] / factor
+    positive = (hist_low.astype(np.int8) + edge_high + chi_high + ssim_low + brightness + content)
+    scene_change = (positive >= 3) | ((positive >= 2) & ((hist_low & ssim_low) | (content & edge_high)))
+
+    # === 切换验证：当前变化明显高于最近 5 个的平均 ===
+    recent_avg = trailing_mean(intensity, 5)
+    verified = (count < 5) | ((intensity / (recent_avg + 1e-7) > 1.5) & (intensity > MIN_CHANGE_INTENSITY))
+
+    # === 静帧过滤：候选点上按最小间隔贪心选取 ===
+    candidates = times[scene_change & verified]
+    min_gap = max(detector.min_static_duration, detector.min_slide_duration)
+    slide_times = list(detector.slide_times)
+    last = slide_times[-1]
+    pos = 0
+    while True:
+        pos = int(np.searchsorted(candidates, last + min_gap, side='left'))
+        # searchsorted 比较的是 last + min_gap，逐点判断比较的是 t - last，两者在舍入上可能差一位
+        while pos > 0 and candidates[pos - 1] > last and _far_enough(candidates[pos - 1], last, detector):
+            pos -= 1
+        while pos < len(candidates) and not _far_enough(candidates[pos], last, detector):
+            pos += 1
+        if pos >= len(candidates):
+            break
+        last = float(candidates[pos])
+        slide_times.append(last)
+
+    return post_process_slide_times(slide_times, detector.min_slide_duration)
+
+
+def _far_enough(t, last, detector):
+    """与 MultiMetricDetector.decide 中静帧过滤完全相同的比较"""
+    return t - last >= detector.min_static_duration and t - last >= detector.min_slide_duration
+
+
+def decide_handwriting_series(series, fps, detector=None):
+    """对手写指标序列逐点执行 HandwritingDetector 的判断逻辑，返回切换时间
+
+    连续手写帧数会在确认切换时清零，判断依赖此前的判断结果，所以没有数组版。
+    """
+    if detector is None:
+        detector = HandwritingDetector()
+    detector.reset(fps)
+    columns = [series[name].tolist() for name in HANDWRITING_SERIES_FIELDS]
+    for row in zip(*columns):
+        if row[1]:
+            detector.decide_static()
+        else:
+            detector.decide(dict(zip(HANDWRITING_SERIES_FIELDS[2:], row[2:])), row[0])
+    return detector.finish()
+
@@ -0,0 +1,229 @@
+"""检测参数调优：在缓存的特征序列上并行扫描参数网格，按人工标注打分
+
+标注文件可以直接用 slide_cli.py 的输出改出来（列表，每项含 video 和 slide_times），
+也可以是 {视频路径: [切换时间, ...]} 的字典：
+
+    python slide_cli.py lecture1.mp4 lecture2.mp4 -o truth.json    # 再人工修正 slide_times
+    python slide_tune.py truth.json --grid ssim_threshold=0.7,0.76,0.82 --grid hist_correlation=0.2,0.25,0.3
+
+每个视频只在第一次解码提取特征序列（存入检测缓存），之后每组参数只需重跑判断。
+--detector handwriting 时扫描 HandwritingDetector 的打分权重和判定阈值：
+
+    python slide_tune.py truth.json --detector handwriting --grid change_score=35,45,55
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from slide_cache import SlideCache
+from slide_engine import (DEFAULT_ADAPTIVE_PARAMS, DEFAULT_HANDWRITING_PARAMS, DEFAULT_THRESHOLDS,
+                          HandwritingDetector, MultiMetricDetector, resolve_reader)
+from slide_series import cached_feature_series, decide_handwriting_series, decide_series_vectorized
+
+# 可扫描的参数：阈值、自适应参数和两个时间参数
+DURATION_PARAMS = ('min_slide_duration', 'min_static_duration')
+TUNABLE_PARAMS = tuple(DEFAULT_THRESHOLDS) + tuple(DEFAULT_ADAPTIVE_PARAMS) + DURATION_PARAMS
+HANDWRITING_TUNABLE_PARAMS = tuple(DEFAULT_HANDWRITING_PARAMS) + ('min_slide_duration',)
+
+# 没有指定 --grid 时扫描的默认网格（围绕当前默认值）
+DEFAULT_GRID = {
+    'hist_correlation': [0.2, 0.25, 0.3],
+    'ssim_threshold': [0.76, 0.82, 0.88],
+    'content_change': [0.15, 0.2, 0.25],
+    'min_slide_duration': [1.5, 2.0, 3.0],
+}
+DEFAULT_HANDWRITING_GRID = {
+    'change_score': [35, 45, 55],
+    'change_hist_diff': [50, 60, 70],
+    'writing_decay': [0.05, 0.1, 0.2],
+    'min_slide_duration': [1.5, 2.0, 3.0],
+}
+
+# --detector 的取值 -> (可扫描参数, 默认网格, 特征序列的采样步长秒数)
+SWEEPS = {
+    'multi_metric': (TUNABLE_PARAMS, DEFAULT_GRID, 0.3),
+    'handwriting': (HANDWRITING_TUNABLE_PARAMS, DEFAULT_HANDWRITING_GRID, 1.0),
+}
+
+
+def load_ground_truth(path):
+    """返回 {视频路径: 排好序的切换时间}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {item['video']: item['slide_times'] for item in data}
+    return {video: sorted(float(t) for t in times) for video, times in data.items()}
+
+
+def match_slides(detected, truth, tolerance):
+    """按时间顺序一对一匹配检测结果与标注，返回 (TP, FP, FN)
+
+    开头的 0.0 两边总是都有，不计入。
+    """
+    detected = [t for t in detected if t > tolerance]
+    truth = [t for t in truth if t > tolerance]
+    tp = 0
+    i = j = 0
+    while i < len(detected) and j < len(truth):
+        if abs(detected[i] - truth[j]) <= tolerance:
+            tp += 1
+            i += 1
+            j += 1
+        elif detected[i] < truth[j]:
+            i += 1
+        else:
+            j += 1
+    return tp, len(detected) - tp, len(truth) - tp
+
+
+def precision_recall_f1(tp, fp, fn):
+    """由 TP/FP/FN 算 (precision, recall, F1)，调优和基准共用
+
+    没有检测结果时没有误报，precision 记为 1；没有标注的切换时没有漏检，recall 记为 1。
+    """
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return precision, recall, f1
+
+
+def build_detector(config, kind='multi_metric'):
+    """由一组参数（扁平字典）构造 kind 对应的检测器"""
+    if kind == 'handwriting':
+        score_params = {k: v for k, v in config.items() if k in DEFAULT_HANDWRITING_PARAMS}
+        durations = {k: v for k, v in config.items() if k == 'min_slide_duration'}
+        return HandwritingDetector(score_params, **durations)
+    thresholds = {k: v for k, v in config.items() if k in DEFAULT_THRESHOLDS}
+    adaptive_params = {k: v for k, v in config.items() if k in DEFAULT_ADAPTIVE_PARAMS}
+    if 'sensitivity_window' in adaptive_params:
+        adaptive_params['sensitivity_window'] = int(adaptive_params['sensitivity_window'])
+    durations = {k: v for k, v in config.items() if k in DURATION_PARAMS}
+    return MultiMetricDetector(thresholds, adaptive_params, adaptive_skip=False, **durations)
+
+
+def expand_grid(grid):
+    """{参数: [取值, ...]} -> 全部组合"""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+# 工作进程内的数据（由进程池 initializer 设置，避免每个任务重复传输特征序列）
+_worker_videos = None
+
+
+def _init_worker(videos):
+    global _worker_videos
+    _worker_videos = videos
+
+
+def score_config(config, tolerance, videos=None, kind='multi_metric'):
+    """用一组参数判断全部视频并打分"""
+    videos = videos if videos is not None else _worker_videos
+    decide = decide_handwriting_series if kind == 'handwriting' else decide_series_vectorized
+    tp = fp = fn = 0
+    start = time.perf_counter()
+    for series, fps, truth in videos:
+        detected = decide(series, fps, build_detector(config, kind))
+        v_tp, v_fp, v_fn = match_slides(detected, truth, tolerance)
+        tp += v_tp
+        fp += v_fp
+        fn += v_fn
+    elapsed = time.perf_counter() - start
+
+    precision, recall, f1 = precision_recall_f1(tp, fp, fn)
+    return {'params': config, 'precision': precision, 'recall': recall, 'f1': f1,
+            'tp': tp, 'fp': fp, 'fn': fn, 'decide_ms': elapsed * 1000}
+
+
+def parse_grid(text):
+    """--grid 的值：NAME=V1,V2,..."""
+    name, sep, values = text.partition('=')
+    if not sep or not any(name in tunable for tunable, _, _ in SWEEPS.values()):
+        raise argparse.ArgumentTypeError(f"expected NAME=V1,V2,... with NAME a tunable parameter of "
+                                         f"{' or '.join(SWEEPS)}")
+    try:
+        return name, [float(v) for v in values.split(',') if v]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid values for {name}: {values!r}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Sweep detection parameters over cached feature series and score them against "
+                    "annotated slide times.")
+    parser.add_argument('truth', help="Ground truth JSON: slide_cli.py output or {video: [times]}")
+    parser.add_argument('--detector', choices=tuple(SWEEPS), default='multi_metric',
+                        help="Detector whose parameters are swept (default: multi_metric)")
+    parser.add_argument('--grid', action='append', type=parse_grid, default=[], metavar='NAME=V1,V2,...',
+                        help="Values to try for one parameter (repeatable; default: a small grid around "
+                             "the current defaults)")
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help="Max seconds between a detected and an annotated change to count as a match "
+                             "(default: 1)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for the sweep (default: all cores)")
+    parser.add_argument('--base-skip-seconds', type=float,
+                        help="Feature sampling stride in seconds (default: 0.3, or 1 for handwriting)")
+    parser.add_argument('--reader', choices=('opencv', 'lowres', 'auto'), default='auto',
+                        help="Frame reader used when features still have to be extracted (default: auto)")
+    parser.add_argument('--cache-dir', help="Detection cache directory holding the feature series")
+    parser.add_argument('--top', type=int, default=10, help="Number of configurations to print (default: 10)")
+    parser.add_argument('-o', '--output', help="Write every scored configuration to this JSON file")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    tunable, default_grid, default_step = SWEEPS[args.detector]
+    unknown = [name for name, _ in args.grid if name not in tunable]
+    if unknown:
+        parser.error(f"{', '.join(unknown)} cannot be tuned for {args.detector} "
+                     f"(tunable: {', '.join(tunable)})")
+    truth = load_ground_truth(args.truth)
+    grid = dict(args.grid) or default_grid
+    step = args.base_skip_seconds or default_step
+    configs = expand_grid(grid)
+    cache = SlideCache(args.cache_dir)
+
+    videos = []
+    extract_seconds = 0.0
+    for video_path, times in truth.items():
+        reader = resolve_reader(args.reader, video_path)
+        series, meta = cached_feature_series(video_path, cache, step, reader, kind=args.detector)
+        extract_seconds += meta['elapsed']
+        # 工作进程需要可以 pickle 的普通数组，而不是内存映射
+        videos.append((series[:].copy(), meta['fps'], times))
+        print(f"Features: {video_path} ({len(series)} samples)", file=sys.stderr)
+
+    start = time.perf_counter()
+    if args.jobs > 1 and len(configs) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=_init_worker, initargs=(videos,)) as pool:
+            results = list(pool.map(score_config, configs, itertools.repeat(args.tolerance),
+                                    itertools.repeat(None), itertools.repeat(args.detector),
+                                    chunksize=max(1, len(configs) // (args.jobs * 4))))
+    else:
+        results = [score_config(config, args.tolerance, videos, args.detector) for config in configs]
+    sweep_seconds = time.perf_counter() - start
+
+    results.sort(key=lambda r: (-r['f1'], r['fp'] + r['fn']))
+    print(f"{len(configs)} configurations x {len(videos)} videos in {sweep_seconds:.2f}s "
+          f"(feature extraction cost: {extract_seconds:.1f}s, paid once per video)")
+    print(f"{'F1':>6} {'P':>6} {'R':>6} {'TP':>5} {'FP':>5} {'FN':>5} {'ms':>7}  params")
+    for r in results[:args.top]:
+        params = ' '.join(f"{k}={v:g}" for k, v in sorted(r['params'].items()))
+        print(f"{r['f1']:6.3f} {r['precision']:6.3f} {r['recall']:6.3f} {r['tp']:5d} {r['fp']:5d} {r['fn']:5d} "
+              f"{r['decide_ms']:7.2f}  {params}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())